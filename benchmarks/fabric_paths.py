@@ -0,0 +1,229 @@
+"""
+Measures the performance of the Fabric code paths against the in-process SSH server of :mod:`benchmarks.ssh_server`:
+handshake latency, commands per second, output throughput, watcher overhead and sensor poke cost, for `FabricHook`,
+`FabricOperator` and `FabricSensor`. Commands run on the local machine, so the results show the overhead of this
+package and paramiko rather than network latency. Run it from the root of the repository::
+
+    python -m benchmarks.fabric_paths --output benchmark.json
+
+The results are written as JSON together with the git commit, so runs of different commits can be compared::
+
+    python -m benchmarks.fabric_paths --output new.json --compare old.json
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import fabric
+import paramiko
+from invoke import Responder
+
+from benchmarks.ssh_server import LocalSSHServer
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from sai_airflow_plugins.sensors.fabric_sensor import FabricSensor
+
+# Metrics where a higher value is better; for all others lower is better
+HIGHER_IS_BETTER = ("commands_per_s", "mib_per_s")
+
+
+def time_calls(function: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Calls a function `repeat` times and returns the median, 95th percentile and mean duration in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+
+    durations.sort()
+    return {
+        "median_ms": round(statistics.median(durations), 3),
+        "p95_ms": round(durations[min(int(len(durations) * 0.95), len(durations) - 1)], 3),
+        "mean_ms": round(statistics.mean(durations), 3),
+    }
+
+
+def create_hook(server: LocalSSHServer) -> FabricHook:
+    return FabricHook(remote_host=server.host, port=server.port, username=server.username, password=server.password)
+
+
+def create_operator(server: LocalSSHServer, operator_class: type = FabricOperator, **kwargs) -> FabricOperator:
+    return operator_class(task_id="benchmark", fabric_hook=create_hook(server), **kwargs)
+
+
+def bench_handshake(server: LocalSSHServer, repeat: int) -> Dict[str, float]:
+    """
+    Opens and closes a new connection, including key exchange and authentication.
+    """
+    hook = create_hook(server)
+
+    def handshake():
+        conn = hook.get_fabric_conn()
+        conn.open()
+        conn.close()
+
+    return time_calls(handshake, repeat)
+
+
+def bench_commands(server: LocalSSHServer, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Runs a trivial command with the hook's pooled connection, with `FabricOperator` and with `FabricOperator` using
+    the asyncio runner. Every command gets a new channel on the same connection.
+    """
+    hook = create_hook(server)
+    conn = hook.get_pooled_fabric_conn()
+    conn.open()
+    try:
+        results = {"hook": time_calls(lambda: conn.run("true", hide=True, in_stream=False), repeat)}
+    finally:
+        hook.release_fabric_conn(conn)
+
+    for name, kwargs in (("operator", {}), ("operator_asyncio", {"use_asyncio": True})):
+        op = create_operator(server, command="true", **kwargs)
+        op.execute_fabric_command()  # open the pooled connection outside the measurement
+        results[name] = time_calls(op.execute_fabric_command, repeat)
+
+    for res in results.values():
+        res["commands_per_s"] = round(1000 / res["mean_ms"], 1)
+    return results
+
+
+def bench_throughput(server: LocalSSHServer, size_mib: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Runs a command that writes `size_mib` MiB of text lines to stdout, with the default output capture and with a
+    bounded output capture.
+    """
+    command = f"yes 0123456789abcdefghijklmnopqrstuvwxyz | head -c {size_mib * 2 ** 20}"
+    results = {}
+    for name, kwargs in (("default", {}), ("max_output_memory", {"max_output_memory": 2 ** 20})):
+        op = create_operator(server, command=command, **kwargs)
+        with redirect_stdout(io.StringIO()):  # hide the output that Fabric echoes
+            res = time_calls(op.execute_fabric_command, repeat)
+        res["mib_per_s"] = round(size_mib / (res["median_ms"] / 1000), 1)
+        results[name] = res
+    return results
+
+
+def bench_watchers(server: LocalSSHServer, watchers: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Runs a command with a lot of output lines without watchers, with `watchers` responders, and with the same
+    responders combined. The overhead is relative to the run without watchers.
+    """
+    command = "yes 'Still working on it' | head -n 20000; echo 'Continue? '"
+    responders = [{"class": Responder, "pattern": rf"Question {i}\?", "response": "yes\n"} for i in range(watchers)]
+    results = {}
+    for name, kwargs in (("none", {}),
+                         ("responders", {"watchers": responders}),
+                         ("combined", {"watchers": responders, "combine_watchers": True})):
+        op = create_operator(server, command=command, **kwargs)
+        with redirect_stdout(io.StringIO()):  # hide the output that Fabric echoes
+            results[name] = time_calls(op.execute_fabric_command, repeat)
+
+    for name in ("responders", "combined"):
+        results[name]["overhead_percent"] = round(
+            100 * (results[name]["median_ms"] / results["none"]["median_ms"] - 1), 1
+        )
+    return results
+
+
+def bench_sensor(server: LocalSSHServer, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Pokes a `FabricSensor` whose condition is true, with and without the connection pool.
+    """
+    results = {}
+    for name, kwargs in (("pooled", {}), ("new_connection", {"use_connection_pool": False})):
+        sensor = create_operator(server, FabricSensor, command="test -d /", **kwargs)
+        sensor.poke({})
+        results[name] = time_calls(lambda: sensor.poke({}), repeat)
+    return results
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results = {
+        "commit": get_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "paramiko": paramiko.__version__,
+            "fabric": fabric.__version__,
+            "machine": platform.machine(),
+        },
+        "benchmarks": {},
+    }
+    benchmarks = results["benchmarks"]
+
+    with LocalSSHServer() as server:
+        benchmarks["handshake"] = bench_handshake(server, args.repeat)
+        benchmarks["commands"] = bench_commands(server, args.repeat * 5)
+        benchmarks["throughput"] = bench_throughput(server, args.size, args.repeat)
+        benchmarks["watchers"] = bench_watchers(server, args.watchers, args.repeat)
+        benchmarks["sensor_poke"] = bench_sensor(server, args.repeat * 5)
+
+    get_connection_pool().close_all()
+    return results
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """
+    Returns a line per metric with its old and new value and the relative change, where positive is better.
+    """
+    lines = []
+
+    def walk(old_value, new_value, path):
+        if isinstance(new_value, dict):
+            for key, value in new_value.items():
+                if isinstance(old_value, dict) and key in old_value:
+                    walk(old_value[key], value, path + [key])
+        elif isinstance(new_value, (int, float)) and old_value:
+            change = (new_value / old_value - 1) * 100
+            if path[-1] not in HIGHER_IS_BETTER:
+                change = -change
+            lines.append(f"{'.'.join(path):<50} {old_value:>10} {new_value:>10} {change:>+8.1f}%")
+
+    walk(old["benchmarks"], new["benchmarks"], [])
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="measurements per benchmark")
+    parser.add_argument("--size", type=int, default=16, help="MiB of output for the throughput benchmark")
+    parser.add_argument("--watchers", type=int, default=20, help="responders for the watcher benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results with those in this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"\nCompared with commit {old.get('commit')} (positive is better):")
+        print("\n".join(compare(old, results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the import time of the plugin modules that DAG files import, and which heavy dependencies they load. Every
+import runs in a fresh interpreter, after Airflow itself has been imported, since every DAG file needs that anyway::
+
+    python -m benchmarks.import_time --output import_time.json
+
+With ``--check``, it exits with an error if a module loads one of the heavy dependencies, e.g. in CI::
+
+    python -m benchmarks.import_time --check
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+# Modules that DAG files import, and the heavy dependencies that they may not load until a class is used
+MODULES = {
+    "sai_airflow_plugins.operators.conditional_operators": [],
+    "sai_airflow_plugins.sensors.conditional_sensors": [],
+    "sai_airflow_plugins.operators": [],
+    "sai_airflow_plugins.sensors": [],
+    "sai_airflow_plugins.hooks": [],
+    "sai_airflow_plugins.operators.fabric_operator": ["fabric", "invoke", "paramiko"],
+}
+HEAVY_MODULES = ["fabric", "invoke", "paramiko", "airflow.operators.bash", "airflow.operators.python",
+                 "airflow.operators.trigger_dagrun", "airflow.sensors.bash", "airflow.sensors.python"]
+
+SCRIPT = """
+import json, sys, time, warnings
+warnings.simplefilter("ignore")
+import airflow
+from airflow.models.baseoperator import BaseOperator
+started = time.perf_counter()
+import {module}
+duration = time.perf_counter() - started
+print(json.dumps({{"seconds": duration, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    """
+    Imports a module `repeat` times, each time in a new interpreter.
+
+    :return: the median import time in milliseconds and the heavy modules that were loaded
+    """
+    durations, loaded = [], []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        result = json.loads(proc.stdout.decode().strip().splitlines()[-1])
+        durations.append(result["seconds"] * 1000)
+        loaded = result["loaded"]
+
+    return {"median_ms": round(statistics.median(durations), 1), "loaded": loaded}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--check", action="store_true",
+                        help="fail if a module loads a heavy dependency that it isn't allowed to")
+    args = parser.parse_args(argv)
+
+    results = {module: measure(module, args.repeat) for module in MODULES}
+
+    print(f"{'module':<55} {'median ms':>10}  heavy dependencies")
+    for module, res in results.items():
+        print(f"{module:<55} {res['median_ms']:>10}  {', '.join(res['loaded']) or '-'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    violations = [f"{module} loads {name}" for module, res in results.items()
+                  for name in res["loaded"] if name not in MODULES[module]]
+    if args.check and violations:
+        sys.exit("Modules load heavy dependencies:\n" + "\n".join(violations))
+
+
+if __name__ == "__main__":
+    main()
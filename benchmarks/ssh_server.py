@@ -0,0 +1,175 @@
+"""
+An in-process SSH server stand-in built on paramiko, for benchmarks and tests that need a real SSH transport without
+an external server. It accepts password authentication for a single user and runs exec requests as local shell
+commands, with their stdin, stdout, stderr, environment and exit code connected to the channel::
+
+    with LocalSSHServer() as server:
+        hook = FabricHook(remote_host=server.host, port=server.port, username=server.username,
+                          password=server.password)
+
+Commands run as the local user, in the current directory. Pseudo-terminals are accepted, but the command still gets
+pipes, so stderr isn't merged into stdout.
+"""
+import os
+import socket
+import subprocess
+import threading
+from typing import Dict, List, Optional
+
+import paramiko
+
+BUFFER_SIZE = 32 * 1024
+
+
+class _ServerInterface(paramiko.ServerInterface):
+
+    def __init__(self, server: "LocalSSHServer"):
+        self.server = server
+        self.environments: Dict[int, Dict[str, str]] = {}
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if username == self.server.username and password == self.server.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_env_request(self, channel, name, value):
+        self.environments.setdefault(channel.get_id(), {})[_decode(name)] = _decode(value)
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        env = dict(os.environ, **self.environments.pop(channel.get_id(), {}))
+        thread = threading.Thread(target=_run_command, args=(channel, _decode(command), env), daemon=True)
+        thread.start()
+        return True
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _run_command(channel: paramiko.Channel, command: str, env: Dict[str, str]):
+    """
+    Runs a command like an SSH server does: in a new session, with its streams connected to the channel.
+    """
+    proc = subprocess.Popen(["/bin/sh", "-c", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, env=env, start_new_session=True)
+
+    def pump_output(stream, send):
+        try:
+            while True:
+                data = os.read(stream.fileno(), BUFFER_SIZE)
+                if not data:
+                    break
+                send(data)
+        except (OSError, EOFError):
+            pass
+
+    def pump_input():
+        try:
+            while True:
+                data = channel.recv(BUFFER_SIZE)
+                if not data:
+                    break
+                proc.stdin.write(data)
+                proc.stdin.flush()
+        except (OSError, EOFError, ValueError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    pumps = [threading.Thread(target=pump_output, args=(proc.stdout, channel.sendall), daemon=True),
+             threading.Thread(target=pump_output, args=(proc.stderr, channel.sendall_stderr), daemon=True)]
+    threading.Thread(target=pump_input, daemon=True).start()
+    for pump in pumps:
+        pump.start()
+    for pump in pumps:
+        pump.join()
+
+    exit_code = proc.wait()
+    try:
+        channel.send_exit_status(exit_code)
+        channel.close()
+    except (OSError, EOFError):
+        pass
+
+
+class LocalSSHServer(object):
+    """
+    SSH server on a local port, which serves every connection from its own paramiko transport thread. Use it as a
+    context manager, or call `start` and `stop`.
+
+    :param username: the user name that's accepted
+    :param password: the password that's accepted
+    :param host: the address to listen on
+    :param port: the port to listen on. If 0 (default), a free port is chosen.
+    """
+
+    def __init__(self,
+                 username: str = "benchmark",
+                 password: str = "benchmark",
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.host_key = paramiko.ECDSAKey.generate()
+        self.connections = 0
+        self._socket: Optional[socket.socket] = None
+        self._transports: List[paramiko.Transport] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LocalSSHServer":
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(100)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+
+    def __enter__(self) -> "LocalSSHServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _accept(self):
+        while self._socket is not None:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                break
+
+            self.connections += 1
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            self._transports = [t for t in self._transports if t.is_active()] + [transport]
+            try:
+                # With an event, the negotiation runs in the transport's thread, so clients are served concurrently
+                transport.start_server(event=threading.Event(), server=_ServerInterface(self))
+            except (paramiko.SSHException, EOFError, OSError):
+                transport.close()
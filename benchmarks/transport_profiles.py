@@ -0,0 +1,101 @@
+"""
+Measures the SSH throughput and local CPU usage of each transport profile in
+:data:`~sai_airflow_plugins.hooks.fabric_transport_profile.TRANSPORT_PROFILES`.
+
+Data is streamed through an exec channel in both directions: ``head -c`` on the server for downloads, and
+``cat > /dev/null`` for uploads. This measures the transport itself, without disk or SFTP overhead. Run it against a
+local SSH server, or against a host on the network you want to tune for::
+
+    python -m benchmarks.transport_profiles --host localhost --user $USER --key-file ~/.ssh/id_ed25519 --size 512
+
+CPU usage is the CPU time of this process divided by the wall-clock time, so 100% means one full core.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List, Optional
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.fabric_transport_profile import TRANSPORT_PROFILES
+
+BUFFER_SIZE = 256 * 1024
+
+
+def measure(direction: str, transport, size: int) -> Dict[str, float]:
+    """
+    Streams `size` bytes over a new channel and measures the throughput and CPU usage.
+    """
+    channel = transport.open_session()
+    started, cpu_started = time.monotonic(), time.process_time()
+
+    if direction == "download":
+        channel.exec_command(f"head -c {size} /dev/zero")
+        received = 0
+        while True:
+            data = channel.recv(BUFFER_SIZE)
+            if not data:
+                break
+            received += len(data)
+        assert received == size, f"Received {received} of {size} bytes"
+    else:
+        channel.exec_command("cat > /dev/null")
+        buffer = bytes(BUFFER_SIZE)
+        sent = 0
+        while sent < size:
+            sent += channel.send(buffer[:min(BUFFER_SIZE, size - sent)])
+        channel.shutdown_write()
+
+    channel.recv_exit_status()
+    duration = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+    channel.close()
+
+    return {"mib_per_s": round(size / duration / 2 ** 20, 1), "cpu_percent": round(100 * cpu / duration, 1)}
+
+
+def run_profile(args: argparse.Namespace, profile: Optional[str]) -> Dict[str, Dict[str, float]]:
+    hook = FabricHook(remote_host=args.host, username=args.user, password=args.password, key_file=args.key_file,
+                      port=args.port, transport_profile=profile)
+    conn = hook.get_fabric_conn()
+
+    started = time.monotonic()
+    conn.open()
+    results = {"handshake": {"seconds": round(time.monotonic() - started, 3)}}
+
+    try:
+        for direction in ("download", "upload"):
+            samples = [measure(direction, conn.transport, args.size * 2 ** 20) for _ in range(args.repeat)]
+            results[direction] = max(samples, key=lambda sample: sample["mib_per_s"])
+    finally:
+        conn.close()
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--key-file")
+    parser.add_argument("--size", type=int, default=256, help="MiB per measurement")
+    parser.add_argument("--repeat", type=int, default=3, help="measurements per direction; the best is reported")
+    parser.add_argument("--profiles", nargs="*", default=["default"] + list(TRANSPORT_PROFILES))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'profile':<10} {'handshake s':>12} {'down MiB/s':>11} {'down CPU%':>10} {'up MiB/s':>9} {'up CPU%':>8}")
+    for profile in args.profiles:
+        res = results[profile] = run_profile(args, None if profile == "default" else profile)
+        print(f"{profile:<10} {res['handshake']['seconds']:>12} {res['download']['mib_per_s']:>11} "
+              f"{res['download']['cpu_percent']:>10} {res['upload']['mib_per_s']:>9} {res['upload']['cpu_percent']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+from sai_airflow_plugins.lazy_loading import lazy_attributes
+
+# The hooks are imported on first use, e.g. `from sai_airflow_plugins.hooks import FabricHook`
+__getattr__, __dir__ = lazy_attributes(globals(), {
+    "FabricHook": "sai_airflow_plugins.hooks.fabric_hook",
+    "MattermostWebhookHook": "sai_airflow_plugins.hooks.mattermost_webhook_hook",
+})
@@ -0,0 +1,63 @@
+import os
+import threading
+import uuid
+from typing import Generic, Iterable, Optional, Type, TypeVar, Union
+
+from airflow.configuration import conf
+from airflow.utils.module_loading import import_string
+
+T = TypeVar("T")
+
+
+class ConfigurableStore(Generic[T]):
+    """
+    A process-wide store whose class can be configured with an option in the ``[sai_airflow_plugins]`` section of the
+    Airflow configuration. The store is created on first use instead of when the module that defines it is imported,
+    so parsing DAG files doesn't import the store class or set it up. The configured class is created without
+    arguments.
+
+    :param option: the configuration option with the import path of the store class
+    :param default_class: the class to use if the option isn't set
+    """
+
+    def __init__(self, option: str, default_class: Type[T]):
+        self.option = option
+        self.default_class = default_class
+        self._store: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """
+        Returns the store, creating it if this is the first call.
+
+        :return: the store
+        """
+        with self._lock:
+            if self._store is None:
+                store_class = conf.get("sai_airflow_plugins", self.option, fallback=None)
+                self._store = import_string(store_class)() if store_class else self.default_class()
+            return self._store
+
+
+def write_file_atomically(path: str, chunks: Iterable[Union[bytes, str]], mode: str = "wb"):
+    """
+    Writes a file of a file-based store. The content is written to a temporary file next to it, which then replaces
+    the file, so a reader never sees a partially written file. The directory is created if it doesn't exist.
+
+    :param path: the path of the file
+    :param chunks: the content of the file
+    :param mode: ``wb`` for bytes or ``w`` for strings
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from airflow.configuration import conf
+from airflow.models import Connection
+
+
+class ConnectionCache(object):
+    """
+    A thread-safe, in-process cache for Airflow `Connection` objects, to avoid a query on the metadata database
+    each time a hook is created. Entries expire after `ttl` seconds. A `ttl` of zero or less disables the cache.
+
+    The process-wide instance returned by `get_connection_cache` takes its TTL from the ``connection_cache_ttl``
+    option in the ``[sai_airflow_plugins]`` section of the Airflow configuration, which defaults to 60 seconds.
+
+    :param ttl: number of seconds a cached connection stays valid
+    """
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Connection]] = {}
+
+    def get(self, conn_id: str, loader: Callable[[str], Connection]) -> Connection:
+        """
+        Returns the cached connection for `conn_id`, or loads it with `loader` if it's not cached or expired.
+
+        :param conn_id: connection id
+        :param loader: callable that retrieves the connection, e.g. `BaseHook.get_connection`
+        :return: `Connection` object
+        """
+        if self.ttl <= 0:
+            return loader(conn_id)
+
+        with self._lock:
+            entry = self._entries.get(conn_id)
+            if entry and time.monotonic() < entry[0]:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Load outside the lock, so a slow metastore doesn't block lookups of other connections
+        conn = loader(conn_id)
+
+        with self._lock:
+            self._entries[conn_id] = (time.monotonic() + self.ttl, conn)
+
+        return conn
+
+    def invalidate(self, conn_id: Optional[str] = None):
+        """
+        Removes a connection from the cache, e.g. after its credentials turned out to be invalid.
+
+        :param conn_id: connection id to remove. If None, the whole cache is cleared.
+        """
+        with self._lock:
+            if conn_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(conn_id, None)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counters and the number of cached connections.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+_default_cache = ConnectionCache(ttl=conf.getfloat("sai_airflow_plugins", "connection_cache_ttl", fallback=60))
+
+
+def get_connection_cache() -> ConnectionCache:
+    """
+    Returns the process-wide connection cache that's used by the hooks in this package.
+
+    :return: `ConnectionCache` object
+    """
+    return _default_cache
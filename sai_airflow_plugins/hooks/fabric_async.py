@@ -0,0 +1,251 @@
+import asyncio
+import codecs
+import re
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fabric import Connection, Result
+from invoke import FailingResponder, StreamWatcher
+from invoke.exceptions import AuthFailure, ResponseNotAccepted
+from paramiko import Channel
+
+from sai_airflow_plugins.hooks.fabric_compression import OutputCompression
+from sai_airflow_plugins.hooks.fabric_metrics import CommandTiming
+from sai_airflow_plugins.hooks.fabric_output import DEFAULT_WINDOW_SIZE, CapturedResult, OutputCapture
+from sai_airflow_plugins.hooks.fabric_process import RemoteProcessGroup
+
+
+class AsyncFabricRunner(object):
+    """
+    Runs commands on a Fabric `Connection` from an asyncio event loop. Unlike Fabric's own runner, which starts
+    several threads for every command, all channels are driven by the event loop. This makes it possible to run many
+    commands at the same time from a single worker process.
+
+    The semantics are the same as those of Fabric's run and sudo functions: the result is a Fabric `Result`, watchers
+    respond to the output of the command, and the environment, pseudo-terminal and sudo options behave the same way.
+    Output is read as soon as the channel signals that stdout has data. Output on stderr is picked up within
+    `poll_interval` seconds, since paramiko only signals stdout data.
+
+    :param conn: an open `Connection` object
+    :param poll_interval: the maximum number of seconds between checks of the channel
+    :param encoding: the encoding of the command output
+    """
+
+    def __init__(self, conn: Connection, poll_interval: float = 0.05, encoding: str = "utf-8"):
+        self.conn = conn
+        self.poll_interval = poll_interval
+        self.encoding = encoding
+
+    async def run(self,
+                  command: str,
+                  pty: bool = False,
+                  env: Optional[Dict[str, str]] = None,
+                  watchers_factory: Optional[Callable[[], List[StreamWatcher]]] = None,
+                  hide: bool = False,
+                  sudo: bool = False,
+                  password: Optional[str] = None,
+                  user: Optional[str] = None,
+                  max_output_memory: Optional[int] = None,
+                  output_window_size: int = DEFAULT_WINDOW_SIZE,
+                  process: Optional[RemoteProcessGroup] = None,
+                  compression: Optional[OutputCompression] = None,
+                  timing: Optional[CommandTiming] = None) -> Result:
+        """
+        Runs a command and waits for it to finish. A non-zero exit code doesn't raise an exception, like Fabric's
+        ``warn=True``.
+
+        :param command: the command to execute
+        :param pty: request a pseudo-terminal from the server
+        :param env: a dict of shell environment variables
+        :param watchers_factory: callable that returns a new list of watchers. It's called for stdout and stderr
+                                 separately, since watchers keep track of the output stream they've seen.
+        :param hide: capture the command output without echoing it
+        :param sudo: run the command with sudo, like Fabric's sudo function
+        :param password: the sudo password
+        :param user: run the command as this user when using sudo
+        :param max_output_memory: capture stdout and stderr with an `OutputCapture` that keeps at most this many
+                                  characters of each in memory, and return a `CapturedResult`. If None, the full
+                                  output is kept in memory.
+        :param output_window_size: the number of characters at the start and the end of the output that are kept in
+                                   memory when using `max_output_memory`
+        :param process: keep track of the process group of the command with this `RemoteProcessGroup`, so it can be
+                        terminated from another channel
+        :param compression: compress stdout on the remote host with this `OutputCompression`, and decompress it
+                            before the watchers and the result see it. Don't use it with `pty`.
+        :param timing: mark the opened channel and the first output of the command in this `CommandTiming`
+        :return: The `Result` of the command; raises `AuthFailure` if the sudo password was rejected and
+                 `ResponseNotAccepted` if another `FailingResponder` failed
+        """
+        env = env or {}
+        run_command = self._get_sudo_command(command, env, user) if sudo else command
+
+        def create_watchers() -> List[StreamWatcher]:
+            watchers = list(watchers_factory()) if watchers_factory else []
+            if sudo:
+                watchers.append(FailingResponder(pattern=re.escape(self.conn.config.sudo.prompt),
+                                                 response=f"{password}\n",
+                                                 sentinel="Sorry, try again.\n"))
+            return watchers
+
+        loop = asyncio.get_running_loop()
+        start_command = compression.wrap(run_command) if compression else run_command
+        start_command = process.wrap(start_command) if process else start_command
+        channel = await loop.run_in_executor(None, self._start_channel, start_command, pty, env)
+        if timing is not None:
+            timing.channel_opened()
+
+        try:
+            captures = None
+            if max_output_memory is not None:
+                captures = (OutputCapture(max_output_memory, output_window_size, self.encoding),
+                            OutputCapture(max_output_memory, output_window_size, self.encoding))
+            stdout, stderr = await self._communicate(channel, create_watchers(), create_watchers(), hide, captures,
+                                                     compression, timing)
+            exited = channel.recv_exit_status()
+        except ResponseNotAccepted:
+            if sudo:
+                raise AuthFailure(result=Result(connection=self.conn, command=run_command, exited=-1),
+                                  prompt=self.conn.config.sudo.prompt)
+            raise
+        finally:
+            channel.close()
+
+        result_kwargs = dict(connection=self.conn, command=run_command, exited=exited, pty=pty, env=env,
+                             encoding=self.encoding, hide=("stdout", "stderr") if hide else ())
+        if captures:
+            return CapturedResult(stdout_capture=captures[0], stderr_capture=captures[1], **result_kwargs)
+
+        return Result(stdout=stdout, stderr=stderr, **result_kwargs)
+
+    def _get_sudo_command(self, command: str, env: Dict[str, str], user: Optional[str]) -> str:
+        """
+        Wraps a command in sudo the same way as invoke's sudo function.
+        """
+        user_flags = f"-H -u {user} " if user is not None else ""
+        env_flags = f"--preserve-env='{','.join(env.keys())}' " if env else ""
+        return f"sudo -S -p '{self.conn.config.sudo.prompt}' {env_flags}{user_flags}{command}"
+
+    def _start_channel(self, command: str, pty: bool, env: Dict[str, str]) -> Channel:
+        """
+        Opens a channel and starts the command. This is blocking, as each step waits for the server's reply.
+        """
+        channel = self.conn.transport.open_session()
+
+        if pty:
+            channel.get_pty(width=80, height=24)
+
+        if env:
+            if self.conn.inline_ssh_env:
+                parameters = " ".join(f"{k}={v}" for k, v in sorted(env.items()))
+                command = f"export {parameters} && {command}"
+            else:
+                channel.update_environment(env)
+
+        channel.exec_command(command)
+        channel.setblocking(0)
+        return channel
+
+    async def _communicate(self,
+                           channel: Channel,
+                           stdout_watchers: List[StreamWatcher],
+                           stderr_watchers: List[StreamWatcher],
+                           hide: bool,
+                           captures: Optional[Tuple[OutputCapture, OutputCapture]] = None,
+                           compression: Optional[OutputCompression] = None,
+                           timing: Optional[CommandTiming] = None) -> Tuple[str, str]:
+        """
+        Reads the output of the channel and lets the watchers respond to it, until the command has exited.
+        If `captures` are provided, the output is captured in these instead and empty strings are returned. If
+        `compression` is provided, stdout is decompressed with it. The first output is marked in `timing`.
+        """
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        fd = channel.fileno()
+        loop.add_reader(fd, ready.set)
+        watching = True
+
+        stdout_capture, stderr_capture = captures or (None, None)
+        stdout = _Stream(self.encoding, None if hide else sys.stdout, stdout_watchers, stdout_capture, compression)
+        stderr = _Stream(self.encoding, None if hide else sys.stderr, stderr_watchers, stderr_capture)
+
+        try:
+            while True:
+                if timing is not None and (channel.recv_ready() or channel.recv_stderr_ready()):
+                    timing.output_received()
+                while channel.recv_ready():
+                    stdout.feed(channel, channel.recv(32768))
+                while channel.recv_stderr_ready():
+                    stderr.feed(channel, channel.recv_stderr(32768))
+
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+
+                # After EOF the channel stays readable, so stop watching it and just poll for the exit status
+                if channel.eof_received and watching:
+                    loop.remove_reader(fd)
+                    watching = False
+
+                if watching:
+                    try:
+                        await asyncio.wait_for(ready.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    ready.clear()
+                else:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            if watching:
+                loop.remove_reader(fd)
+
+        return stdout.finish(channel), stderr.finish(channel)
+
+
+class _Stream(object):
+    """
+    Decodes the output of one stream of a channel, echoes it and lets watchers respond to it. The output is kept in
+    memory, or in `capture` if provided. If `compression` is provided, the output is decompressed first.
+    """
+
+    def __init__(self,
+                 encoding: str,
+                 echo,
+                 watchers: List[StreamWatcher],
+                 capture: Optional[OutputCapture] = None,
+                 compression: Optional[OutputCompression] = None):
+        self.encoding = encoding
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.echo = echo
+        self.watchers = watchers
+        self.capture = capture
+        self.compression = compression
+        self.parts = []
+
+    def feed(self, channel: Channel, data: bytes, final: bool = False):
+        if self.compression is not None:
+            data = self.compression.decompress(data) + (self.compression.flush() if final else b"")
+
+        text = self.decoder.decode(data, final)
+        if not text:
+            return
+
+        if self.capture is not None:
+            self.capture.append(text)
+        else:
+            self.parts.append(text)
+
+        if self.echo:
+            self.echo.write(text)
+            self.echo.flush()
+
+        if self.watchers:
+            if self.capture is not None:
+                responses = self.capture.respond(self.watchers)
+            else:
+                stream = "".join(self.parts)
+                responses = (response for watcher in self.watchers for response in watcher.submit(stream))
+            for response in responses:
+                channel.sendall(response.encode(self.encoding))
+
+    def finish(self, channel: Channel) -> str:
+        self.feed(channel, b"", final=True)
+        return "".join(self.parts)
@@ -0,0 +1,226 @@
+import codecs
+import zlib
+from typing import Optional
+
+from airflow.exceptions import AirflowException
+from fabric.runners import Remote
+
+GZIP = "gzip"
+ZSTD = "zstd"
+AUTO = "auto"
+
+COMPRESSIONS = (GZIP, ZSTD, AUTO)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+COMPRESS_COMMANDS = {
+    GZIP: "gzip -c",
+    ZSTD: "zstd -q -c",
+}
+
+
+def zstd_available() -> bool:
+    """
+    Returns whether zstd compressed output can be decompressed, which requires the optional ``zstandard`` package.
+    """
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+class OutputCompression(object):
+    """
+    Compresses the stdout of a remote command on the remote host and decompresses it incrementally while it's
+    received. This reduces the number of bytes sent over the network for commands with a lot of text output, such as
+    dumps, listings and logs, without compressing the full SSH connection.
+
+    The command is wrapped to pipe its stdout through ``gzip`` or ``zstd``, while keeping its exit code. If the
+    compression program isn't installed on the remote host, the next one is used, and finally the output is sent as
+    it is. The format is detected from the received data, so the output is always decompressed correctly. Stderr
+    isn't compressed, so prompts on stderr, e.g. of sudo, can still be answered.
+
+    The output must not go through a pseudo-terminal, which would change the compressed bytes. Use `DecompressingRemote`
+    as Fabric runner, or pass it to `AsyncFabricRunner.run`, which both wrap the command, including a sudo prefix.
+
+    :param compression: ``gzip``, ``zstd`` or ``auto``. With ``auto``, zstd is used if the ``zstandard`` package is
+                        installed locally and ``zstd`` on the remote host, and gzip otherwise. ``zstd`` requires the
+                        ``zstandard`` package.
+    """
+
+    def __init__(self, compression: str = AUTO):
+        if compression not in COMPRESSIONS:
+            raise AirflowException(f"Unknown output compression {compression!r}. Use one of {', '.join(COMPRESSIONS)}.")
+
+        if compression == ZSTD and not zstd_available():
+            raise AirflowException("The zstandard package is required to decompress zstd output. Install it with "
+                                   "`pip install zstandard`, or use gzip instead.")
+
+        self.compression = compression
+        self.format: Optional[str] = None
+        self.compressed_size = 0
+        self.size = 0
+        self._header = b""
+        self._decompressor = None
+        self._finished = False
+
+    @property
+    def ratio(self) -> float:
+        """
+        The size of the output divided by the number of bytes that were received, or 1.0 if nothing was received.
+        """
+        return self.size / self.compressed_size if self.compressed_size else 1.0
+
+    def get_compress_command(self) -> str:
+        """
+        Returns the shell command that compresses its stdin to stdout, falling back to the next program if the
+        preferred one isn't available.
+
+        :return: the command
+        """
+        preferred = [GZIP]
+        if self.compression == ZSTD or (self.compression == AUTO and zstd_available()):
+            preferred.insert(0, ZSTD)
+
+        command = ""
+        for program in preferred:
+            command += f"if command -v {program} >/dev/null 2>&1; then {COMPRESS_COMMANDS[program]}; el"
+
+        return f"{command}se cat; fi"
+
+    def wrap(self, command: str) -> str:
+        """
+        Wraps a command to compress its stdout. The exit code of the command is passed on through a separate file
+        descriptor, since a plain POSIX shell has no ``pipefail``.
+
+        :param command: the command, including a sudo prefix if any
+        :return: the wrapped command
+        """
+        # File descriptor 3 captures the exit code, and 4 is the original stdout for the compressed output. The
+        # command runs in a subshell, so an `exit` in it still passes on the exit code, and doesn't get these file
+        # descriptors, so it can't keep them open in background processes. The newline after the command terminates
+        # a heredoc at its end, e.g. of a sudo shell.
+        return f"{{ rc=$( {{ {{ ( {command}\n) 3>&- 4>&-; echo $? >&3; }} | " \
+               f"{{ {self.get_compress_command()}; }} >&4 3>&-; }} 3>&1 ); }} 4>&1; exit ${{rc:-255}}"
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        Decompresses the next part of the received output. The first bytes are kept until the format is known.
+
+        :param data: the received bytes
+        :return: the decompressed bytes, which may be empty
+        """
+        self.compressed_size += len(data)
+
+        if self._decompressor is None and self.format is None:
+            self._header += data
+            header = self._header
+            if len(header) < len(ZSTD_MAGIC) and (ZSTD_MAGIC.startswith(header) or GZIP_MAGIC.startswith(header)):
+                return b""
+
+            data, self._header = self._header, b""
+            self._start(data)
+
+        return self._output(self._decompressor.decompress(data) if self._decompressor else data)
+
+    def flush(self) -> bytes:
+        """
+        Returns the rest of the output after all data has been received. Subsequent calls return empty bytes.
+
+        :return: the decompressed bytes
+        """
+        if self._finished:
+            return b""
+
+        self._finished = True
+        if self.format is None:
+            # Less data than a format header was received
+            self.format = "none"
+            return self._output(self._header)
+
+        if self._decompressor is not None and hasattr(self._decompressor, "flush"):
+            return self._output(self._decompressor.flush())
+
+        return b""
+
+    def _start(self, data: bytes):
+        if data.startswith(GZIP_MAGIC):
+            self.format = GZIP
+            # Accept concatenated gzip members, like the gzip program does
+            self._decompressor = _GzipDecompressor()
+        elif data.startswith(ZSTD_MAGIC):
+            self.format = ZSTD
+            import zstandard
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            # The compression program wasn't available on the remote host
+            self.format = "none"
+
+    def _output(self, data: bytes) -> bytes:
+        self.size += len(data)
+        return data
+
+
+class _GzipDecompressor(object):
+    """
+    Incremental decompressor for a gzip stream with one or more members.
+    """
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes) -> bytes:
+        output = self._decompressor.decompress(data)
+        while self._decompressor.eof and self._decompressor.unused_data:
+            data = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            output += self._decompressor.decompress(data)
+        return output
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+
+class DecompressingRemote(Remote):
+    """
+    Fabric runner that wraps the command with `OutputCompression.wrap` and decompresses stdout before watchers and
+    the result see it. Stdout is decoded incrementally, so multibyte characters that are split over two chunks of
+    output are decoded correctly. Pass it to ``Connection._run`` or ``Connection._sudo``.
+
+    :param compression: the `OutputCompression` of the command, which also counts the received and decompressed
+                        bytes
+    """
+
+    def __init__(self, *args, compression: OutputCompression, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compression = compression
+
+    def start(self, command, shell, env, timeout=None):
+        return super().start(self.compression.wrap(command), shell, env, timeout=timeout)
+
+    def read_proc_stdout(self, num_bytes):
+        while True:
+            data = super().read_proc_stdout(num_bytes)
+            if not data:
+                return self.compression.flush()
+
+            data = self.compression.decompress(data)
+            if data:
+                return data
+
+    def read_proc_output(self, reader):
+        if reader != self.read_proc_stdout:
+            yield from super().read_proc_output(reader)
+            return
+
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        while True:
+            data = reader(self.read_chunk_size)
+            text = decoder.decode(data, final=not data)
+            if text:
+                yield text
+            if not data:
+                break
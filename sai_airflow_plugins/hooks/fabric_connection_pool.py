@@ -0,0 +1,387 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from airflow.exceptions import AirflowException
+from airflow.utils.log.logging_mixin import LoggingMixin
+from fabric import Connection
+
+
+class PoolKey(NamedTuple):
+    """
+    Identifies a set of interchangeable connections in a `FabricConnectionPool`. Two connections with the same key
+    connect to the same host with the same user and credentials, so they can be handed out to any task.
+    """
+    conn_id: Optional[str]
+    host: str
+    user: str
+    port: int
+    auth_fingerprint: str
+
+
+class _PooledConnection(object):
+    """
+    Bookkeeping for a single connection managed by the pool.
+    """
+
+    def __init__(self, key: PoolKey, conn: Connection):
+        self.key = key
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class FabricConnectionPool(LoggingMixin):
+    """
+    A thread-safe pool of Fabric `Connection` objects, shared by all tasks that run in the same worker process.
+
+    Connections are grouped by a `PoolKey`. A released connection stays open and is handed out again to the next
+    task that asks for the same key, which saves the TCP, key exchange and authentication round-trips of a new
+    connection. Idle connections are checked for liveness before they are reused and closed once they have been idle
+    for longer than `max_idle_time`.
+
+    :param max_idle_time: number of seconds after which an idle connection is closed and removed from the pool
+    :param max_per_host: maximum number of connections (idle and in use) to a single host and port. Idle connections
+                         with a different key are closed to make room, otherwise `acquire` waits until a connection
+                         to that host is released.
+    :param acquire_timeout: number of seconds `acquire` waits for a free slot before raising `AirflowException`
+    """
+
+    def __init__(self,
+                 max_idle_time: float = 300,
+                 max_per_host: int = 8,
+                 acquire_timeout: float = 60):
+        super().__init__()
+        self.max_idle_time = max_idle_time
+        self.max_per_host = max_per_host
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Condition()
+        self._idle: Dict[PoolKey, List[_PooledConnection]] = defaultdict(list)
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._host_counts: Dict[Tuple[str, int], int] = defaultdict(int)
+
+    def acquire(self, key: PoolKey, factory: Callable[[], Connection]) -> Connection:
+        """
+        Returns a live idle connection for `key` if there is one, otherwise creates a new one with `factory`.
+        The returned connection must be handed back with `release`.
+
+        :param key: pool key of the requested connection
+        :param factory: callable that creates a new, unopened `Connection` for this key
+        :return: `Connection` object
+        """
+        host = (key.host, key.port)
+        deadline = time.monotonic() + self.acquire_timeout
+
+        with self._lock:
+            while True:
+                self._evict_expired()
+
+                while self._idle[key]:
+                    pooled = self._idle[key].pop()
+                    if self._is_alive(pooled.conn):
+                        self.log.info(f"Reusing pooled connection to {key.user}@{key.host}:{key.port}")
+                        self._in_use[id(pooled.conn)] = pooled
+                        return pooled.conn
+                    self._discard(pooled)
+
+                if self._host_counts[host] < self.max_per_host or self._evict_one_for_host(host):
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AirflowException(
+                        f"Timed out waiting for a free connection to {key.host}:{key.port}: the pool already holds "
+                        f"{self.max_per_host} connections to this host."
+                    )
+                self._lock.wait(remaining)
+
+            # Reserve the slot before creating the connection outside the lock
+            self._host_counts[host] += 1
+
+        try:
+            conn = factory()
+        except Exception:
+            with self._lock:
+                self._host_counts[host] -= 1
+                self._lock.notify_all()
+            raise
+
+        with self._lock:
+            self._in_use[id(conn)] = _PooledConnection(key, conn)
+
+        return conn
+
+    def release(self, conn: Connection, discard: bool = False):
+        """
+        Hands a connection back to the pool. Connections that are no longer alive, or that are explicitly discarded,
+        are closed instead of kept for reuse. Releasing a connection that doesn't belong to this pool closes it.
+
+        :param conn: connection that was returned by `acquire`
+        :param discard: close the connection instead of keeping it for reuse
+        """
+        with self._lock:
+            pooled = self._in_use.pop(id(conn), None)
+
+            if pooled is None:
+                self.log.warning("Released a connection that isn't managed by the pool. Closing it.")
+                conn.close()
+                return
+
+            if discard or not self._is_alive(conn):
+                self._discard(pooled)
+            else:
+                pooled.released_at = time.monotonic()
+                self._idle[pooled.key].append(pooled)
+
+            self._lock.notify_all()
+
+    @contextmanager
+    def connection(self, key: PoolKey, factory: Callable[[], Connection]) -> Iterator[Connection]:
+        """
+        Context manager that acquires a connection and releases it on exit. The connection is discarded if the body
+        raises an exception, as its state can't be trusted anymore.
+
+        :param key: pool key of the requested connection
+        :param factory: callable that creates a new, unopened `Connection` for this key
+        """
+        conn = self.acquire(key, factory)
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def evict_idle(self):
+        """
+        Closes all idle connections that exceeded `max_idle_time`.
+        """
+        with self._lock:
+            self._evict_expired()
+            self._lock.notify_all()
+
+    def close_all(self):
+        """
+        Closes all idle connections. Connections that are in use are closed when they are released.
+        """
+        with self._lock:
+            for pooled_list in self._idle.values():
+                for pooled in pooled_list:
+                    self._discard(pooled)
+            self._idle.clear()
+
+            # Forget connections in use, so they are closed on release
+            for pooled in self._in_use.values():
+                self._host_counts[(pooled.key.host, pooled.key.port)] -= 1
+            self._in_use.clear()
+            self._lock.notify_all()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Number of idle and in-use connections in the pool.
+        """
+        with self._lock:
+            return {
+                "idle": sum(len(pooled_list) for pooled_list in self._idle.values()),
+                "in_use": len(self._in_use)
+            }
+
+    @staticmethod
+    def _is_alive(conn: Connection) -> bool:
+        """
+        Checks whether a connection can still be used, by checking its transport and sending an SSH ignore message.
+        """
+        if not conn.is_connected:
+            return False
+
+        try:
+            conn.transport.send_ignore()
+        except Exception:
+            return False
+
+        return conn.is_connected
+
+    def _discard(self, pooled: _PooledConnection):
+        """
+        Closes a connection and frees its host slot. Must be called with the lock held.
+        """
+        self._host_counts[(pooled.key.host, pooled.key.port)] -= 1
+        try:
+            pooled.conn.close()
+        except Exception as e:
+            self.log.warning(f"Error while closing pooled connection to {pooled.key.host}: {e}")
+
+    def _evict_expired(self):
+        """
+        Closes idle connections that exceeded `max_idle_time`. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        for key, pooled_list in self._idle.items():
+            expired = [p for p in pooled_list if now - p.released_at > self.max_idle_time]
+            for pooled in expired:
+                pooled_list.remove(pooled)
+                self._discard(pooled)
+
+    def _evict_one_for_host(self, host: Tuple[str, int]) -> bool:
+        """
+        Closes the least recently used idle connection to `host`, to make room for a connection with another key.
+        Must be called with the lock held.
+
+        :return: True if a connection was closed
+        """
+        candidates = [p for pooled_list in self._idle.values() for p in pooled_list
+                      if (p.key.host, p.key.port) == host]
+        if not candidates:
+            return False
+
+        oldest = min(candidates, key=lambda p: p.released_at)
+        self._idle[oldest.key].remove(oldest)
+        self._discard(oldest)
+        return True
+
+
+class FabricGatewayPool(LoggingMixin):
+    """
+    A thread-safe registry of open jump host connections, shared by all tasks that run in the same worker process.
+
+    Unlike `FabricConnectionPool`, which hands out a connection to one task at a time, a jump host connection is used
+    by all target connections at the same time: each target connection gets its own ``direct-tcpip`` channel on the
+    single authenticated transport. This saves the handshake with the jump host for every target connection.
+    The connection is checked for liveness before a new channel is opened on it, and reconnected if necessary. It isn't
+    closed after some idle time like pooled connections, because target connections may still be using it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[PoolKey, threading.Lock] = defaultdict(threading.Lock)
+        self._gateways: Dict[PoolKey, _PooledConnection] = {}
+        self._channels = 0
+
+    def get(self, key: PoolKey, factory: Callable[[], Connection]) -> Connection:
+        """
+        Returns the open jump host connection for `key`, or creates and opens one with `factory`. The connection
+        stays owned by the pool, so don't close it.
+
+        :param key: pool key of the jump host connection
+        :param factory: callable that creates a new, unopened `Connection` to the jump host
+        :return: an open `Connection` object
+        """
+        with self._lock:
+            key_lock = self._key_locks[key]
+
+        # Connecting to one jump host doesn't block the others
+        with key_lock:
+            with self._lock:
+                pooled = self._gateways.get(key)
+
+            if pooled is not None and not FabricConnectionPool._is_alive(pooled.conn):
+                self.log.info(f"Jump host connection to {key.host}:{key.port} is no longer alive. Reconnecting.")
+                self.discard(key)
+                pooled = None
+
+            if pooled is None:
+                self.log.info(f"Connecting to jump host {key.user}@{key.host}:{key.port}")
+                conn = factory()
+                conn.open()
+                pooled = _PooledConnection(key, conn)
+                with self._lock:
+                    self._gateways[key] = pooled
+
+            with self._lock:
+                self._channels += 1
+
+            return pooled.conn
+
+    def discard(self, key: PoolKey):
+        """
+        Closes the jump host connection for `key`. The next target connection through it connects again.
+
+        :param key: pool key of the jump host connection
+        """
+        with self._lock:
+            pooled = self._gateways.pop(key, None)
+
+        if pooled is not None:
+            self._close(pooled)
+
+    def close_all(self):
+        """
+        Closes all jump host connections. Target connections that use them lose their connection as well.
+        """
+        with self._lock:
+            gateways = list(self._gateways.values())
+            self._gateways.clear()
+
+        for pooled in gateways:
+            self._close(pooled)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Number of open jump host connections, and the number of channels that were requested through them.
+        """
+        with self._lock:
+            return {"gateways": len(self._gateways), "channels": self._channels}
+
+    def _close(self, pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception as e:
+            self.log.warning(f"Error while closing jump host connection to {pooled.key.host}: {e}")
+
+
+class PooledGateway(object):
+    """
+    Jump host for the ``gateway`` argument of a Fabric `Connection`. When the target connection is opened, Fabric
+    calls `open` and opens a ``direct-tcpip`` channel on `transport`. The jump host connection is taken from the
+    process-wide `FabricGatewayPool`, so it's shared with other target connections and stays open when the target
+    connection is closed.
+
+    :param key: pool key of the jump host connection
+    :param factory: callable that creates a new, unopened `Connection` to the jump host
+    """
+
+    def __init__(self, key: PoolKey, factory: Callable[[], Connection]):
+        self.key = key
+        self.factory = factory
+        self._conn = None
+
+    def open(self):
+        self._conn = get_gateway_pool().get(self.key, self.factory)
+
+    @property
+    def transport(self):
+        return self._conn.transport
+
+    def close(self):
+        # The jump host connection is shared, so it's left open
+        pass
+
+
+_default_pool = FabricConnectionPool()
+
+
+def get_connection_pool() -> FabricConnectionPool:
+    """
+    Returns the process-wide connection pool that's used by `FabricHook` by default.
+
+    :return: `FabricConnectionPool` object
+    """
+    return _default_pool
+
+
+_default_gateway_pool = FabricGatewayPool()
+
+
+def get_gateway_pool() -> FabricGatewayPool:
+    """
+    Returns the process-wide pool of jump host connections that's used by `FabricHook`.
+
+    :return: `FabricGatewayPool` object
+    """
+    return _default_gateway_pool
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shlex
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from airflow.configuration import conf
+from airflow.exceptions import AirflowException
+from airflow.models import Variable
+from fabric import Connection
+
+from sai_airflow_plugins.hooks.configurable_store import ConfigurableStore, write_file_atomically
+
+MISSING = "missing"
+
+
+class FingerprintStore(ABC):
+    """
+    Base class of the stores that keep the fingerprint of the last successful run of a task. The store that's used by
+    default is configured with the ``fingerprint_store`` option, see `get_fingerprint_store`.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """
+        Reads a fingerprint.
+
+        :param key: the key of the fingerprint, e.g. the DAG and task id
+        :return: the fingerprint, or None if there is none
+        """
+
+    @abstractmethod
+    def set(self, key: str, fingerprint: str):
+        """
+        Writes a fingerprint, replacing the previous one.
+
+        :param key: the key of the fingerprint, e.g. the DAG and task id
+        :param fingerprint: the fingerprint
+        """
+
+
+class LocalFingerprintStore(FingerprintStore):
+    """
+    Stores fingerprints as files in a local directory. With more than one worker this directory must be on a shared
+    filesystem, otherwise a task only skips its work on the worker that ran it before. The default directory is taken
+    from the ``fingerprint_dir`` option in the ``[sai_airflow_plugins]`` section of the Airflow configuration.
+
+    :param root: the directory of the fingerprints
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.expanduser(root or conf.get(
+            "sai_airflow_plugins", "fingerprint_dir",
+            fallback=os.path.join(tempfile.gettempdir(), "sai_airflow_plugins_fingerprints")
+        ))
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, fingerprint: str):
+        write_file_atomically(self._path(key), [fingerprint], mode="w")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+
+class VariableFingerprintStore(FingerprintStore):
+    """
+    Stores fingerprints as Airflow Variables, so they're shared by all workers through the metadata database.
+
+    :param prefix: the prefix of the Variable keys
+    """
+
+    def __init__(self, prefix: str = "sai_airflow_plugins_fingerprint"):
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return Variable.get(f"{self.prefix}/{key}", default_var=None)
+
+    def set(self, key: str, fingerprint: str):
+        Variable.set(f"{self.prefix}/{key}", fingerprint)
+
+
+def stat_remote_files(conn: Connection, paths: List[str], hash_files: bool = False) -> List[str]:
+    """
+    Gets the size and modification time of remote files, and optionally their SHA-256 hash, with a single command.
+
+    :param conn: the `Connection` object to use
+    :param paths: the remote paths. A relative path is relative to the home directory of the remote user.
+    :param hash_files: also hash the content of the files, which is slower but doesn't depend on modification times
+    :return: a line per path with its size and modification time, followed by its hash if requested, or ``missing``
+             if it doesn't exist
+    """
+    if not paths:
+        return []
+
+    hash_command = "; sha256sum -- \"$f\" | cut -d ' ' -f 1" if hash_files else ""
+    command = f"for f in {' '.join(shlex.quote(path) for path in paths)}; do " \
+              f"if [ -e \"$f\" ]; then {{ stat -c '%s %Y' -- \"$f\"{hash_command}; }} | paste -sd ' '; " \
+              f"else echo {MISSING}; fi; done"
+
+    res = conn.run(command, hide=True, warn=True)
+    lines = res.stdout.splitlines()
+    if res.exited != 0 or len(lines) != len(paths):
+        raise AirflowException(f"Could not get the state of the remote files {paths}: {res.stderr.strip()}")
+
+    return lines
+
+
+def compute_fingerprint(conn: Connection,
+                        command: Any,
+                        environment: Optional[Dict[str, Any]] = None,
+                        input_files: Optional[List[str]] = None,
+                        hash_files: bool = False,
+                        **extra: Any) -> str:
+    """
+    Computes the fingerprint of a remote command: a hash of the host, the user, the command, the environment and the
+    state of the remote files that the command depends on. The remote files are checked with a single command.
+
+    :param conn: the `Connection` object to use
+    :param command: the rendered command, or a list of commands
+    :param environment: the environment variables of the command
+    :param input_files: the remote files that the outcome of the command depends on
+    :param hash_files: use the hash of the input files instead of only their size and modification time
+    :param extra: other JSON-serializable values that the outcome of the command depends on
+    :return: the fingerprint as a hex string
+    """
+    input_files = input_files or []
+    state = {
+        "host": conn.host,
+        "port": conn.port,
+        "user": conn.user,
+        "command": command,
+        "environment": environment or {},
+        "files": dict(zip(input_files, stat_remote_files(conn, input_files, hash_files))),
+        "extra": extra,
+    }
+    return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+
+_default_store = ConfigurableStore("fingerprint_store", LocalFingerprintStore)
+
+
+def get_fingerprint_store() -> FingerprintStore:
+    """
+    Returns the process-wide fingerprint store. It's an instance of the class in the ``fingerprint_store`` option in
+    the ``[sai_airflow_plugins]`` section of the Airflow configuration, which defaults to `LocalFingerprintStore`. It's
+    created on the first call.
+
+    :return: `FingerprintStore` object
+    """
+    return _default_store.get()
@@ -1,31 +1,119 @@
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Union
+
 from airflow.contrib.hooks.ssh_hook import SSHHook
 from airflow.exceptions import AirflowException
-from fabric import Connection
-from invoke import FailingResponder
+from airflow.models import Connection as AirflowConnection
+from fabric import Connection, Result
+from invoke import FailingResponder, StreamWatcher
+from paramiko import PKey
+
+from sai_airflow_plugins.hooks.connection_cache import get_connection_cache
+from sai_airflow_plugins.hooks.fabric_async import AsyncFabricRunner
+from sai_airflow_plugins.hooks.fabric_connection_pool import PoolKey, PooledGateway, get_connection_pool
+from sai_airflow_plugins.hooks.fabric_key_cache import get_key_cache
+from sai_airflow_plugins.hooks.fabric_known_hosts import KnownHostsPolicy, get_host_key_name, get_known_hosts_index
+from sai_airflow_plugins.hooks.fabric_metrics import PhaseTimer
+from sai_airflow_plugins.hooks.fabric_sync import DEFAULT_BLOCK_SIZE, DEFAULT_DELTA_THRESHOLD, DirectorySync, SyncResult
+from sai_airflow_plugins.hooks.fabric_transfer import DEFAULT_CHUNK_SIZE, GET, PUT, ChunkedTransfer, TransferResult
+from sai_airflow_plugins.hooks.fabric_transport_profile import TRANSPORT_FACTORY_SUPPORTED, get_transport_profile
+
+
+class CommandResult(NamedTuple):
+    """
+    The outcome of a single command executed with `FabricHook.run_many`.
+    """
+    command: str
+    exited: int
+    stdout: str
+    stderr: str
+    duration: float
 
 
 class FabricHook(SSHHook):
     """
     This hook allows you to connect to an SSH remote host and run commands on it using the
     [Fabric](https://www.fabfile.org) library. It inherits from `SSHHook` and uses its input arguments for setting
-    up the connection.
+    up the connection. The Airflow connection is resolved through the process-wide
+    :class:`~sai_airflow_plugins.hooks.connection_cache.ConnectionCache`, and private keys are parsed once per process
+    using the :class:`~sai_airflow_plugins.hooks.fabric_key_cache.PrivateKeyCache`.
 
     :param ssh_conn_id: connection id from airflow Connections
     :param inline_ssh_env: whether to send environment variables "inline" as prefixes in front of command strings
                            (export VARNAME=value && mycommand here), instead of trying to submit them through the SSH
                            protocol itself (which is the default behavior). This is necessary if the remote server
                            has a restricted AcceptEnv setting (which is the common default).
+    :param transport_profile: SSH transport tuning profile: the name of one of the predefined
+                              :data:`~sai_airflow_plugins.hooks.fabric_transport_profile.TRANSPORT_PROFILES`
+                              (``lan-bulk``, ``wan`` or ``low-cpu``), or a dict with the fields of a
+                              :class:`~sai_airflow_plugins.hooks.fabric_transport_profile.TransportProfile`. If None
+                              (default), the ``transport_profile`` field in the extras of the connection is used, if
+                              any.
+    :param gateway_conn_id: connection id of a jump host. Connections to the remote host are tunneled through a
+                            ``direct-tcpip`` channel of a single jump host connection per worker process, which is
+                            shared by all target connections and checked for liveness before each use. See
+                            :class:`~sai_airflow_plugins.hooks.fabric_connection_pool.FabricGatewayPool`. If None
+                            (default), the ``gateway_conn_id`` field in the extras of the connection is used, if any.
+                            The jump host replaces the ``proxy_command`` of the connection.
+    :param learn_host_keys: add the keys of unknown hosts to the local known_hosts store when they're accepted because
+                            of ``no_host_key_check``. See
+                            :class:`~sai_airflow_plugins.hooks.fabric_known_hosts.KnownHostsIndex`. If None
+                            (default), the ``learn_host_keys`` field in the extras of the connection is used, if any.
     """
 
     def __init__(self,
                  ssh_conn_id: str = None,
                  inline_ssh_env: bool = False,
+                 transport_profile: Optional[Union[str, Dict[str, Any]]] = None,
+                 gateway_conn_id: Optional[str] = None,
+                 learn_host_keys: Optional[bool] = None,
                  *args,
                  **kwargs):
         kwargs["ssh_conn_id"] = ssh_conn_id
-        super().__init__(*args, **kwargs)
+        try:
+            super().__init__(*args, **kwargs)
+        except Exception:
+            # A cached connection may be stale, e.g. when its credentials can't be decrypted anymore
+            self.invalidate_cached_connection(ssh_conn_id)
+            raise
         self.inline_ssh_env = inline_ssh_env
 
+        extras = self.get_connection(ssh_conn_id).extra_dejson if ssh_conn_id else {}
+        self.transport_profile = extras.get("transport_profile") if transport_profile is None else transport_profile
+        self.gateway_conn_id = extras.get("gateway_conn_id") if gateway_conn_id is None else gateway_conn_id
+        if learn_host_keys is None:
+            learn_host_keys = str(extras.get("learn_host_keys", False)).lower() == "true"
+        self.learn_host_keys = learn_host_keys
+
+        # Validate the profile up front
+        get_transport_profile(self.transport_profile)
+
+    @classmethod
+    def get_connection(cls, conn_id: str) -> AirflowConnection:
+        """
+        Gets the Airflow connection through the process-wide connection cache.
+
+        :param conn_id: connection id
+        :return: Airflow `Connection` object
+        """
+        return get_connection_cache().get(conn_id, super().get_connection)
+
+    @staticmethod
+    def invalidate_cached_connection(conn_id: str):
+        """
+        Removes a connection from the connection cache, so it's retrieved again on the next lookup.
+        This should be called when authenticating with the connection's credentials fails.
+
+        :param conn_id: connection id; nothing happens if it's None
+        """
+        if conn_id:
+            get_connection_cache().invalidate(conn_id)
+
     def get_fabric_conn(self) -> Connection:
         """
         Creates a Fabric `Connection` object using the settings in this hook.
@@ -40,6 +128,16 @@ class FabricHook(SSHHook):
             "compress": self.compress
         }
 
+        profile = get_transport_profile(self.transport_profile)
+        if profile:
+            if TRANSPORT_FACTORY_SUPPORTED:
+                connect_kwargs["transport_factory"] = profile.create_transport
+            else:
+                self.log.warning(f"Transport profile {self.transport_profile} requires paramiko 2.12 or later. Only "
+                                 f"its compress setting is applied.")
+            if profile.compress is not None:
+                connect_kwargs["compress"] = profile.compress
+
         if self.password:
             password = self.password.strip()
             connect_kwargs["password"] = password
@@ -48,20 +146,370 @@ class FabricHook(SSHHook):
             connect_kwargs["pkey"] = self.pkey
 
         if self.key_file:
-            connect_kwargs["key_filename"] = self.key_file
+            pkey = None if self.pkey else self._get_cached_key_file()
+            if pkey:
+                connect_kwargs["pkey"] = pkey
+            else:
+                connect_kwargs["key_filename"] = self.key_file
+
+        gateway = None
+        if self.gateway_conn_id:
+            if self.host_proxy:
+                self.log.info("The proxy command of the connection is ignored when a jump host is used.")
+            gateway_hook = FabricHook(ssh_conn_id=self.gateway_conn_id, timeout=self.timeout)
+            gateway = PooledGateway(gateway_hook.get_pool_key(), gateway_hook.get_fabric_conn)
 
-        if self.host_proxy:
+        elif self.host_proxy:
             connect_kwargs["sock"] = self.host_proxy
 
-        return Connection(
+        host_key_name = get_host_key_name(self.remote_host, self.port)
+        host_key_policy = self.get_host_key_policy()
+        if host_key_policy and TRANSPORT_FACTORY_SUPPORTED:
+            transport_factory = host_key_policy.prefer_known_key_types(host_key_name,
+                                                                       connect_kwargs.get("transport_factory"))
+            if transport_factory:
+                connect_kwargs["transport_factory"] = transport_factory
+
+        conn = Connection(
             host=self.remote_host,
             user=self.username,
             port=self.port,
             connect_timeout=self.timeout,
             connect_kwargs=connect_kwargs,
-            inline_ssh_env=self.inline_ssh_env
+            inline_ssh_env=self.inline_ssh_env,
+            gateway=gateway
         )
 
+        host_key = getattr(self, "host_key", None)
+        if host_key is not None:
+            conn.client.get_host_keys().add(host_key_name, host_key.get_name(), host_key)
+        if host_key_policy:
+            conn.client.set_missing_host_key_policy(host_key_policy)
+
+        return conn
+
+    def get_host_key_policy(self) -> Optional[KnownHostsPolicy]:
+        """
+        Creates the policy for verifying the host key of the server, with the same semantics as `SSHHook`: the host
+        keys in the known_hosts files are verified, and unknown hosts are only accepted if ``no_host_key_check`` is
+        True. The known_hosts files are read through the process-wide
+        :class:`~sai_airflow_plugins.hooks.fabric_known_hosts.KnownHostsIndex`.
+
+        :return: `KnownHostsPolicy` object, or None if ``allow_host_key_change`` is True. In that case any host key is
+                 accepted.
+        """
+        if getattr(self, "allow_host_key_change", False):
+            return None
+
+        return KnownHostsPolicy(get_known_hosts_index(),
+                                accept_unknown=getattr(self, "no_host_key_check", True),
+                                learn=self.learn_host_keys)
+
+    def _pkey_from_private_key(self, private_key: str, passphrase: Optional[str] = None) -> PKey:
+        """
+        Parses an inline private key from the connection's extra field, using the process-wide key cache.
+
+        :param private_key: string containing the private key
+        :param passphrase: passphrase to decrypt the key, if any
+        :return: `PKey` object
+        """
+        return get_key_cache().get_from_string(private_key, passphrase, super()._pkey_from_private_key)
+
+    def _get_cached_key_file(self) -> Optional[PKey]:
+        """
+        Loads ``self.key_file`` using the process-wide key cache.
+
+        :return: `PKey` object, or None if the file can't be loaded here. In that case paramiko should load it.
+        """
+        try:
+            return get_key_cache().get_from_file(self.key_file)
+        except (OSError, AirflowException) as e:
+            self.log.debug(f"Key file {self.key_file} not loaded in the key cache: {e}")
+            return None
+
+    def get_pool_key(self) -> PoolKey:
+        """
+        Creates the key under which connections of this hook are stored in the connection pool. Besides the
+        connection id, host, user and port it contains a fingerprint of the credentials and connection options, so
+        hooks with different settings never share a connection.
+
+        :return: `PoolKey` object
+        """
+        pkey_fingerprint = None
+        if self.pkey:
+            get_fingerprint = getattr(self.pkey, "get_fingerprint", None)
+            pkey_fingerprint = get_fingerprint().hex() if get_fingerprint else str(self.pkey)
+
+        auth = repr((self.password, self.key_file, pkey_fingerprint, self.compress, self.timeout,
+                     self.inline_ssh_env, get_transport_profile(self.transport_profile), self.gateway_conn_id))
+        return PoolKey(
+            conn_id=self.ssh_conn_id,
+            host=self.remote_host,
+            user=self.username,
+            port=self.port,
+            auth_fingerprint=hashlib.sha256(auth.encode()).hexdigest()
+        )
+
+    def get_pooled_fabric_conn(self) -> Connection:
+        """
+        Gets a Fabric `Connection` object from the worker-wide connection pool. An idle connection with the same
+        settings is reused if it's still alive, otherwise a new one is created with `get_fabric_conn`.
+        Hand the connection back with `release_fabric_conn` when you're done with it.
+
+        :return: `Connection` object
+        """
+        return get_connection_pool().acquire(self.get_pool_key(), self.get_fabric_conn)
+
+    @staticmethod
+    def release_fabric_conn(conn: Connection, discard: bool = False):
+        """
+        Returns a connection obtained with `get_pooled_fabric_conn` to the connection pool.
+
+        :param conn: the `Connection` object to release
+        :param discard: close the connection instead of keeping it open for reuse, e.g. after an error
+        """
+        get_connection_pool().release(conn, discard=discard)
+
+    def run_many(self,
+                 commands: List[str],
+                 max_concurrency: int = 10,
+                 conn: Optional[Connection] = None,
+                 use_sudo: bool = False,
+                 watchers_factory: Optional[Callable[[], List[StreamWatcher]]] = None,
+                 timer: Optional[PhaseTimer] = None,
+                 **run_kwargs) -> List[CommandResult]:
+        """
+        Runs multiple commands concurrently, each on its own channel of a single SSH transport. This avoids setting
+        up a connection for every command, and the total run time is that of the slowest command instead of the sum
+        of all of them. Command output is captured instead of echoed, because it would be interleaved otherwise.
+
+        A pseudo-terminal can't be requested for these commands, since invoke only supports that in the main thread.
+
+        :param commands: the commands to execute
+        :param max_concurrency: the maximum number of commands that run at the same time
+        :param conn: the `Connection` object to use. If None, a connection is taken from the connection pool and
+                     released afterwards.
+        :param use_sudo: uses Fabric's sudo function instead of run
+        :param watchers_factory: callable that returns a new list of watchers. It's called for every command, since
+                                 watchers keep track of the output stream they've seen.
+        :param timer: the `PhaseTimer` to add the run time of every command to
+        :param run_kwargs: additional keyword arguments for Fabric's run or sudo function, e.g. ``env``
+        :return: a `CommandResult` for every command, in the same order as `commands`
+        """
+        if run_kwargs.get("pty"):
+            raise AirflowException("`run_many` can't run commands in a pseudo-terminal.")
+
+        if max_concurrency < 1:
+            raise AirflowException("`max_concurrency` must be at least 1.")
+
+        pooled = conn is None
+        if pooled:
+            conn = self.get_pooled_fabric_conn()
+
+        def run_one(command: str) -> CommandResult:
+            kwargs = dict(run_kwargs, hide=True, warn=True)
+            if watchers_factory:
+                kwargs["watchers"] = watchers_factory()
+
+            started = time.monotonic()
+            with timer.command() if timer else nullcontext():
+                res = conn.sudo(command, **kwargs) if use_sudo else conn.run(command, **kwargs)
+            return CommandResult(command=command, exited=res.exited, stdout=res.stdout, stderr=res.stderr,
+                                 duration=time.monotonic() - started)
+
+        try:
+            conn.open()
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(commands) or 1)) as executor:
+                results = list(executor.map(run_one, commands))
+        except Exception:
+            if pooled:
+                self.release_fabric_conn(conn, discard=True)
+            raise
+
+        if pooled:
+            self.release_fabric_conn(conn)
+
+        return results
+
+    async def run_async(self, command: str, conn: Optional[Connection] = None, **kwargs) -> Result:
+        """
+        Runs a command from an asyncio event loop, without starting threads for it.
+        See :class:`~sai_airflow_plugins.hooks.fabric_async.AsyncFabricRunner` for details.
+
+        :param command: the command to execute
+        :param conn: the `Connection` object to use. If None, a connection is taken from the connection pool and
+                     released afterwards.
+        :param kwargs: keyword arguments for `AsyncFabricRunner.run`, e.g. ``env``, ``pty`` or ``sudo``
+        :return: The `Result` of the command
+        """
+        async with self._open_async_conn(conn) as conn:
+            return await AsyncFabricRunner(conn).run(command, **kwargs)
+
+    async def run_many_async(self,
+                             commands: List[str],
+                             max_concurrency: int = 100,
+                             conn: Optional[Connection] = None,
+                             timer: Optional[PhaseTimer] = None,
+                             **kwargs) -> List[CommandResult]:
+        """
+        Runs multiple commands concurrently from an asyncio event loop, each on its own channel of a single SSH
+        transport. Unlike `run_many` it doesn't start threads for the commands, so it scales to many more of them,
+        and it supports pseudo-terminals. See :class:`~sai_airflow_plugins.hooks.fabric_async.AsyncFabricRunner` for
+        details.
+
+        :param commands: the commands to execute
+        :param max_concurrency: the maximum number of commands that run at the same time
+        :param conn: the `Connection` object to use. If None, a connection is taken from the connection pool and
+                     released afterwards.
+        :param timer: the `PhaseTimer` to add the phases of every command to
+        :param kwargs: keyword arguments for `AsyncFabricRunner.run`, e.g. ``env``, ``pty`` or ``sudo``
+        :return: a `CommandResult` for every command, in the same order as `commands`
+        """
+        if max_concurrency < 1:
+            raise AirflowException("`max_concurrency` must be at least 1.")
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async with self._open_async_conn(conn) as conn:
+            runner = AsyncFabricRunner(conn)
+
+            async def run_one(command: str) -> CommandResult:
+                async with semaphore:
+                    started = time.monotonic()
+                    with timer.command() if timer else nullcontext() as timing:
+                        res = await runner.run(command, timing=timing, **kwargs)
+                    return CommandResult(command=command, exited=res.exited, stdout=res.stdout, stderr=res.stderr,
+                                         duration=time.monotonic() - started)
+
+            return list(await asyncio.gather(*(run_one(command) for command in commands)))
+
+    @asynccontextmanager
+    async def _open_async_conn(self, conn: Optional[Connection]) -> AsyncIterator[Connection]:
+        """
+        Opens the given connection, or a connection from the connection pool which is released afterwards.
+        Opening happens in an executor, so it doesn't block the event loop.
+        """
+        pooled = conn is None
+        if pooled:
+            conn = self.get_pooled_fabric_conn()
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, conn.open)
+            yield conn
+        except BaseException:
+            if pooled:
+                self.release_fabric_conn(conn, discard=True)
+            raise
+
+        if pooled:
+            self.release_fabric_conn(conn)
+
+    def put(self,
+            local_path: str,
+            remote_path: str,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            max_concurrency: int = 4,
+            resume: bool = True,
+            verify: bool = True) -> TransferResult:
+        """
+        Uploads a file over SFTP in chunks, using several pooled connections at the same time. An interrupted upload
+        of the same file is resumed, and the checksums are compared afterwards.
+        See :class:`~sai_airflow_plugins.hooks.fabric_transfer.ChunkedTransfer` for details.
+
+        :param local_path: path of the local file
+        :param remote_path: path of the remote file
+        :param chunk_size: the number of bytes per chunk
+        :param max_concurrency: the maximum number of chunks that are transferred at the same time
+        :param resume: continue a previously interrupted upload of the same file
+        :param verify: compare the checksums of the local and remote file after the upload
+        :return: `TransferResult` object
+        """
+        return self._transfer(PUT, local_path, remote_path, chunk_size, max_concurrency, resume, verify)
+
+    def get(self,
+            remote_path: str,
+            local_path: str,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            max_concurrency: int = 4,
+            resume: bool = True,
+            verify: bool = True) -> TransferResult:
+        """
+        Downloads a file over SFTP in chunks, using several pooled connections at the same time. An interrupted
+        download of the same file is resumed, and the checksums are compared afterwards.
+        See :class:`~sai_airflow_plugins.hooks.fabric_transfer.ChunkedTransfer` for details.
+
+        :param remote_path: path of the remote file
+        :param local_path: path of the local file
+        :param chunk_size: the number of bytes per chunk
+        :param max_concurrency: the maximum number of chunks that are transferred at the same time
+        :param resume: continue a previously interrupted download of the same file
+        :param verify: compare the checksums of the local and remote file after the download
+        :return: `TransferResult` object
+        """
+        return self._transfer(GET, local_path, remote_path, chunk_size, max_concurrency, resume, verify)
+
+    def _transfer(self,
+                  direction: str,
+                  local_path: str,
+                  remote_path: str,
+                  chunk_size: int,
+                  max_concurrency: int,
+                  resume: bool,
+                  verify: bool) -> TransferResult:
+        self.log.info(f"Starting {direction} of local file {local_path} and remote file {remote_path} on remote host "
+                      f"{self.remote_host}")
+        return ChunkedTransfer(direction=direction,
+                               local_path=local_path,
+                               remote_path=remote_path,
+                               conn_factory=self.get_pooled_fabric_conn,
+                               conn_release=self.release_fabric_conn,
+                               state_id=f"{self.username}@{self.remote_host}:{self.port}",
+                               chunk_size=chunk_size,
+                               max_concurrency=max_concurrency,
+                               resume=resume,
+                               verify=verify,
+                               max_connections=get_connection_pool().max_per_host).run()
+
+    def sync_dir(self,
+                 local_dir: str,
+                 remote_dir: str,
+                 delete: bool = False,
+                 checksum: bool = False,
+                 block_size: int = DEFAULT_BLOCK_SIZE,
+                 delta_threshold: int = DEFAULT_DELTA_THRESHOLD) -> SyncResult:
+        """
+        Synchronizes a local directory to a remote directory over SFTP, sending only the files that changed, or only
+        the changed blocks of large files. The remote manifest is cached between runs.
+        See :class:`~sai_airflow_plugins.hooks.fabric_sync.DirectorySync` for details.
+
+        :param local_dir: the local source directory
+        :param remote_dir: the remote destination directory
+        :param delete: delete remote files that don't exist in the local directory
+        :param checksum: compare the hashes of all files, instead of skipping files with the same size and modification
+                         time
+        :param block_size: the size of the blocks that are compared for large files
+        :param delta_threshold: the minimum file size for sending only changed blocks
+        :return: `SyncResult` object
+        """
+        self.log.info(f"Syncing local directory {local_dir} to remote directory {remote_dir} on remote host "
+                      f"{self.remote_host}")
+        conn = self.get_pooled_fabric_conn()
+        try:
+            result = DirectorySync(conn=conn,
+                                   local_dir=local_dir,
+                                   remote_dir=remote_dir,
+                                   state_id=f"{self.username}@{self.remote_host}:{self.port}",
+                                   delete=delete,
+                                   checksum=checksum,
+                                   block_size=block_size,
+                                   delta_threshold=delta_threshold).run()
+        except Exception:
+            self.release_fabric_conn(conn, discard=True)
+            raise
+
+        self.release_fabric_conn(conn)
+        return result
+
     def get_sudo_pass_responder(self) -> FailingResponder:
         """
         Creates a responder for the sudo password prompt. It replies with the password of the SSH connection.
@@ -108,3 +556,120 @@ class FabricHook(SSHHook):
             response="yes\n",
             sentinel="Host key verification failed.\n"
         )
+
+
+class LazyFabricHook(object):
+    """
+    A reference to a `FabricHook` that's only created when a task uses it. Creating a `FabricHook` reads the Airflow
+    connection from the metastore and loads its private key, so a hook that's created at the top level of a DAG file
+    does that every time the scheduler parses the file. This reference only stores the arguments of the hook, and
+    `FabricOperator`, `FabricSensor`, `FabricMultiHostOperator`, `FabricTransferOperator` and `FabricSyncOperator`
+    resolve it when the task runs:
+
+    >>> FabricOperator(task_id="my_task", fabric_hook=LazyFabricHook("ssh_default", remote_host="my.host"), ...)
+
+    Other attributes and methods are taken from the hook, which is created on first use.
+
+    :param ssh_conn_id: connection id from airflow Connections
+    :param hook_class: the class of the hook; `FabricHook` or a subclass of it
+    :param kwargs: the other arguments of the hook, e.g. `remote_host`, `transport_profile` or `timeout`
+    """
+
+    def __init__(self, ssh_conn_id: Optional[str] = None, hook_class: type = FabricHook, **kwargs):
+        self.ssh_conn_id = ssh_conn_id
+        self.hook_class = hook_class
+        self.kwargs = kwargs
+        self._hook: Optional[FabricHook] = None
+
+    def resolve(self, **defaults) -> FabricHook:
+        """
+        Creates the hook, or returns the hook that was created before.
+
+        :param defaults: arguments of the hook that are used if this reference doesn't set them, e.g. a `remote_host`
+                         for a connection without a host
+        :return: `FabricHook` object
+        """
+        if self._hook is None:
+            kwargs = {k: v for k, v in defaults.items() if v is not None}
+            kwargs.update(self.kwargs)
+            self._hook = self.hook_class(ssh_conn_id=self.ssh_conn_id, **kwargs)
+
+        return self._hook
+
+    def __getattr__(self, name: str) -> Any:
+        # Private attributes are never taken from the hook, e.g. when this object is copied or unpickled
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self.resolve(), name)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The hook isn't copied or pickled, only the arguments to create it
+        return dict(self.__dict__, _hook=None)
+
+    def __repr__(self) -> str:
+        arguments = "".join(f", {k}={v!r}" for k, v in self.kwargs.items())
+        return f"{type(self).__name__}({self.ssh_conn_id!r}{arguments})"
+
+
+def resolve_fabric_hook(hook: Optional[Union[FabricHook, LazyFabricHook]], **defaults) -> Optional[FabricHook]:
+    """
+    Returns the hook that a `LazyFabricHook` refers to, or the hook itself if it's not lazy.
+
+    :param hook: a `FabricHook`, `LazyFabricHook` or None
+    :param defaults: arguments of the hook that are used if a `LazyFabricHook` doesn't set them
+    :return: `FabricHook` object or None
+    """
+    return hook.resolve(**defaults) if isinstance(hook, LazyFabricHook) else hook
+
+
+def prepare_fabric_hook(fabric_hook: Optional[Union[FabricHook, LazyFabricHook]],
+                        ssh_conn_id: Optional[str] = None,
+                        remote_host: Optional[str] = None,
+                        transport_profile: Optional[str] = None,
+                        log: Optional[logging.Logger] = None,
+                        **hook_kwargs) -> FabricHook:
+    """
+    Returns the hook of an operator: the provided hook, with a `LazyFabricHook` resolved, or otherwise a new hook
+    created from `ssh_conn_id`. `remote_host` and `transport_profile` are applied to the hook if provided.
+
+    :param fabric_hook: the `fabric_hook` of the operator
+    :param ssh_conn_id: the `ssh_conn_id` of the operator, which is ignored if `fabric_hook` is provided
+    :param remote_host: the remote host that replaces the one of the hook or the connection
+    :param transport_profile: the transport profile that replaces the one of the hook or the connection
+    :param log: the logger of the operator, to log which settings are used
+    :param hook_kwargs: other arguments of the hook, e.g. ``timeout``, that are used when it's created from
+                        `ssh_conn_id` or by a `LazyFabricHook` that doesn't set them
+    :return: `FabricHook` object; raises `AirflowException` if neither `fabric_hook` nor `ssh_conn_id` is provided
+    """
+    hook = resolve_fabric_hook(fabric_hook, remote_host=remote_host, **hook_kwargs)
+
+    if isinstance(hook, FabricHook):
+        if ssh_conn_id and log:
+            log.info("ssh_conn_id is ignored when fabric_hook is provided.")
+
+        if remote_host is not None:
+            if log:
+                log.info("remote_host is provided explicitly. It will replace the remote_host which was defined in "
+                         "fabric_hook.")
+            hook.remote_host = remote_host
+
+        if transport_profile is not None:
+            hook.transport_profile = transport_profile
+
+        return hook
+
+    if ssh_conn_id:
+        if log:
+            log.info("fabric_hook is not provided or invalid. Trying ssh_conn_id to create FabricHook.")
+
+        # Prevent empty `SSHHook.remote_host` field which would otherwise raise an exception
+        if remote_host is not None:
+            if log:
+                log.info("remote_host is provided explicitly. It will replace the remote_host which was predefined in "
+                         "the connection specified by ssh_conn_id.")
+            hook_kwargs["remote_host"] = remote_host
+
+        return FabricHook(ssh_conn_id=ssh_conn_id, transport_profile=transport_profile, **hook_kwargs)
+
+    raise AirflowException("Cannot operate without fabric_hook or ssh_conn_id.")
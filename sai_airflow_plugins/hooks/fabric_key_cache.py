@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+import paramiko
+from airflow.exceptions import AirflowException
+from paramiko import PKey
+
+# Key classes tried in order when loading a key file; DSSKey was removed in recent paramiko versions
+_KEY_CLASSES = [getattr(paramiko, name) for name in ("Ed25519Key", "ECDSAKey", "RSAKey", "DSSKey")
+                if hasattr(paramiko, name)]
+
+
+class PrivateKeyCache(object):
+    """
+    A thread-safe, in-process cache of parsed private keys, so key files and inline keys aren't read, parsed and,
+    for passphrase-protected keys, decrypted again for every connection. Keys are only kept in memory.
+
+    Key files are identified by their path, modification time and size, so a changed file is loaded again. Inline keys
+    are identified by a hash of their content and passphrase. The least recently used keys are dropped when the cache
+    holds more than `max_size` keys.
+
+    :param max_size: the maximum number of keys in the cache
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[Hashable, PKey]" = OrderedDict()
+
+    def get_from_file(self, path: str, passphrase: Optional[str] = None) -> PKey:
+        """
+        Returns the parsed private key from a key file.
+
+        :param path: path of the key file
+        :param passphrase: passphrase to decrypt the key, if any
+        :return: `PKey` object; raises `AirflowException` if the file isn't a key that paramiko can read
+        """
+        path = os.path.realpath(os.path.expanduser(path))
+        stat = os.stat(path)
+        cache_key = ("file", path, stat.st_mtime_ns, stat.st_size, self._hash(passphrase or ""))
+
+        return self._get(cache_key, lambda: self._load_file(path, passphrase))
+
+    def get_from_string(self,
+                        private_key: str,
+                        passphrase: Optional[str],
+                        loader: Callable[[str, Optional[str]], PKey]) -> PKey:
+        """
+        Returns the parsed private key from a string.
+
+        :param private_key: the private key
+        :param passphrase: passphrase to decrypt the key, if any
+        :param loader: callable that parses the key and passphrase if it's not in the cache
+        :return: `PKey` object
+        """
+        cache_key = ("string", self._hash(f"{private_key}\0{passphrase or ''}"))
+        return self._get(cache_key, lambda: loader(private_key, passphrase))
+
+    def clear(self):
+        """
+        Removes all keys from the cache.
+        """
+        with self._lock:
+            self._keys.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counters and the number of cached keys.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._keys)}
+
+    def _get(self, cache_key: Hashable, loader: Callable[[], PKey]) -> PKey:
+        with self._lock:
+            pkey = self._keys.get(cache_key)
+            if pkey is not None:
+                self._keys.move_to_end(cache_key)
+                self.hits += 1
+                return pkey
+            self.misses += 1
+
+        # Parse outside the lock, as deriving a key from a passphrase may take a while
+        pkey = loader()
+
+        with self._lock:
+            self._keys[cache_key] = pkey
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+
+        return pkey
+
+    @staticmethod
+    def _hash(value: str) -> str:
+        return hashlib.sha256(value.encode()).hexdigest()
+
+    @staticmethod
+    def _load_file(path: str, passphrase: Optional[str]) -> PKey:
+        for key_class in _KEY_CLASSES:
+            try:
+                pkey = key_class.from_private_key_file(path, password=passphrase)
+                # Paramiko sometimes loads a key as the wrong type, which only fails when it's used
+                pkey.sign_ssh_data(b"")
+                return pkey
+            except (paramiko.SSHException, ValueError):
+                continue
+
+        raise AirflowException(f"Private key file {path} cannot be read by paramiko.")
+
+
+_default_cache = PrivateKeyCache()
+
+
+def get_key_cache() -> PrivateKeyCache:
+    """
+    Returns the process-wide private key cache that's used by `FabricHook`.
+
+    :return: `PrivateKeyCache` object
+    """
+    return _default_cache
@@ -0,0 +1,288 @@
+import base64
+import fnmatch
+import hmac
+import os
+import threading
+from hashlib import sha1
+from typing import Callable, Dict, List, Optional, Tuple
+
+from airflow.configuration import conf
+from airflow.utils.log.logging_mixin import LoggingMixin
+from paramiko import BadHostKeyException, HostKeys, MissingHostKeyPolicy, PKey, SSHClient, SSHException, Transport
+from paramiko.config import SSH_PORT
+from paramiko.hostkeys import HostKeyEntry, InvalidHostKey
+
+
+def get_host_key_name(host: str, port: int) -> str:
+    """
+    Returns the name under which paramiko and OpenSSH look up the host keys of a host.
+
+    :param host: the host name or IP address
+    :param port: the SSH port
+    :return: the host name, or ``[host]:port`` for a non-standard port
+    """
+    return host if not port or int(port) == SSH_PORT else f"[{host}]:{port}"
+
+
+class _KnownHostsFile(object):
+    """
+    The entries of a single known_hosts file. Keys are kept as base64 strings and only parsed when they're needed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.signature = None
+        self.plain: Dict[str, Dict[str, str]] = {}
+        self.hashed: List[Tuple[bytes, bytes, str, str]] = []
+        self.patterns: List[Tuple[List[str], str, str]] = []
+
+    def stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, signature: Optional[Tuple[int, int]]):
+        self.signature = signature
+        self.plain, self.hashed, self.patterns = {}, [], []
+        if signature is None:
+            return
+
+        with open(self.path) as f:
+            for line in f:
+                self.add_line(line)
+
+    def add_line(self, line: str):
+        fields = line.split()
+        # Skip comments, markers like @cert-authority, which paramiko doesn't support either, and invalid lines
+        if len(fields) < 3 or fields[0].startswith(("#", "@")):
+            return
+
+        names, key_type, key = fields[:3]
+        for name in names.split(","):
+            if name.startswith("|1|"):
+                try:
+                    _, _, salt, host_hash = name.split("|")
+                    self.hashed.append((base64.b64decode(salt), base64.b64decode(host_hash), key_type, key))
+                except ValueError:
+                    continue
+            elif any(c in name for c in "*?!"):
+                self.patterns.append((names.split(","), key_type, key))
+                break
+            else:
+                self.plain.setdefault(name, {}).setdefault(key_type, key)
+
+    def lookup(self, name: str, result: Dict[str, str]):
+        for key_type, key in self.plain.get(name, {}).items():
+            result.setdefault(key_type, key)
+
+        for salt, host_hash, key_type, key in self.hashed:
+            if key_type not in result and hmac.compare_digest(hmac.new(salt, name.encode(), sha1).digest(),
+                                                              host_hash):
+                result[key_type] = key
+
+        for patterns, key_type, key in self.patterns:
+            if key_type not in result and self._matches(name, patterns):
+                result[key_type] = key
+
+    @staticmethod
+    def _matches(name: str, patterns: List[str]) -> bool:
+        matched = False
+        for pattern in patterns:
+            if pattern.startswith("!"):
+                if fnmatch.fnmatch(name, pattern[1:]):
+                    return False
+            elif fnmatch.fnmatch(name, pattern):
+                matched = True
+        return matched
+
+
+class KnownHostsIndex(LoggingMixin):
+    """
+    A thread-safe, in-process index of the host keys in one or more known_hosts files, shared by all hooks in the
+    same worker process. A file is parsed once and only parsed again when its modification time or size changes.
+    Lookups are cached per host name, so the salted hashes of hashed entries are only computed once per host.
+
+    New host keys can be learned into `store_path`, a local known_hosts file with hashed host names, which is part of
+    the index as well.
+
+    The process-wide instance returned by `get_known_hosts_index` takes its files from the ``known_hosts_files``
+    option in the ``[sai_airflow_plugins]`` section of the Airflow configuration, a comma-separated list which
+    defaults to ``~/.ssh/known_hosts``, and its store from the ``known_hosts_store`` option, which defaults to
+    ``~/.ssh/known_hosts_airflow``.
+
+    :param paths: the known_hosts files to index
+    :param store_path: the known_hosts file that learned host keys are added to. If None, keys can't be learned.
+    """
+
+    def __init__(self, paths: List[str], store_path: Optional[str] = None):
+        super().__init__()
+        self.store_path = os.path.expanduser(store_path) if store_path else None
+        paths = [os.path.expanduser(path) for path in paths]
+        if self.store_path and self.store_path not in paths:
+            paths.append(self.store_path)
+        self._files = [_KnownHostsFile(path) for path in paths]
+        self._cache: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, name: str) -> Dict[str, str]:
+        """
+        Looks up the known host keys of a host. Files that changed since they were indexed are indexed again first.
+
+        :param name: the host name as used in known_hosts files; see `get_host_key_name`
+        :return: a dict with the base64-encoded key per key type, which is empty if the host is unknown
+        """
+        with self._lock:
+            self._reload_changed()
+            if name not in self._cache:
+                result = {}
+                for known_hosts_file in self._files:
+                    known_hosts_file.lookup(name, result)
+                self._cache[name] = result
+            return dict(self._cache[name])
+
+    def learn(self, name: str, key: PKey):
+        """
+        Adds a host key to the store, with a hashed host name.
+
+        :param name: the host name as used in known_hosts files; see `get_host_key_name`
+        :param key: the host key
+        """
+        if not self.store_path:
+            return
+
+        line = f"{HostKeys.hash_host(name)} {key.get_name()} {key.get_base64()}\n"
+        with self._lock:
+            store = next(known_hosts_file for known_hosts_file in self._files
+                         if known_hosts_file.path == self.store_path)
+            previous = store.stat()
+
+            os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+            with open(self.store_path, "a") as f:
+                f.write(line)
+
+            # Update the index directly, so the store doesn't have to be parsed again, unless it was changed by
+            # someone else in the meantime
+            store.add_line(line)
+            signature = store.stat()
+            if previous == store.signature and signature and signature[1] == (previous or (0, 0))[1] + len(line):
+                store.signature = signature
+            self._cache.pop(name, None)
+
+        self.log.info(f"Learned {key.get_name()} host key of {name} into {self.store_path}")
+
+    def clear(self):
+        """
+        Forgets all indexed files, so they're parsed again on the next lookup.
+        """
+        with self._lock:
+            for known_hosts_file in self._files:
+                known_hosts_file.load(None)
+            self._cache.clear()
+
+    def _reload_changed(self):
+        """
+        Indexes the files that changed again. Must be called with the lock held.
+        """
+        for known_hosts_file in self._files:
+            signature = known_hosts_file.stat()
+            if signature != known_hosts_file.signature:
+                known_hosts_file.load(signature)
+                self._cache.clear()
+
+
+class KnownHostsPolicy(MissingHostKeyPolicy):
+    """
+    Host key policy that verifies server keys against a `KnownHostsIndex`. Paramiko calls it for every server key
+    that isn't in the client's own host keys.
+
+    :param index: the index to verify against
+    :param accept_unknown: accept hosts that aren't in the index, like `SSHHook` does when ``no_host_key_check`` is
+                           True. If False, connecting to an unknown host fails.
+    :param learn: add the keys of unknown hosts that are accepted to the store of the index
+    """
+
+    def __init__(self, index: KnownHostsIndex, accept_unknown: bool = True, learn: bool = False):
+        self.index = index
+        self.accept_unknown = accept_unknown
+        self.learn = learn
+
+    def missing_host_key(self, client: SSHClient, hostname: str, key: PKey):
+        known = self.index.lookup(hostname)
+
+        if known:
+            if known.get(key.get_name()) == key.get_base64():
+                return
+            # Report a known key that paramiko can parse; it returns None for key types it doesn't support
+            expected = None
+            for key_type, data in known.items():
+                expected = _parse_key(hostname, key_type, data)
+                if expected is not None:
+                    break
+            if expected is None:
+                raise SSHException(f"Host key for server {hostname} does not match: got a {key.get_name()} key, "
+                                   f"known key types are {', '.join(known)}")
+            raise BadHostKeyException(hostname, key, expected)
+
+        if not self.accept_unknown:
+            raise SSHException(f"Server {hostname} not found in known_hosts")
+
+        if self.learn:
+            self.index.learn(hostname, key)
+
+    def prefer_known_key_types(self,
+                               hostname: str,
+                               transport_factory: Optional[Callable[..., Transport]] = None
+                               ) -> Optional[Callable[..., Transport]]:
+        """
+        Wraps a transport factory so that the server is asked for a key type that's known for the host, like
+        paramiko does for the keys in the client's own host keys. Paramiko accepts a transport factory from version
+        2.12 onwards, so `FabricHook` only uses it with those versions.
+
+        :param hostname: the host name as used in known_hosts files; see `get_host_key_name`
+        :param transport_factory: the transport factory to wrap. If None, paramiko's `Transport` is used.
+        :return: the wrapped factory, or `transport_factory` if the host is unknown
+        """
+        known_types = list(self.index.lookup(hostname))
+        if not known_types:
+            return transport_factory
+
+        def create_transport(sock, **kwargs) -> Transport:
+            transport = (transport_factory or Transport)(sock, **kwargs)
+            options = transport.get_security_options()
+            preferred = [key_type for key_type in known_types if key_type in options.key_types]
+            if preferred:
+                options.key_types = preferred + [key_type for key_type in options.key_types
+                                                 if key_type not in preferred]
+            return transport
+
+        return create_transport
+
+
+def _parse_key(hostname: str, key_type: str, data: str) -> Optional[PKey]:
+    """
+    Parses a known host key, or returns None if paramiko doesn't support its type or it's invalid.
+    """
+    try:
+        entry = HostKeyEntry.from_line(f"{hostname} {key_type} {data}")
+    except InvalidHostKey:
+        return None
+    return entry.key if entry is not None else None
+
+
+_default_index = KnownHostsIndex(
+    paths=[path.strip() for path in
+           conf.get("sai_airflow_plugins", "known_hosts_files", fallback="~/.ssh/known_hosts").split(",")
+           if path.strip()],
+    store_path=conf.get("sai_airflow_plugins", "known_hosts_store", fallback="~/.ssh/known_hosts_airflow")
+)
+
+
+def get_known_hosts_index() -> KnownHostsIndex:
+    """
+    Returns the process-wide known_hosts index that's used by `FabricHook`.
+
+    :return: `KnownHostsIndex` object
+    """
+    return _default_index
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterator, Optional
+
+from airflow.stats import Stats
+from airflow.utils.log.logging_mixin import LoggingMixin
+from fabric import Connection
+from fabric.runners import Remote
+
+METRIC_PREFIX = "sai_airflow_plugins.fabric"
+
+CONNECTION_LOOKUP = "connection_lookup"
+CONNECT = "connect"
+CHANNEL_OPEN = "channel_open"
+FIRST_BYTE = "first_byte"
+EXECUTION = "execution"
+OUTPUT_HANDLING = "output_handling"
+
+PHASES = (CONNECTION_LOOKUP, CONNECT, CHANNEL_OPEN, FIRST_BYTE, EXECUTION, OUTPUT_HANDLING)
+
+
+class PhaseTimer(LoggingMixin):
+    """
+    Measures the time spent in the phases of a Fabric task, from looking up the connection to handling the output of
+    the command, and emits it through Airflow's `Stats` as timers named ``sai_airflow_plugins.fabric.<phase>``, with
+    the host and connection id as tags. The phases are:
+
+    - ``connection_lookup``: creating the hook, which reads the Airflow connection, and getting a Fabric connection
+      from the connection pool
+    - ``connect``: opening the SSH connection, including the key exchange and authentication. It's missing when an
+      open pooled connection is reused.
+    - ``channel_open``: opening the channel of a command and starting the command on it
+    - ``first_byte``: waiting for the first output of a command after it was started
+    - ``execution``: running a command, until it exits and its output has been read
+    - ``output_handling``: processing the output after the command has exited
+
+    The phases are measured around the calls that open connections and run commands, so nothing that's shared with
+    other threads, like the transport of a pooled connection, is changed for it. ``channel_open`` and ``first_byte``
+    are only measured when the channel is driven by a runner of this package: a `TimedRemote`, or the
+    :class:`~sai_airflow_plugins.hooks.fabric_async.AsyncFabricRunner`. Otherwise they're part of ``execution``.
+
+    A phase that's measured more than once, e.g. for several commands, is summed.
+
+    :param tags: the tags of the timers, e.g. ``{"host": "my.host", "conn_id": "ssh_default"}``
+    """
+
+    def __init__(self, tags: Optional[Dict[str, str]] = None):
+        super().__init__()
+        self.tags = {k: str(v) for k, v in (tags or {}).items() if v is not None}
+        self.durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        """
+        Adds a measured duration to a phase. Commands that run concurrently can add to the same timer.
+
+        :param phase: the name of the phase
+        :param seconds: the duration in seconds
+        """
+        with self._lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + max(seconds, 0.0)
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        """
+        Context manager that adds the time spent in its body to a phase, also when the body raises an exception.
+
+        :param phase: the name of the phase
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started)
+
+    @contextmanager
+    def connect(self, conn: Connection) -> Iterator[None]:
+        """
+        Context manager for opening a connection in its body, which adds the time spent to the ``connect`` phase.
+        Nothing is measured if the connection is already open.
+
+        :param conn: the `Connection` object that's opened
+        """
+        if conn.is_connected:
+            yield
+            return
+
+        with self.phase(CONNECT):
+            yield
+
+    @contextmanager
+    def command(self) -> Iterator["CommandTiming"]:
+        """
+        Context manager for running a single command in its body. It yields a `CommandTiming` for the runner of the
+        command, and adds the ``channel_open``, ``first_byte`` and ``execution`` phases when the body is done.
+        """
+        timing = CommandTiming()
+        try:
+            yield timing
+        finally:
+            for phase, seconds in timing.finish().items():
+                self.add(phase, seconds)
+
+    def emit(self):
+        """
+        Sends the durations of the phases to `Stats` and logs them on a single line as JSON, e.g.
+        ``Fabric phase timings: {"host": "my.host", "phases": {"connection_lookup": 0.0021, ...}, "total": 0.52}``.
+        """
+        for phase, seconds in self.durations.items():
+            try:
+                Stats.timing(f"{METRIC_PREFIX}.{phase}", timedelta(seconds=seconds), tags=self.tags)
+            except TypeError:
+                # Airflow < 2.6 doesn't support tags
+                Stats.timing(f"{METRIC_PREFIX}.{phase}", timedelta(seconds=seconds))
+
+        if not self.durations:
+            return
+
+        phases = {phase: round(self.durations[phase], 4) for phase in sorted(self.durations, key=_phase_order)}
+        summary = dict(self.tags, phases=phases, total=round(sum(self.durations.values()), 4))
+        self.log.info(f"Fabric phase timings: {json.dumps(summary)}")
+
+
+def _phase_order(phase: str) -> int:
+    return PHASES.index(phase) if phase in PHASES else len(PHASES)
+
+
+class CommandTiming(object):
+    """
+    The moments at which a single command was started, got its channel and received its first output. A runner marks
+    these, and `PhaseTimer.command` turns them into phases.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.opened: Optional[float] = None
+        self.first_byte: Optional[float] = None
+
+    def channel_opened(self):
+        """
+        Marks that the channel of the command is open and the command was started on it.
+        """
+        self.opened = time.perf_counter()
+
+    def output_received(self):
+        """
+        Marks that output of the command was received. Only the first time counts.
+        """
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+
+    def finish(self) -> Dict[str, float]:
+        """
+        Returns the durations of the phases of the command up to now.
+
+        :return: dict of phase names and durations in seconds
+        """
+        finished = time.perf_counter()
+        if self.opened is None:
+            return {EXECUTION: finished - self.started}
+
+        durations = {CHANNEL_OPEN: self.opened - self.started}
+        if self.first_byte is not None:
+            durations[FIRST_BYTE] = self.first_byte - self.opened
+        durations[EXECUTION] = finished - (self.opened if self.first_byte is None else self.first_byte)
+        return durations
+
+
+class TimedRemote(Remote):
+    """
+    Fabric runner that marks when the channel of its command is open and when the first output arrives in a
+    `CommandTiming`. Put it last when combining it with other runner classes, so it sees the output as received.
+    Pass it to ``Connection._run`` or ``Connection._sudo``.
+
+    :param timing: the `CommandTiming` of the command
+    """
+
+    def __init__(self, *args, timing: CommandTiming, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timing = timing
+
+    def start(self, command, shell, env, timeout=None):
+        result = super().start(command, shell, env, timeout=timeout)
+        self.timing.channel_opened()
+        return result
+
+    def read_proc_stdout(self, num_bytes):
+        data = super().read_proc_stdout(num_bytes)
+        if data:
+            self.timing.output_received()
+        return data
+
+    def read_proc_stderr(self, num_bytes):
+        data = super().read_proc_stderr(num_bytes)
+        if data:
+            self.timing.output_received()
+        return data
@@ -0,0 +1,262 @@
+import tempfile
+from collections import deque
+from typing import Iterator, List, Optional
+
+from fabric import Result
+from fabric.runners import Remote
+from invoke import StreamWatcher
+
+DEFAULT_MAX_MEMORY = 16 * 1024 * 1024
+DEFAULT_WINDOW_SIZE = 64 * 1024
+
+
+class OutputCapture(object):
+    """
+    Captures the output of one stream of a command with a fixed in-memory budget. Output is kept in memory until it
+    exceeds `max_memory` characters. At that point everything captured so far is written to an anonymous temporary
+    file, and all further output is appended to that file instead.
+
+    Whether the output spilled or not, the first and the last `window_size` characters are always available from
+    memory as `head` and `tail`, and watchers are given the most recent `window_size` characters of the output
+    instead of the full output, see `respond`.
+
+    :param max_memory: the maximum number of characters that are kept in memory
+    :param window_size: the number of characters at the start and the end of the output that are kept in memory
+    :param encoding: the encoding of the temporary file
+    """
+
+    def __init__(self,
+                 max_memory: int = DEFAULT_MAX_MEMORY,
+                 window_size: int = DEFAULT_WINDOW_SIZE,
+                 encoding: str = "utf-8"):
+        self.max_memory = max_memory
+        self.window_size = window_size
+        self.encoding = encoding
+        self.size = 0
+        self.head = ""
+        self._parts: List[str] = []
+        self._tail = deque()
+        self._tail_size = 0
+        self._file = None
+        self._window_offset = 0
+
+    @property
+    def spilled(self) -> bool:
+        """
+        Whether the output exceeded `max_memory` and was written to a temporary file.
+        """
+        return self._file is not None
+
+    @property
+    def tail(self) -> str:
+        """
+        The last `window_size` characters of the output.
+        """
+        return "".join(self._tail)[-self.window_size:] if self.window_size else ""
+
+    def append(self, text: str):
+        """
+        Adds output to the capture.
+
+        :param text: the decoded output
+        """
+        if not text:
+            return
+
+        if len(self.head) < self.window_size:
+            self.head += text[:self.window_size - len(self.head)]
+
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while len(self._tail) > 1 and self._tail_size - len(self._tail[0]) >= self.window_size:
+            self._tail_size -= len(self._tail.popleft())
+
+        self.size += len(text)
+        if self._file is not None:
+            self._file.write(text)
+        elif self.size > self.max_memory:
+            self._file = tempfile.TemporaryFile("w+", encoding=self.encoding, newline="")
+            self._file.writelines(self._parts)
+            self._file.write(text)
+            self._parts = []
+        else:
+            self._parts.append(text)
+
+    def respond(self, watchers: List[StreamWatcher]) -> Iterator[str]:
+        """
+        Lets watchers respond to the most recent output. Watchers are given the `tail` instead of the full output, so
+        the stream they see starts further into the output every time the tail moves along. Before they see it, the
+        positions up to which they've seen the stream are moved back by as much with `rebase_watcher`.
+
+        :param watchers: the watchers of this stream
+        :return: the responses of the watchers
+        """
+        tail = self.tail
+        offset = self.size - len(tail)
+        shift, self._window_offset = offset - self._window_offset, offset
+        if shift:
+            for watcher in watchers:
+                rebase_watcher(watcher, shift)
+
+        for watcher in watchers:
+            yield from watcher.submit(tail)
+
+    def chunks(self, chunk_size: int = 1024 * 1024) -> Iterator[str]:
+        """
+        Iterates over the full output, without reading it into memory at once if it spilled.
+
+        :param chunk_size: the maximum number of characters per chunk when reading from the temporary file
+        """
+        if self._file is None:
+            yield from self._parts
+            return
+
+        self._file.flush()
+        self._file.seek(0)
+        try:
+            while True:
+                chunk = self._file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self._file.seek(0, 2)
+
+    def summary(self) -> str:
+        """
+        Returns the full output if it fits in memory, otherwise the head and the tail of the output with a marker
+        for the characters in between.
+
+        :return: the output
+        """
+        if self._file is None:
+            return "".join(self._parts)
+
+        head, tail = self.head, self.tail
+        omitted = self.size - len(head) - len(tail)
+        if omitted <= 0:
+            # The head and the tail overlap
+            return head + tail[-omitted:]
+
+        return f"{head}\n[... {omitted} characters omitted ...]\n{tail}"
+
+    def close(self):
+        """
+        Releases the captured output and removes the temporary file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._parts = []
+
+
+def rebase_watcher(watcher: StreamWatcher, shift: int):
+    """
+    Tells a watcher that the stream it's given from now on starts `shift` characters further into the output, e.g.
+    because it's the tail of an `OutputCapture`. Watchers with a ``rebase`` method, like
+    :class:`~sai_airflow_plugins.hooks.fabric_watchers.CombinedWatcher`, handle this themselves. Of other watchers,
+    the positions up to which invoke's `Responder` and `FailingResponder` have searched the stream are moved back.
+    Other watchers are given the tail as it is.
+
+    :param watcher: the watcher
+    :param shift: the number of characters the start of the stream moved
+    """
+    rebase = getattr(watcher, "rebase", None)
+    if callable(rebase):
+        rebase(shift)
+        return
+
+    for attr in ("index", "failure_index"):
+        position = getattr(watcher, attr, None)
+        if isinstance(position, int):
+            setattr(watcher, attr, max(position - shift, 0))
+
+
+def close_result(result: Result):
+    """
+    Closes a `CapturedResult` once its output has been used, which removes its temporary files. Other results have
+    nothing to close.
+
+    :param result: the result of a command
+    """
+    if isinstance(result, CapturedResult):
+        result.close()
+
+
+class CapturedResult(Result):
+    """
+    A Fabric `Result` for a command whose output was captured with an `OutputCapture`. Its ``stdout`` and ``stderr``
+    are the summaries of the captures, and the captures themselves give access to the full output.
+
+    :param stdout_capture: the capture of stdout
+    :param stderr_capture: the capture of stderr
+    """
+
+    def __init__(self, stdout_capture: OutputCapture, stderr_capture: OutputCapture, **kwargs):
+        kwargs.update(stdout=stdout_capture.summary(), stderr=stderr_capture.summary())
+        super().__init__(**kwargs)
+        self.stdout_capture = stdout_capture
+        self.stderr_capture = stderr_capture
+
+    @property
+    def spilled(self) -> bool:
+        """
+        Whether stdout or stderr exceeded the in-memory budget, in which case they only contain the head and the tail
+        of the output.
+        """
+        return self.stdout_capture.spilled or self.stderr_capture.spilled
+
+    def close(self):
+        """
+        Releases the captured output and removes the temporary files.
+        """
+        self.stdout_capture.close()
+        self.stderr_capture.close()
+
+
+class CapturingRemote(Remote):
+    """
+    Fabric runner that captures the output of a command with a fixed in-memory budget, using an `OutputCapture` for
+    stdout and stderr. Fabric's own runner keeps the full output in memory, and joins it into a single string every
+    time output arrives to let the watchers respond to it. It returns a `CapturedResult`.
+
+    Use it with Fabric's ``runners.remote`` setting, or pass it to ``Connection._run`` or ``Connection._sudo``.
+
+    :param max_memory: the maximum number of characters of each stream that are kept in memory
+    :param window_size: the number of characters at the start and the end of the output that are kept in memory
+    """
+
+    def __init__(self,
+                 *args,
+                 max_memory: int = DEFAULT_MAX_MEMORY,
+                 window_size: int = DEFAULT_WINDOW_SIZE,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_memory = max_memory
+        self.window_size = window_size
+        self.stdout_capture: Optional[OutputCapture] = None
+        self.stderr_capture: Optional[OutputCapture] = None
+
+    def create_io_threads(self):
+        self.stdout_capture = OutputCapture(self.max_memory, self.window_size, self.encoding)
+        self.stderr_capture = OutputCapture(self.max_memory, self.window_size, self.encoding)
+        return super().create_io_threads()
+
+    def _handle_output(self, buffer_, hide, output, reader):
+        # The list buffer of the base class stays empty; output goes into the capture of the stream instead
+        capture = self.stdout_capture if reader == self.read_proc_stdout else self.stderr_capture
+        for data in self.read_proc_output(reader):
+            if not hide:
+                self.write_our_output(stream=output, string=data)
+            capture.append(data)
+            self.respond(capture)
+
+    def respond(self, buffer_):
+        for response in buffer_.respond(self.watchers):
+            self.write_proc_stdin(response)
+
+    def generate_result(self, **kwargs):
+        kwargs.pop("stdout", None)
+        kwargs.pop("stderr", None)
+        kwargs["connection"] = self.context
+        return CapturedResult(stdout_capture=self.stdout_capture, stderr_capture=self.stderr_capture, **kwargs)
@@ -0,0 +1,91 @@
+import math
+import shlex
+import uuid
+from typing import Optional
+
+from fabric import Connection, Result
+from fabric.runners import Remote
+
+DEFAULT_GRACE_PERIOD = 10
+
+
+class RemoteProcessGroup(object):
+    """
+    Keeps track of the process group of a remote command, so it can be terminated from another channel, e.g. when the
+    task is killed. The SSH server starts every command in a new session, so the shell that runs the command leads a
+    process group that contains the command and all its children. The command is wrapped to write the process id of
+    that shell to a file, which is removed again when the shell exits.
+
+    Sudo commands must be wrapped before sudo, so the process group of the shell that started sudo is tracked. Use
+    `TrackedRemote` as Fabric runner, or pass the group to `AsyncFabricRunner.run`, which both do that.
+
+    :param pid_file: the remote path of the file with the process id. If None, a unique file in ``/tmp`` is used.
+    """
+
+    def __init__(self, pid_file: Optional[str] = None):
+        self.pid_file = pid_file or f"/tmp/sai_airflow_plugins_{uuid.uuid4().hex}.pid"
+
+    def wrap(self, command: str) -> str:
+        """
+        Wraps a command to record the process id of the shell that runs it.
+
+        :param command: the command, including a sudo prefix if any
+        :return: the wrapped command
+        """
+        quoted_file = shlex.quote(self.pid_file)
+        return f"echo $$ > {quoted_file}; trap 'rm -f {quoted_file}' EXIT; {command}"
+
+    def get_kill_command(self, grace_period: float = DEFAULT_GRACE_PERIOD) -> str:
+        """
+        Returns a command that sends SIGTERM to the process group, and SIGKILL if it's still running after the grace
+        period. It does nothing if the command has already finished.
+
+        :param grace_period: the number of seconds to wait for the processes to exit after SIGTERM
+        :return: the command
+        """
+        quoted_file = shlex.quote(self.pid_file)
+        return f"pid=$(cat {quoted_file} 2>/dev/null); [ -n \"$pid\" ] || exit 0; " \
+               f"kill -TERM -$pid 2>/dev/null || exit 0; " \
+               f"i=0; while [ $i -lt {math.ceil(grace_period)} ] && kill -0 -$pid 2>/dev/null; do " \
+               f"sleep 1; i=$((i + 1)); done; " \
+               f"if kill -0 -$pid 2>/dev/null; then kill -KILL -$pid; echo killed; else echo terminated; fi; " \
+               f"rm -f {quoted_file}"
+
+    def terminate(self,
+                  conn: Connection,
+                  grace_period: float = DEFAULT_GRACE_PERIOD,
+                  sudo: bool = False,
+                  password: Optional[str] = None) -> Result:
+        """
+        Terminates the process group over a new channel of a connection. This can be the connection that runs the
+        command, since every command gets its own channel.
+
+        :param conn: the `Connection` object to use
+        :param grace_period: the number of seconds to wait for the processes to exit after SIGTERM, before they're
+                             killed with SIGKILL
+        :param sudo: send the signals with sudo, which is necessary if the command runs as another user
+        :param password: the sudo password
+        :return: the `Result` of the kill command. Its stdout is ``terminated`` or ``killed``, or empty if the
+                 command wasn't running anymore.
+        """
+        command = self.get_kill_command(grace_period)
+        if sudo:
+            return conn.sudo(f"sh -c {shlex.quote(command)}", password=password, hide=True, warn=True)
+
+        return conn.run(command, hide=True, warn=True)
+
+
+class TrackedRemote(Remote):
+    """
+    Fabric runner that wraps the command with `RemoteProcessGroup.wrap`. Pass it to ``Connection._run`` or
+    ``Connection._sudo``.
+
+    :param process: the `RemoteProcessGroup` of the command
+    """
+
+    def __init__(self, *args, process: RemoteProcessGroup, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.process = process
+
+    def start(self, command, shell, env, timeout=None):
+        return super().start(self.process.wrap(command), shell, env, timeout=timeout)
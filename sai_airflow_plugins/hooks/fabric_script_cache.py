@@ -0,0 +1,125 @@
+import hashlib
+import math
+import posixpath
+import shlex
+import uuid
+from typing import Optional
+
+from airflow.configuration import conf
+from airflow.exceptions import AirflowException
+from airflow.utils.log.logging_mixin import LoggingMixin
+from fabric import Connection
+
+DEFAULT_CACHE_DIR = conf.get("sai_airflow_plugins", "script_cache_dir",
+                             fallback=".cache/sai_airflow_plugins/scripts")
+DEFAULT_MAX_AGE = conf.getfloat("sai_airflow_plugins", "script_cache_max_age", fallback=7 * 24 * 3600)
+DEFAULT_MAX_COUNT = conf.getint("sai_airflow_plugins", "script_cache_max_count", fallback=50)
+DEFAULT_MIN_AGE = conf.getfloat("sai_airflow_plugins", "script_cache_min_age", fallback=600)
+
+
+class RemoteScriptCache(LoggingMixin):
+    """
+    A content-addressed cache of scripts on a remote host. A script is uploaded once, to a path derived from the
+    SHA-256 hash of its content, and executed by that path afterwards. Running the same script again only costs a
+    short command that checks whether it's still there, instead of sending the full script.
+
+    Whenever a new script is uploaded, old scripts are removed: scripts that weren't used for `max_age` seconds, and
+    the least recently used scripts above `max_count`. The modification time of a script is updated every time it's
+    used, and scripts that were used in the last `min_age` seconds are never removed, so a concurrent task can't
+    remove a script between the check that it's cached and its execution.
+
+    The defaults are taken from the options ``script_cache_dir``, ``script_cache_max_age``,
+    ``script_cache_max_count`` and ``script_cache_min_age`` in the ``[sai_airflow_plugins]`` section of the Airflow
+    configuration. A relative `cache_dir` is relative to the home directory of the remote user.
+
+    :param conn: the `Connection` object to use
+    :param cache_dir: the remote directory of the cache. It's created with permissions 700 if it doesn't exist.
+    :param max_age: the number of seconds after which an unused script is removed. If None, scripts aren't removed
+                    by age.
+    :param max_count: the maximum number of scripts in the cache. If None, scripts aren't removed by count. The
+                      cache may temporarily hold more scripts than this if they were used recently.
+    :param min_age: the number of seconds after its last use during which a script is never removed
+    """
+
+    def __init__(self,
+                 conn: Connection,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_age: Optional[float] = DEFAULT_MAX_AGE,
+                 max_count: Optional[int] = DEFAULT_MAX_COUNT,
+                 min_age: float = DEFAULT_MIN_AGE):
+        super().__init__()
+        self.conn = conn
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_count = max_count
+        self.min_age = min_age
+
+    def get_path(self, script: str) -> str:
+        """
+        Returns the remote path of a script in the cache.
+
+        :param script: the content of the script
+        :return: the remote path
+        """
+        return posixpath.join(self.cache_dir, hashlib.sha256(script.encode()).hexdigest() + ".sh")
+
+    def upload(self, script: str) -> str:
+        """
+        Uploads a script to the cache, unless it's already there.
+
+        :param script: the content of the script
+        :return: the remote path of the script, which is executable
+        """
+        path = self.get_path(script)
+        quoted_dir, quoted_path = shlex.quote(self.cache_dir), shlex.quote(path)
+
+        res = self.conn.run(f"mkdir -p -m 700 {quoted_dir} && if [ -f {quoted_path} ]; then touch {quoted_path} && "
+                            f"echo cached; fi", hide=True, warn=True)
+        if res.exited != 0:
+            raise AirflowException(f"Could not create the remote script cache directory {self.cache_dir}")
+
+        if res.stdout.strip() == "cached":
+            self.log.info(f"Using cached remote script {path}")
+            return path
+
+        # Upload to a temporary file first, so a script is never executed before it's complete
+        tmp_path = posixpath.join(self.cache_dir, f".{uuid.uuid4().hex}.tmp")
+        data = script.encode()
+        with self.conn.sftp().open(tmp_path, "wb") as f:
+            f.write(data)
+
+        res = self.conn.run(f"chmod 700 {shlex.quote(tmp_path)} && mv -f {shlex.quote(tmp_path)} {quoted_path}",
+                            hide=True, warn=True)
+        if res.exited != 0:
+            raise AirflowException(f"Could not move the uploaded script to {path}")
+
+        self.log.info(f"Uploaded script of {len(data)} bytes to remote script cache as {path}")
+        self.collect_garbage(keep=path)
+        return path
+
+    def collect_garbage(self, keep: Optional[str] = None):
+        """
+        Removes scripts that weren't used for `max_age` seconds and the least recently used scripts above `max_count`,
+        as well as leftovers of interrupted uploads. Scripts that were used in the last `min_age` seconds are kept.
+
+        :param keep: the path of a script that must not be removed
+        """
+        quoted_dir = shlex.quote(self.cache_dir)
+        keep_name = f"! -name {shlex.quote(posixpath.basename(keep))} " if keep else ""
+        min_minutes = max(math.ceil(self.min_age / 60), 1)
+        commands = [f"find {quoted_dir} -maxdepth 1 -type f -name '.*.tmp' -mmin +60 -exec rm -f {{}} +"]
+
+        if self.max_age is not None:
+            minutes = max(math.ceil(self.max_age / 60), min_minutes)
+            commands.append(f"find {quoted_dir} -maxdepth 1 -type f -name '*.sh' {keep_name}-mmin +{minutes} "
+                            f"-exec rm -f {{}} +")
+
+        if self.max_count is not None:
+            # Only remove the scripts above the count that weren't used recently
+            commands.append(f"ls -1t {quoted_dir} | grep '\\.sh$' | tail -n +{self.max_count + 1} | "
+                            f"while read name; do find {quoted_dir} -maxdepth 1 -type f -name \"$name\" {keep_name}"
+                            f"-mmin +{min_minutes} -exec rm -f {{}} +; done")
+
+        res = self.conn.run("; ".join(commands), hide=True, warn=True)
+        if res.exited != 0:
+            self.log.warning(f"Could not clean up the remote script cache {self.cache_dir}")
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+import stat
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from airflow.utils.log.logging_mixin import LoggingMixin
+from fabric import Connection
+from paramiko import SFTPClient
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_DELTA_THRESHOLD = 64 * 1024 * 1024
+
+
+class SyncResult(NamedTuple):
+    """
+    The outcome of a directory sync with `FabricHook.sync_dir`.
+    """
+    uploaded: List[str]
+    patched: List[str]
+    deleted: List[str]
+    unchanged: int
+    bytes_sent: int
+    duration: float
+
+
+class DirectorySync(LoggingMixin):
+    """
+    Synchronizes a local directory to a remote directory over SFTP, sending only what changed. It doesn't need rsync
+    or anything else besides a POSIX shell on the remote host.
+
+    Files are compared by size and modification time first. Files that differ are compared by their SHA-256 hash,
+    so a file that was only touched isn't sent again. Files that changed are uploaded, except files of at least
+    `delta_threshold` bytes that already exist remotely: of those only the blocks of `block_size` bytes that differ
+    are written. Uploaded files get the modification time of the local file, so they match on the next run.
+
+    The remote manifest with sizes, modification times and hashes is cached in a local file between runs. Remote
+    hashes are only computed again for files whose size or modification time changed since the last run.
+
+    Symbolic links are followed on both sides, so a linked file or directory is compared by its target.
+
+    :param conn: the `Connection` object to use
+    :param local_dir: the local source directory
+    :param remote_dir: the remote destination directory. It's created if it doesn't exist.
+    :param state_id: identifies the remote host in the manifest cache, e.g. user, host and port
+    :param delete: delete remote files that don't exist in the local directory
+    :param checksum: compare the hashes of all files, instead of skipping files with the same size and modification
+                     time
+    :param block_size: the size of the blocks that are compared for large files
+    :param delta_threshold: the minimum file size for sending only changed blocks
+    :param cache_dir: the directory of the manifest cache. Defaults to a directory in the local temp directory.
+    """
+
+    def __init__(self,
+                 conn: Connection,
+                 local_dir: str,
+                 remote_dir: str,
+                 state_id: str,
+                 delete: bool = False,
+                 checksum: bool = False,
+                 block_size: int = DEFAULT_BLOCK_SIZE,
+                 delta_threshold: int = DEFAULT_DELTA_THRESHOLD,
+                 cache_dir: Optional[str] = None):
+        super().__init__()
+        self.conn = conn
+        self.local_dir = local_dir
+        self.remote_dir = remote_dir.rstrip("/") or "/"
+        self.state_id = state_id
+        self.delete = delete
+        self.checksum = checksum
+        self.block_size = block_size
+        self.delta_threshold = delta_threshold
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "sai_airflow_plugins_sync")
+        self._bytes_sent = 0
+
+    def run(self) -> SyncResult:
+        """
+        Executes the sync.
+
+        :return: `SyncResult` object
+        """
+        started = time.monotonic()
+        self.conn.open()
+        sftp = self.conn.sftp()
+
+        local = self._scan_local()
+        remote = self._scan_remote()
+        cached = self._load_manifest()
+
+        # Reuse cached hashes of remote files that didn't change since the last run
+        for path, entry in remote.items():
+            cached_entry = cached.get(path)
+            if cached_entry and (cached_entry["size"], cached_entry["mtime"]) == (entry["size"], entry["mtime"]):
+                entry.update(sha256=cached_entry.get("sha256"), blocks=cached_entry.get("blocks"))
+
+        # Find files that may have changed, and get the missing hashes of those in one round-trip
+        candidates = [path for path, entry in local.items() if path in remote and remote[path]["size"] == entry["size"]
+                      and (self.checksum or remote[path]["mtime"] != entry["mtime"])]
+        self._hash_remote([path for path in candidates if not remote[path].get("sha256")], remote)
+
+        changed, unchanged = [], 0
+
+        for path, entry in sorted(local.items()):
+            remote_entry = remote.get(path)
+
+            if remote_entry and (remote_entry["size"], remote_entry["mtime"]) == (entry["size"], entry["mtime"]) \
+                    and not self.checksum:
+                entry.update(sha256=remote_entry.get("sha256"), blocks=remote_entry.get("blocks"))
+                unchanged += 1
+
+            elif remote_entry and remote_entry["size"] == entry["size"] \
+                    and remote_entry.get("sha256") == self._local_sha256(path, entry):
+                # Same content, only align the modification time for the next quick check
+                sftp.utime(self._remote_path(path), (entry["mtime"], entry["mtime"]))
+                entry["blocks"] = remote_entry.get("blocks")
+                unchanged += 1
+
+            else:
+                changed.append(path)
+
+        uploaded, patched = [], []
+        if changed:
+            self._make_remote_dirs(changed)
+
+        for path in changed:
+            if path in remote and local[path]["size"] >= self.delta_threshold:
+                self._patch(sftp, path, local[path], remote[path])
+                patched.append(path)
+            else:
+                self._upload(sftp, path, local[path])
+                uploaded.append(path)
+
+        deleted = []
+        if self.delete:
+            deleted = sorted(set(remote) - set(local))
+            for path in deleted:
+                sftp.remove(self._remote_path(path))
+
+        self._save_manifest(local)
+
+        self.log.info(f"Synced {self.local_dir} to {self.remote_dir}: {len(uploaded)} uploaded, {len(patched)} "
+                      f"patched, {len(deleted)} deleted, {unchanged} unchanged, {self._bytes_sent} bytes sent")
+        return SyncResult(uploaded=uploaded, patched=patched, deleted=deleted, unchanged=unchanged,
+                          bytes_sent=self._bytes_sent, duration=time.monotonic() - started)
+
+    def _remote_path(self, path: str) -> str:
+        return posixpath.join(self.remote_dir, path)
+
+    def _scan_local(self) -> Dict[str, Dict]:
+        """
+        Lists the local files with their size and modification time, keyed by their relative POSIX path.
+        """
+        manifest = {}
+        visited = set()
+        for root, dirs, files in os.walk(self.local_dir, followlinks=True):
+            # Don't follow a directory link that leads back to a directory that was already listed
+            root_stat = os.stat(root)
+            if (root_stat.st_dev, root_stat.st_ino) in visited:
+                dirs[:] = []
+                continue
+            visited.add((root_stat.st_dev, root_stat.st_ino))
+
+            for name in files:
+                full_path = os.path.join(root, name)
+                try:
+                    file_stat = os.stat(full_path)
+                except FileNotFoundError:
+                    # A broken link
+                    continue
+                path = os.path.relpath(full_path, self.local_dir).replace(os.sep, "/")
+                manifest[path] = {"size": file_stat.st_size, "mtime": int(file_stat.st_mtime)}
+        return manifest
+
+    def _scan_remote(self) -> Dict[str, Dict]:
+        """
+        Lists the remote files with their size and modification time in a single command, using GNU find. Falls back
+        to walking the directory over SFTP. The entries are separated by NUL characters, since file names may contain
+        newlines.
+        """
+        res = self.conn.run(f"find -L {shlex.quote(self.remote_dir)} -type f -printf '%P\\t%s\\t%T@\\0'",
+                            hide=True, warn=True)
+
+        if res.exited == 0:
+            manifest = {}
+            for entry in res.stdout.split("\0"):
+                if entry:
+                    path, size, mtime = entry.rsplit("\t", 2)
+                    manifest[path] = {"size": int(size), "mtime": int(float(mtime))}
+            return manifest
+
+        return self._walk_remote(self.conn.sftp(), "")
+
+    def _walk_remote(self, sftp: SFTPClient, rel_dir: str) -> Dict[str, Dict]:
+        manifest = {}
+        try:
+            attrs = sftp.listdir_attr(self._remote_path(rel_dir))
+        except FileNotFoundError:
+            return manifest
+        except IOError as e:
+            # Skip an unreadable directory, like find does
+            self.log.warning(f"Skipping remote directory {self._remote_path(rel_dir)}: {e}")
+            return manifest
+
+        for attr in attrs:
+            path = posixpath.join(rel_dir, attr.filename)
+            if stat.S_ISLNK(attr.st_mode):
+                try:
+                    attr = sftp.stat(self._remote_path(path))
+                except FileNotFoundError:
+                    # A broken link
+                    continue
+                except IOError as e:
+                    self.log.warning(f"Skipping remote link {self._remote_path(path)}: {e}")
+                    continue
+
+            if stat.S_ISDIR(attr.st_mode):
+                manifest.update(self._walk_remote(sftp, path))
+            elif stat.S_ISREG(attr.st_mode):
+                manifest[path] = {"size": attr.st_size, "mtime": int(attr.st_mtime)}
+        return manifest
+
+    def _hash_remote(self, paths: List[str], remote: Dict[str, Dict]):
+        """
+        Computes the SHA-256 hashes of remote files with a single command. The command prints a line per file, with
+        ``-`` for a file that couldn't be hashed, so only that file is compared by uploading it.
+        """
+        if not paths:
+            return
+
+        quoted = " ".join(shlex.quote(self._remote_path(path)) for path in paths)
+        res = self.conn.run(f"for f in {quoted}; do h=$(sha256sum < \"$f\") && echo \"${{h%% *}}\" || echo -; done",
+                            hide=True, warn=True)
+        lines = res.stdout.splitlines()
+        if len(lines) != len(paths):
+            lines = ["-"] * len(paths)
+
+        for path, line in zip(paths, lines):
+            remote[path]["sha256"] = line if line != "-" else None
+
+    def _local_sha256(self, path: str, entry: Dict) -> str:
+        if not entry.get("sha256"):
+            sha256 = hashlib.sha256()
+            with open(os.path.join(self.local_dir, path), "rb") as f:
+                for block in iter(lambda: f.read(self.block_size), b""):
+                    sha256.update(block)
+            entry["sha256"] = sha256.hexdigest()
+        return entry["sha256"]
+
+    def _local_blocks(self, path: str) -> List[str]:
+        with open(os.path.join(self.local_dir, path), "rb") as f:
+            return [hashlib.sha256(block).hexdigest() for block in iter(lambda: f.read(self.block_size), b"")]
+
+    def _remote_blocks(self, path: str, size: int) -> List[str]:
+        """
+        Computes the hashes of the blocks of a remote file with ``dd`` and ``sha256sum``.
+        """
+        num_blocks = -(-size // self.block_size)
+        res = self.conn.run(
+            f"f={shlex.quote(self._remote_path(path))}; i=0; while [ $i -lt {num_blocks} ]; do "
+            f"dd if=\"$f\" bs={self.block_size} skip=$i count=1 2>/dev/null | sha256sum | cut -d' ' -f1; "
+            f"i=$((i+1)); done",
+            hide=True, warn=True
+        )
+        return res.stdout.split() if res.exited == 0 else []
+
+    def _make_remote_dirs(self, paths: List[str]):
+        dirs = sorted({posixpath.dirname(self._remote_path(path)) for path in paths})
+        self.conn.run(f"mkdir -p -- {' '.join(shlex.quote(d) for d in dirs)}", hide=True)
+
+    def _upload(self, sftp: SFTPClient, path: str, entry: Dict):
+        remote_path = self._remote_path(path)
+        sftp.put(os.path.join(self.local_dir, path), remote_path)
+        sftp.utime(remote_path, (entry["mtime"], entry["mtime"]))
+        self._bytes_sent += entry["size"]
+
+        # Record the hashes in the manifest, so the remote file doesn't need to be hashed on the next run
+        self._local_sha256(path, entry)
+        if entry["size"] >= self.delta_threshold:
+            entry["blocks"] = self._local_blocks(path)
+
+    def _patch(self, sftp: SFTPClient, path: str, entry: Dict, remote_entry: Dict):
+        """
+        Writes the blocks of a large file that differ from the remote file.
+        """
+        remote_blocks = remote_entry.get("blocks") or self._remote_blocks(path, remote_entry["size"])
+        local_blocks = self._local_blocks(path)
+        remote_path = self._remote_path(path)
+
+        with open(os.path.join(self.local_dir, path), "rb") as src, sftp.open(remote_path, "r+b") as dst:
+            dst.set_pipelined(True)
+            for index, block_hash in enumerate(local_blocks):
+                if index < len(remote_blocks) and remote_blocks[index] == block_hash:
+                    continue
+                src.seek(index * self.block_size)
+                data = src.read(self.block_size)
+                dst.seek(index * self.block_size)
+                dst.write(data)
+                self._bytes_sent += len(data)
+
+        sftp.truncate(remote_path, entry["size"])
+        sftp.utime(remote_path, (entry["mtime"], entry["mtime"]))
+        self._local_sha256(path, entry)
+        entry["blocks"] = local_blocks
+
+    def _manifest_path(self) -> str:
+        key = hashlib.sha256(json.dumps([self.state_id, self.remote_dir]).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, Dict]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._manifest_path()
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
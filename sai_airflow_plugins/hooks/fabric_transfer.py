@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import queue
+import shlex
+import tempfile
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Set, Tuple
+
+from airflow.exceptions import AirflowException
+from airflow.utils.log.logging_mixin import LoggingMixin
+from fabric import Connection
+from paramiko import SFTPClient
+
+PUT = "put"
+GET = "get"
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class TransferResult(NamedTuple):
+    """
+    The outcome of a file transfer with `FabricHook.put` or `FabricHook.get`.
+    """
+    source: str
+    destination: str
+    size: int
+    transferred: int
+    duration: float
+    checksum: Optional[str]
+
+
+class ChunkedTransfer(LoggingMixin):
+    """
+    Transfers a single file over SFTP in fixed-size chunks, using several connections at the same time.
+
+    Each worker thread gets its own connection from `conn_factory`, so the chunks are transferred over separate SSH
+    transports. Completed chunks are recorded in a state file in the local temp directory. When a transfer is
+    interrupted, e.g. by a disconnect, the failed chunks are retried, and a new transfer of the same file resumes with
+    the chunks that weren't completed yet. After all chunks are done, the SHA-256 checksums of the local and remote
+    file are compared.
+
+    :param direction: ``"put"`` to upload or ``"get"`` to download
+    :param local_path: path of the local file
+    :param remote_path: path of the remote file
+    :param conn_factory: callable that returns a `Connection`, e.g. `FabricHook.get_pooled_fabric_conn`
+    :param conn_release: callable that hands back a connection with a `discard` flag, e.g.
+                         `FabricHook.release_fabric_conn`
+    :param state_id: identifies the remote end in the state file name, e.g. user, host and port
+    :param chunk_size: the number of bytes per chunk
+    :param max_concurrency: the maximum number of chunks that are transferred at the same time
+    :param resume: continue a previously interrupted transfer of the same file
+    :param verify: compare the checksums of the local and remote file after the transfer
+    :param retries: the number of times a failed chunk is retried, on a new connection
+    :param max_connections: the maximum number of connections `conn_factory` can hand out at the same time, e.g. the
+                            connection pool's `max_per_host`. Each worker holds one connection, so `max_concurrency` is
+                            clamped to this limit.
+    """
+
+    def __init__(self,
+                 direction: str,
+                 local_path: str,
+                 remote_path: str,
+                 conn_factory: Callable[[], Connection],
+                 conn_release: Callable[..., None],
+                 state_id: str,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_concurrency: int = 4,
+                 resume: bool = True,
+                 verify: bool = True,
+                 retries: int = 3,
+                 max_connections: Optional[int] = None):
+        super().__init__()
+        if direction not in (PUT, GET):
+            raise AirflowException(f"Unknown transfer direction {direction}. Use '{PUT}' or '{GET}'.")
+
+        self.direction = direction
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.conn_factory = conn_factory
+        self.conn_release = conn_release
+        self.state_id = state_id
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        if max_connections is not None and max_concurrency > max_connections:
+            self.log.warning(f"max_concurrency {max_concurrency} exceeds the connection pool's limit of "
+                             f"{max_connections} connections per host. Using {max_connections} workers.")
+            self.max_concurrency = max_connections
+        self.resume = resume
+        self.verify = verify
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._transferred = 0
+
+    def run(self) -> TransferResult:
+        """
+        Executes the transfer.
+
+        :return: `TransferResult` object; raises `AirflowException` if a chunk keeps failing or the checksums differ
+        """
+        started = time.monotonic()
+        conn = self.conn_factory()
+        try:
+            conn.open()
+            size, mtime = self._stat_source(conn.sftp())
+            state_path = self._get_state_path(size, mtime)
+            done = self._load_state(state_path) if self.resume else set()
+            self._prepare_destination(conn.sftp(), size, fresh=not done)
+        except Exception:
+            self.conn_release(conn, discard=True)
+            raise
+        self.conn_release(conn)
+
+        num_chunks = max(1, -(-size // self.chunk_size))
+        todo = [index for index in range(num_chunks) if index not in done]
+        if done:
+            self.log.info(f"Resuming transfer of {self._source}: {len(done)} of {num_chunks} chunks already done")
+
+        self._transfer_chunks(todo, done, size, state_path)
+
+        checksum = None
+        if self.verify:
+            try:
+                checksum = self._verify()
+            except AirflowException:
+                # Start from scratch next time, as the chunks that were recorded as done can't be trusted
+                self._remove_state(state_path)
+                raise
+
+        self._remove_state(state_path)
+        return TransferResult(source=self._source, destination=self._destination, size=size,
+                              transferred=self._transferred, duration=time.monotonic() - started, checksum=checksum)
+
+    @property
+    def _source(self) -> str:
+        return self.local_path if self.direction == PUT else self.remote_path
+
+    @property
+    def _destination(self) -> str:
+        return self.remote_path if self.direction == PUT else self.local_path
+
+    def _stat_source(self, sftp: SFTPClient) -> Tuple[int, float]:
+        stat = os.stat(self.local_path) if self.direction == PUT else sftp.stat(self.remote_path)
+        return stat.st_size, stat.st_mtime
+
+    def _prepare_destination(self, sftp: SFTPClient, size: int, fresh: bool):
+        """
+        Creates the destination file with the final size, so chunks can be written at any offset.
+        """
+        if self.direction == PUT:
+            if fresh:
+                with sftp.open(self.remote_path, "wb"):
+                    pass
+            sftp.truncate(self.remote_path, size)
+        else:
+            mode = "wb" if fresh or not os.path.exists(self.local_path) else "r+b"
+            with open(self.local_path, mode) as f:
+                f.truncate(size)
+
+    def _transfer_chunks(self, todo: List[int], done: Set[int], size: int, state_path: str):
+        """
+        Transfers the chunks in `todo` with up to `max_concurrency` worker threads.
+        """
+        chunks = queue.Queue()
+        for index in todo:
+            chunks.put(index)
+        errors = []
+
+        def worker():
+            conn = None
+            try:
+                while not errors:
+                    try:
+                        index = chunks.get_nowait()
+                    except queue.Empty:
+                        return
+
+                    for attempt in range(self.retries + 1):
+                        try:
+                            if conn is None:
+                                conn = self.conn_factory()
+                                conn.open()
+                            self._transfer_chunk(conn.sftp(), index, size)
+                            break
+                        except Exception as e:
+                            if conn is not None:
+                                self.conn_release(conn, discard=True)
+                                conn = None
+                            if attempt == self.retries:
+                                errors.append(e)
+                                return
+                            self.log.warning(f"Transfer of chunk {index} failed, retrying on a new connection: {e}")
+
+                    with self._lock:
+                        done.add(index)
+                        self._save_state(state_path, done)
+            finally:
+                if conn is not None:
+                    self.conn_release(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(min(self.max_concurrency, len(todo)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise AirflowException(f"Transfer of {self._source} failed, rerun to resume it: {errors[0]}")
+
+    def _transfer_chunk(self, sftp: SFTPClient, index: int, size: int):
+        offset = index * self.chunk_size
+        length = min(self.chunk_size, size - offset)
+
+        if self.direction == PUT:
+            with open(self.local_path, "rb") as src, sftp.open(self.remote_path, "r+b") as dst:
+                dst.set_pipelined(True)
+                src.seek(offset)
+                dst.seek(offset)
+                dst.write(src.read(length))
+        else:
+            with sftp.open(self.remote_path, "rb") as src, open(self.local_path, "r+b") as dst:
+                dst.seek(offset)
+                # Unlike read, readv requests all blocks of the chunk at once instead of one after the other
+                for data in src.readv([(offset, length)]):
+                    dst.write(data)
+
+        with self._lock:
+            self._transferred += length
+
+    def _verify(self) -> str:
+        """
+        Compares the SHA-256 checksums of the local and remote file.
+
+        :return: the checksum
+        """
+        local_checksum = self._local_checksum()
+
+        conn = self.conn_factory()
+        try:
+            remote_checksum = self._remote_checksum(conn)
+        except Exception:
+            self.conn_release(conn, discard=True)
+            raise
+        self.conn_release(conn)
+
+        if local_checksum != remote_checksum:
+            raise AirflowException(f"Checksum mismatch after transfer of {self._source}: local {local_checksum}, "
+                                   f"remote {remote_checksum}")
+
+        return local_checksum
+
+    def _local_checksum(self) -> str:
+        sha256 = hashlib.sha256()
+        with open(self.local_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def _remote_checksum(self, conn: Connection) -> str:
+        """
+        Computes the checksum of the remote file with ``sha256sum``, or by reading it over SFTP if that fails.
+        """
+        res = conn.run(f"sha256sum {shlex.quote(self.remote_path)}", hide=True, warn=True)
+        if res.exited == 0 and res.stdout:
+            return res.stdout.split()[0]
+
+        sha256 = hashlib.sha256()
+        with conn.sftp().open(self.remote_path, "rb") as f:
+            f.prefetch()
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def _get_state_path(self, size: int, mtime: float) -> str:
+        state_key = json.dumps([self.direction, self.state_id, self.local_path, self.remote_path, size, mtime,
+                                self.chunk_size])
+        state_dir = os.path.join(tempfile.gettempdir(), "sai_airflow_plugins_transfers")
+        os.makedirs(state_dir, exist_ok=True)
+        return os.path.join(state_dir, hashlib.sha256(state_key.encode()).hexdigest() + ".json")
+
+    @staticmethod
+    def _load_state(state_path: str) -> Set[int]:
+        try:
+            with open(state_path) as f:
+                return set(json.load(f)["done"])
+        except (OSError, ValueError, KeyError):
+            return set()
+
+    @staticmethod
+    def _save_state(state_path: str, done: Set[int]):
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(done)}, f)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _remove_state(state_path: str):
+        try:
+            os.remove(state_path)
+        except FileNotFoundError:
+            pass
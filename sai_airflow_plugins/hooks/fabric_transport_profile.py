@@ -0,0 +1,125 @@
+import inspect
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+
+from airflow.exceptions import AirflowException
+from paramiko import SSHClient, Transport
+
+# Paramiko's SSHClient.connect only accepts a `transport_factory` from version 2.12 onwards
+TRANSPORT_FACTORY_SUPPORTED = "transport_factory" in inspect.signature(SSHClient.connect).parameters
+
+
+class TransportProfile(NamedTuple):
+    """
+    Tuning settings for the SSH transport of a connection. Settings that are None keep paramiko's defaults.
+
+    The preferred ciphers and MACs are moved to the front of paramiko's list, in the given order, as far as paramiko
+    supports them. The other algorithms stay available, so a server that supports none of the preferred ones can still
+    be connected to. Applying a profile requires paramiko 2.12 or later.
+
+    :param window_size: the SSH window size of new channels, in bytes. A larger window allows more data in flight,
+                        which matters on links with a high bandwidth-delay product. Paramiko's default is 2 MiB.
+    :param max_packet_size: the maximum size of a data packet on new channels, in bytes. Paramiko's default is 32 KiB.
+    :param ciphers: preferred ciphers, e.g. ``("aes128-gcm@openssh.com", "aes128-ctr")``
+    :param macs: preferred MAC algorithms, e.g. ``("hmac-sha2-256-etm@openssh.com",)``
+    :param rekey_bytes: the number of bytes after which the session keys are renegotiated. Paramiko's default is
+                        512 MiB, which interrupts bulk transfers frequently.
+    :param rekey_packets: the number of packets after which the session keys are renegotiated
+    :param compress: enable or disable compression, overriding the ``compress`` setting of the connection
+    """
+    window_size: Optional[int] = None
+    max_packet_size: Optional[int] = None
+    ciphers: Tuple[str, ...] = ()
+    macs: Tuple[str, ...] = ()
+    rekey_bytes: Optional[int] = None
+    rekey_packets: Optional[int] = None
+    compress: Optional[bool] = None
+
+    def create_transport(self, sock, **kwargs) -> Transport:
+        """
+        Creates a paramiko `Transport` with this profile applied. This is passed to paramiko's ``SSHClient.connect``
+        as its ``transport_factory``.
+
+        :param sock: the socket or socket-like object to create the transport on
+        :param kwargs: other arguments of `Transport`
+        :return: `Transport` object
+        """
+        if self.window_size is not None:
+            kwargs["default_window_size"] = self.window_size
+        if self.max_packet_size is not None:
+            kwargs["default_max_packet_size"] = self.max_packet_size
+
+        transport = Transport(sock, **kwargs)
+
+        options = transport.get_security_options()
+        if self.ciphers:
+            options.ciphers = self._prefer(options.ciphers, self.ciphers)
+        if self.macs:
+            options.digests = self._prefer(options.digests, self.macs)
+
+        if self.rekey_bytes is not None:
+            transport.packetizer.REKEY_BYTES = self.rekey_bytes
+        if self.rekey_packets is not None:
+            transport.packetizer.REKEY_PACKETS = self.rekey_packets
+
+        return transport
+
+    @staticmethod
+    def _prefer(available: Tuple[str, ...], preferred: Tuple[str, ...]) -> Tuple[str, ...]:
+        front = tuple(name for name in preferred if name in available)
+        return front + tuple(name for name in available if name not in front)
+
+
+TRANSPORT_PROFILES = {
+    # Fast local networks: a large window and packets keep the link busy, AES-GCM avoids a separate MAC and
+    # rekeying is rare
+    "lan-bulk": TransportProfile(
+        window_size=64 * 1024 * 1024,
+        max_packet_size=64 * 1024,
+        ciphers=("aes128-gcm@openssh.com", "aes128-ctr"),
+        macs=("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"),
+        rekey_bytes=2 ** 32,
+        rekey_packets=2 ** 31,
+        compress=False
+    ),
+    # High-latency links: a window that covers the bandwidth-delay product, with compression
+    "wan": TransportProfile(
+        window_size=32 * 1024 * 1024,
+        ciphers=("aes256-gcm@openssh.com", "aes256-ctr"),
+        macs=("hmac-sha2-256-etm@openssh.com", "hmac-sha2-512-etm@openssh.com"),
+        compress=True
+    ),
+    # Hosts with little CPU to spare: the cheapest ciphers and no compression
+    "low-cpu": TransportProfile(
+        ciphers=("aes128-gcm@openssh.com", "aes128-ctr"),
+        macs=("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256", "hmac-sha1"),
+        rekey_bytes=2 ** 32,
+        compress=False
+    ),
+}
+
+
+def get_transport_profile(profile: Union[str, Dict[str, Any], TransportProfile, None]) -> Optional[TransportProfile]:
+    """
+    Resolves a transport profile.
+
+    :param profile: the name of one of the `TRANSPORT_PROFILES`, a dict with the fields of a `TransportProfile`, a
+                    `TransportProfile`, or None
+    :return: `TransportProfile` object, or None if `profile` is None or empty; raises `AirflowException` if the profile
+             is unknown
+    """
+    if not profile:
+        return None
+
+    if isinstance(profile, TransportProfile):
+        return profile
+
+    if isinstance(profile, dict):
+        try:
+            return TransportProfile(**{k: tuple(v) if k in ("ciphers", "macs") else v for k, v in profile.items()})
+        except TypeError as e:
+            raise AirflowException(f"Invalid transport profile {profile}: {e}")
+
+    if profile not in TRANSPORT_PROFILES:
+        raise AirflowException(f"Unknown transport profile {profile}. Use one of {', '.join(TRANSPORT_PROFILES)}.")
+
+    return TRANSPORT_PROFILES[profile]
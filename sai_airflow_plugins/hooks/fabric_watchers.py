@@ -0,0 +1,173 @@
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from invoke import FailingResponder, Responder, StreamWatcher
+from invoke.exceptions import ResponseNotAccepted
+
+from sai_airflow_plugins.hooks.fabric_output import rebase_watcher
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+DEFAULT_LOOKBACK = 4096
+
+
+class WatcherStats(object):
+    """
+    Thread-safe statistics of a `CombinedWatcher`: the number of matches per pattern, the number of characters that
+    were scanned and the time spent scanning. Fabric's runner lets the watchers respond to stdout and stderr from
+    separate threads, so the statistics are shared between them.
+    """
+
+    def __init__(self):
+        self.matches: Dict[str, int] = {}
+        self.scanned = 0
+        self.scan_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, scanned: int, scan_time: float, matched: List[str]):
+        with self._lock:
+            self.scanned += scanned
+            self.scan_time += scan_time
+            for pattern in matched:
+                self.matches[pattern] = self.matches.get(pattern, 0) + 1
+
+    def __str__(self):
+        matches = ", ".join(f"{pattern!r}: {count}" for pattern, count in self.matches.items()) or "none"
+        return f"scanned {self.scanned} characters in {self.scan_time:.3f}s; matches: {matches}"
+
+
+class _Pattern(NamedTuple):
+    """
+    A pattern of a combined watcher: either the pattern of a `Responder`, or the sentinel of a `FailingResponder`.
+    """
+    pattern: str
+    watcher: Responder
+    sentinel: bool
+
+
+class CombinedWatcher(StreamWatcher):
+    """
+    Watcher that combines the patterns of many responders into a single regular expression. Invoke lets every
+    `Responder` search its own pattern in all output it hasn't matched yet, every time output is read, so output is
+    scanned again and again by every responder until its pattern is found. This watcher scans the output once for all
+    patterns, and only keeps the last part of the output that could be the start of a match that continues in the next
+    read. That part is as long as the longest possible match, or `lookback` characters for patterns without a maximum
+    length, like ``.*``.
+
+    The patterns and sentinels of `Responder` and `FailingResponder` objects are combined. Other watchers, and
+    responders with groups in their pattern, which can't be combined, are called as usual. Like in invoke, every match
+    of a pattern produces its response, and a `FailingResponder` raises `ResponseNotAccepted` when its sentinel appears
+    after it has responded. Unlike in invoke, matches of different patterns can't overlap.
+
+    :param watchers: the watchers to combine
+    :param lookback: the maximum number of characters of a match that can span multiple reads, for patterns that have
+                     no maximum length
+    :param stats: the `WatcherStats` to record the matches and scan time in. If None, a new one is created.
+    """
+
+    def __init__(self,
+                 watchers: List[StreamWatcher],
+                 lookback: int = DEFAULT_LOOKBACK,
+                 stats: Optional[WatcherStats] = None):
+        # StreamWatcher is thread-local: this runs again for every thread that uses the watcher, with the same
+        # arguments, so every stream gets its own scan state but the stats are shared
+        super().__init__()
+        self.stats = stats if stats is not None else WatcherStats()
+        self.others: List[StreamWatcher] = []
+        self.patterns: List[_Pattern] = []
+
+        for watcher in watchers:
+            if type(watcher) in (Responder, FailingResponder) and self._can_combine(watcher):
+                self.patterns.append(_Pattern(watcher.pattern, watcher, False))
+                if isinstance(watcher, FailingResponder):
+                    self.patterns.append(_Pattern(watcher.sentinel, watcher, True))
+            else:
+                self.others.append(watcher)
+
+        self.regex = re.compile("|".join(f"(?P<p{i}>{p.pattern})" for i, p in enumerate(self.patterns)), re.S) \
+            if self.patterns else None
+        self.lookback = max([self._max_width(p.pattern, lookback) - 1 for p in self.patterns] + [0])
+
+        self._seen = 0
+        self._pending = ""
+        self._responded = set()
+
+    def submit(self, stream: str) -> Iterator[str]:
+        for watcher in self.others:
+            yield from watcher.submit(stream)
+
+        if self.regex is None:
+            return
+
+        new_output = stream[self._seen:]
+        self._seen += len(new_output)
+
+        started = time.perf_counter()
+        text = self._pending + new_output
+        position = 0
+        matched = []
+        responses = []
+        failed = None
+
+        for match in self.regex.finditer(text):
+            pattern = self.patterns[int(match.lastgroup[1:])]
+            matched.append(pattern.pattern)
+            position = match.end()
+            if not pattern.sentinel:
+                responses.append(pattern.watcher.response)
+                self._responded.add(id(pattern.watcher))
+            elif id(pattern.watcher) in self._responded:
+                failed = pattern.watcher
+                break
+
+        # Keep the part of the output after the last match that could be the start of a match in the next read
+        self._pending = text[max(position, len(text) - self.lookback):]
+        self.stats.record(len(new_output), time.perf_counter() - started, matched)
+
+        if failed is not None:
+            raise ResponseNotAccepted(f"Auto-response to r\"{failed.pattern}\" failed with {failed.sentinel!r}!")
+
+        yield from responses
+
+    def rebase(self, shift: int):
+        """
+        Moves the position up to which the output was scanned back by `shift` characters, because the stream that's
+        submitted from now on starts that much further into the output, see
+        :func:`~sai_airflow_plugins.hooks.fabric_output.rebase_watcher`. If output was skipped, the part of the
+        output that could be the start of a match is dropped, since the match can't continue.
+
+        :param shift: the number of characters the start of the stream moved
+        """
+        for watcher in self.others:
+            rebase_watcher(watcher, shift)
+
+        self._seen -= shift
+        if self._seen < 0:
+            self._seen = 0
+            self._pending = ""
+
+    @staticmethod
+    def _can_combine(watcher: Responder) -> bool:
+        """
+        Checks whether the patterns of a responder can be combined with others. Patterns with groups can't be, as
+        groups are numbered in the combined expression and group names must be unique, and neither can patterns with
+        global flags, which must be at the start of the expression.
+        """
+        patterns = [watcher.pattern] + ([watcher.sentinel] if isinstance(watcher, FailingResponder) else [])
+        try:
+            return all(re.compile(f"(?:{pattern})").groups == 0 for pattern in patterns)
+        except (re.error, TypeError):
+            return False
+
+    @staticmethod
+    def _max_width(pattern: str, lookback: int) -> int:
+        """
+        Returns the maximum length of a match of a pattern, or `lookback` if it has no maximum.
+        """
+        width = sre_parse.parse(pattern, re.S).getwidth()[1]
+        return lookback if width >= sre_parse.MAXREPEAT else min(width, lookback)
@@ -3,6 +3,9 @@ from typing import Optional, List, Dict, Any
 
 from airflow.exceptions import AirflowException
 from airflow.hooks.http_hook import HttpHook
+from airflow.models import Connection
+
+from sai_airflow_plugins.hooks.connection_cache import get_connection_cache
 
 
 class MattermostWebhookHook(HttpHook):
@@ -18,6 +21,9 @@ class MattermostWebhookHook(HttpHook):
     This hook is based on `airflow.contrib.hooks.SlackWebhookHook` as the Mattermost interface is largely similar
     to that of Slack.
 
+    The connection is resolved through the process-wide
+    :class:`~sai_airflow_plugins.hooks.connection_cache.ConnectionCache`.
+
     :param http_conn_id: connection that optionally has a Mattermost webhook token in the extra field
     :param webhook_token: Mattermost webhook token. If http_conn_id isn't supplied this should be the full webhook url.
     :param message: The message you want to send on Mattermost
@@ -62,6 +68,16 @@ class MattermostWebhookHook(HttpHook):
         self.proxy = proxy
         self.extra_options = extra_options or {}
 
+    @classmethod
+    def get_connection(cls, conn_id: str) -> Connection:
+        """
+        Gets the Airflow connection through the process-wide connection cache.
+
+        :param conn_id: connection id
+        :return: Airflow `Connection` object
+        """
+        return get_connection_cache().get(conn_id, super().get_connection)
+
     def _get_token(self, token: str, http_conn_id: str) -> str:
         """
         Given either a manually set token or a conn_id, return the webhook_token to use.
@@ -74,7 +90,12 @@ class MattermostWebhookHook(HttpHook):
             return token
         elif http_conn_id:
             conn = self.get_connection(http_conn_id)
-            extra = conn.extra_dejson
+            try:
+                extra = conn.extra_dejson
+            except Exception:
+                # The cached connection may be stale, e.g. when its extra field can't be decrypted anymore
+                get_connection_cache().invalidate(http_conn_id)
+                raise
             return extra.get("webhook_token", "")
         else:
             raise AirflowException("Cannot get webhook token: no valid Mattermost webhook token nor conn_id supplied")
@@ -115,7 +136,13 @@ class MattermostWebhookHook(HttpHook):
             self.extra_options.update({"proxies": {"https": self.proxy}})
 
         mattermost_message = self._build_mattermost_message()
-        self.run(endpoint=self.webhook_token,
-                 data=mattermost_message,
-                 headers={"Content-type": "application/json"},
-                 extra_options=self.extra_options)
+        try:
+            self.run(endpoint=self.webhook_token,
+                     data=mattermost_message,
+                     headers={"Content-type": "application/json"},
+                     extra_options=self.extra_options)
+        except AirflowException as e:
+            # `HttpHook.check_response` reports the status code at the start of the message
+            if self.http_conn_id and str(e).startswith(("401:", "403:")):
+                get_connection_cache().invalidate(self.http_conn_id)
+            raise
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import tempfile
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+from airflow.configuration import conf
+from airflow.exceptions import AirflowException
+
+from sai_airflow_plugins.hooks.configurable_store import ConfigurableStore, write_file_atomically
+
+REFERENCE_KEY = "__sai_airflow_plugins_xcom_offload__"
+GZIP = "gzip"
+
+
+class BlobStore(ABC):
+    """
+    Base class of the stores that offloaded XCom values are written to. A store must be reachable from all workers
+    that pull the values. The store that's used by default is configured with the ``xcom_offload_store`` option, see
+    `get_blob_store`.
+    """
+
+    @abstractmethod
+    def put(self, key: str, chunks: Iterable[bytes]) -> str:
+        """
+        Writes a blob.
+
+        :param key: a unique key for the blob, which may contain slashes
+        :param chunks: the content of the blob
+        :return: the URI of the blob
+        """
+
+    @abstractmethod
+    def get(self, uri: str) -> bytes:
+        """
+        Reads a blob.
+
+        :param uri: the URI returned by `put`
+        :return: the content of the blob
+        """
+
+    @abstractmethod
+    def delete(self, uri: str):
+        """
+        Removes a blob.
+
+        :param uri: the URI returned by `put`
+        """
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Stores blobs as files in a local directory. With more than one worker this directory must be on a shared
+    filesystem. The default directory is taken from the ``xcom_offload_dir`` option in the ``[sai_airflow_plugins]``
+    section of the Airflow configuration.
+
+    :param root: the directory of the blobs
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.expanduser(root or conf.get(
+            "sai_airflow_plugins", "xcom_offload_dir",
+            fallback=os.path.join(tempfile.gettempdir(), "sai_airflow_plugins_xcom")
+        ))
+
+    def put(self, key: str, chunks: Iterable[bytes]) -> str:
+        path = os.path.join(self.root, *key.split("/"))
+        write_file_atomically(path, chunks)
+        return f"file://{path}"
+
+    def get(self, uri: str) -> bytes:
+        with open(self._path(uri), "rb") as f:
+            return f.read()
+
+    def delete(self, uri: str):
+        try:
+            os.remove(self._path(uri))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _path(uri: str) -> str:
+        if not uri.startswith("file://"):
+            raise AirflowException(f"Not a local blob URI: {uri}")
+        return uri[len("file://"):]
+
+
+def is_reference(value: Any) -> bool:
+    """
+    Checks whether an XCom value is a reference to an offloaded value.
+
+    :param value: the XCom value
+    :return: True if it's a reference created by `offload`
+    """
+    return isinstance(value, dict) and value.get(REFERENCE_KEY) == 1
+
+
+def offload(value: Union[str, Iterable[str]],
+            key_prefix: str = "",
+            store: Optional[BlobStore] = None,
+            compress: bool = True,
+            encoding: str = "utf-8") -> Dict[str, Any]:
+    """
+    Writes a value to a blob store, compressed with gzip unless `compress` is False, and returns a small reference to
+    it that can be pushed to an XCom instead. The value is encoded and compressed while it's written, so an iterable of
+    chunks is never held in memory at once.
+
+    :param value: the string to offload, or an iterable of chunks of it
+    :param key_prefix: a prefix for the key of the blob, e.g. the DAG and task id
+    :param store: the blob store. If None, the store returned by `get_blob_store` is used.
+    :param compress: compress the value with gzip
+    :param encoding: the encoding of the value
+    :return: a JSON-serializable dict with the URI of the blob, the size and SHA-256 checksum of the encoded value,
+             and the size of the blob
+    """
+    store = store or get_blob_store()
+    chunks = [value] if isinstance(value, str) else value
+    sha256 = hashlib.sha256()
+    sizes = {"size": 0, "stored_size": 0}
+
+    def blob_chunks() -> Iterator[bytes]:
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        for chunk in chunks:
+            data = chunk.encode(encoding)
+            sha256.update(data)
+            sizes["size"] += len(data)
+            if compressor:
+                data = compressor.compress(data)
+            sizes["stored_size"] += len(data)
+            yield data
+
+        if compressor:
+            data = compressor.flush()
+            sizes["stored_size"] += len(data)
+            yield data
+
+    key = "/".join(part for part in (key_prefix.strip("/"), uuid.uuid4().hex) if part)
+    uri = store.put(key + (".gz" if compress else ""), blob_chunks())
+
+    return {
+        REFERENCE_KEY: 1,
+        "uri": uri,
+        "size": sizes["size"],
+        "stored_size": sizes["stored_size"],
+        "sha256": sha256.hexdigest(),
+        "compression": GZIP if compress else None,
+        "encoding": encoding,
+    }
+
+
+def resolve(value: Any, store: Optional[BlobStore] = None) -> Any:
+    """
+    Resolves an XCom value that may be a reference created by `offload`. Other values are returned as they are.
+
+    :param value: the XCom value
+    :param store: the blob store. If None, the store returned by `get_blob_store` is used.
+    :return: the original value; raises `AirflowException` if the checksum of the blob doesn't match
+    """
+    if not is_reference(value):
+        return value
+
+    data = (store or get_blob_store()).get(value["uri"])
+    if value.get("compression") == GZIP:
+        data = zlib.decompress(data, wbits=31)
+
+    if len(data) != value["size"] or hashlib.sha256(data).hexdigest() != value["sha256"]:
+        raise AirflowException(f"Checksum mismatch for offloaded XCom value {value['uri']}")
+
+    return data.decode(value.get("encoding") or "utf-8")
+
+
+class LazyXCom(object):
+    """
+    An XCom value that's only resolved with `resolve` when it's used for the first time. Its string representation is
+    the resolved value, so it can be used in templates as well.
+
+    Example:
+    >>> output = LazyXCom(task_instance.xcom_pull(task_ids="my_task", key="stdout"))
+    >>> if output.offloaded and output.size > 2 ** 20: ...
+    >>> print(output.value)
+
+    :param value: the XCom value, which may be a reference to an offloaded value
+    :param store: the blob store. If None, the store returned by `get_blob_store` is used.
+    """
+
+    _unresolved = object()
+
+    def __init__(self, value: Any, store: Optional[BlobStore] = None):
+        self.reference = value
+        self.store = store
+        self._value = self._unresolved
+
+    @property
+    def offloaded(self) -> bool:
+        """
+        Whether the value was offloaded to a blob store.
+        """
+        return is_reference(self.reference)
+
+    @property
+    def size(self) -> Optional[int]:
+        """
+        The size of the encoded value if it was offloaded, without resolving it.
+        """
+        return self.reference["size"] if self.offloaded else None
+
+    @property
+    def value(self) -> Any:
+        """
+        The resolved value.
+        """
+        if self._value is self._unresolved:
+            self._value = resolve(self.reference, self.store)
+        return self._value
+
+    def __str__(self):
+        return str(self.value)
+
+
+_default_store = ConfigurableStore("xcom_offload_store", LocalBlobStore)
+
+
+def get_blob_store() -> BlobStore:
+    """
+    Returns the process-wide blob store for offloaded XCom values. It's an instance of the class in the
+    ``xcom_offload_store`` option in the ``[sai_airflow_plugins]`` section of the Airflow configuration, which defaults
+    to `LocalBlobStore`. It's created on the first call.
+
+    :return: `BlobStore` object
+    """
+    return _default_store.get()
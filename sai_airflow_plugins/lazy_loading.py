@@ -0,0 +1,56 @@
+import importlib
+import threading
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+_lock = threading.RLock()
+
+
+def lazy_attributes(module_globals: Dict[str, Any],
+                    attributes: Dict[str, Union[str, Callable[[], Any]]]) -> Tuple[Callable[[str], Any],
+                                                                                   Callable[[], List[str]]]:
+    """
+    Creates the module-level ``__getattr__`` and ``__dir__`` functions (PEP 562) for a module whose attributes are
+    loaded on first use. This keeps the import of the module cheap, e.g. when the scheduler parses DAG files that
+    import it, since heavy dependencies such as Fabric and paramiko are only imported when a class is actually used.
+
+    An attribute is either the name of the module that defines it, which is imported on first use, or a function that
+    creates it, e.g. a class with a heavy base class. A loaded attribute is stored in the module, so ``__getattr__``
+    isn't called for it again. A class that's created by a function gets the attribute name as its qualified name, so
+    it can be pickled and found by its import path. Usage::
+
+        __getattr__, __dir__ = lazy_attributes(globals(), {
+            "FabricOperator": "sai_airflow_plugins.operators.fabric_operator",
+            "ConditionalBashOperator": _create_conditional_bash_operator,
+        })
+
+    :param module_globals: the ``globals()`` of the module
+    :param attributes: dict of attribute names and the module that defines them or the function that creates them
+    :return: the ``__getattr__`` and ``__dir__`` functions of the module
+    """
+    module_name = module_globals["__name__"]
+
+    def __getattr__(name: str) -> Any:
+        try:
+            source = attributes[name]
+        except KeyError:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}") from None
+
+        # Two threads must not create two different classes for the same name
+        with _lock:
+            if name in module_globals:
+                return module_globals[name]
+
+            if isinstance(source, str):
+                value = getattr(importlib.import_module(source), name)
+            else:
+                value = source()
+                if isinstance(value, type):
+                    value.__qualname__ = name
+
+            module_globals[name] = value
+            return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(module_globals) | set(attributes))
+
+    return __getattr__, __dir__
@@ -0,0 +1,15 @@
+from sai_airflow_plugins.lazy_loading import lazy_attributes
+
+# The operators are imported on first use, e.g. `from sai_airflow_plugins.operators import FabricOperator`
+__getattr__, __dir__ = lazy_attributes(globals(), {
+    "ConditionalBashOperator": "sai_airflow_plugins.operators.conditional_operators",
+    "ConditionalFabricOperator": "sai_airflow_plugins.operators.conditional_operators",
+    "ConditionalPythonOperator": "sai_airflow_plugins.operators.conditional_operators",
+    "ConditionalSkipMixin": "sai_airflow_plugins.operators.conditional_skip_mixin",
+    "ConditionalTriggerDagRunOperator": "sai_airflow_plugins.operators.conditional_operators",
+    "FabricMultiHostOperator": "sai_airflow_plugins.operators.fabric_multi_host_operator",
+    "FabricOperator": "sai_airflow_plugins.operators.fabric_operator",
+    "FabricSyncOperator": "sai_airflow_plugins.operators.fabric_sync_operator",
+    "FabricTransferOperator": "sai_airflow_plugins.operators.fabric_transfer_operator",
+    "MattermostWebhookOperator": "sai_airflow_plugins.operators.mattermost_webhook_operator",
+})
@@ -1,52 +1,84 @@
-from airflow.operators.bash_operator import BashOperator
-from airflow.operators.dagrun_operator import TriggerDagRunOperator
-from airflow.operators.python_operator import PythonOperator
-
+"""
+Conditional versions of common operators. The classes are created on first use, so importing this module doesn't
+import the operators they're based on, nor Fabric and paramiko for `ConditionalFabricOperator`.
+"""
+from sai_airflow_plugins.lazy_loading import lazy_attributes
 from sai_airflow_plugins.operators.conditional_skip_mixin import ConditionalSkipMixin
-from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+
+# The classes are defined by __getattr__
+__all__ = ["ConditionalBashOperator", "ConditionalPythonOperator", "ConditionalTriggerDagRunOperator",  # noqa: F822
+           "ConditionalFabricOperator"]
+
+
+def _create_conditional_bash_operator() -> type:
+    from airflow.operators.bash_operator import BashOperator
+
+    class ConditionalBashOperator(ConditionalSkipMixin, BashOperator):
+        """
+        Conditional bash operator.
+
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~airflow.operators.bash_operator.BashOperator`
+        """
+        template_fields = BashOperator.template_fields + ConditionalSkipMixin.template_fields
+        template_ext = BashOperator.template_ext
+        ui_color = "#ede4ff"
+
+    return ConditionalBashOperator
+
+
+def _create_conditional_python_operator() -> type:
+    from airflow.operators.python_operator import PythonOperator
+
+    class ConditionalPythonOperator(ConditionalSkipMixin, PythonOperator):
+        """
+        Conditional python operator.
+
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~airflow.operators.python_operator.PythonOperator`
+        """
+        template_fields = PythonOperator.template_fields + ConditionalSkipMixin.template_fields
+        ui_color = "#ffebff"
+
+    return ConditionalPythonOperator
 
 
-class ConditionalBashOperator(ConditionalSkipMixin, BashOperator):
-    """
-    Conditional bash operator.
+def _create_conditional_trigger_dag_run_operator() -> type:
+    from airflow.operators.dagrun_operator import TriggerDagRunOperator
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~airflow.operators.bash_operator.BashOperator`
-    """
-    template_fields = BashOperator.template_fields + ConditionalSkipMixin.template_fields
-    template_ext = BashOperator.template_ext
-    ui_color = "#ede4ff"
+    class ConditionalTriggerDagRunOperator(ConditionalSkipMixin, TriggerDagRunOperator):
+        """
+        Conditional trigger DAG run operator.
 
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~airflow.operators.dagrun_operator.TriggerDagRunOperator`
+        """
+        template_fields = TriggerDagRunOperator.template_fields + ConditionalSkipMixin.template_fields
+        ui_color = "#efeaff"
 
-class ConditionalPythonOperator(ConditionalSkipMixin, PythonOperator):
-    """
-    Conditional python operator.
+    return ConditionalTriggerDagRunOperator
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~airflow.operators.python_operator.PythonOperator`
-    """
-    template_fields = PythonOperator.template_fields + ConditionalSkipMixin.template_fields
-    ui_color = "#ffebff"
 
+def _create_conditional_fabric_operator() -> type:
+    from sai_airflow_plugins.operators.fabric_operator import FabricOperator
 
-class ConditionalTriggerDagRunOperator(ConditionalSkipMixin, TriggerDagRunOperator):
-    """
-    Conditional trigger DAG run operator.
+    class ConditionalFabricOperator(ConditionalSkipMixin, FabricOperator):
+        """
+        Conditional Fabric operator.
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~airflow.operators.dagrun_operator.TriggerDagRunOperator`
-    """
-    template_fields = TriggerDagRunOperator.template_fields + ConditionalSkipMixin.template_fields
-    ui_color = "#efeaff"
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~sai_airflow_plugins.operators.fabric_operator.FabricOperator`
+        """
+        template_fields = FabricOperator.template_fields + ConditionalSkipMixin.template_fields
+        template_ext = FabricOperator.template_ext
+        ui_color = "#feffe5"
 
+    return ConditionalFabricOperator
 
-class ConditionalFabricOperator(ConditionalSkipMixin, FabricOperator):
-    """
-    Conditional Fabric operator.
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~sai_airflow_plugins.operators.fabric_operator.FabricOperator`
-    """
-    template_fields = FabricOperator.template_fields + ConditionalSkipMixin.template_fields
-    template_ext = FabricOperator.template_ext
-    ui_color = "#feffe5"
+__getattr__, __dir__ = lazy_attributes(globals(), {
+    "ConditionalBashOperator": _create_conditional_bash_operator,
+    "ConditionalPythonOperator": _create_conditional_python_operator,
+    "ConditionalTriggerDagRunOperator": _create_conditional_trigger_dag_run_operator,
+    "ConditionalFabricOperator": _create_conditional_fabric_operator,
+})
@@ -0,0 +1,237 @@
+import copy
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from airflow.exceptions import AirflowException
+from airflow.utils.decorators import apply_defaults
+from fabric import Connection
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook, LazyFabricHook, prepare_fabric_hook
+from sai_airflow_plugins.hooks.fabric_output import close_result
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+
+
+class FabricMultiHostOperator(FabricOperator):
+    """
+    Executes the same command on multiple remote hosts using the [Fabric](https://www.fabfile.org) library, from a
+    single task. Hosts are processed concurrently in rolling batches, and processing stops when too many hosts
+    failed.
+
+    The parameters of `FabricOperator` apply to every host, except `remote_host`, `parallel_commands`, `get_pty`,
+    `check_freshness` and a list of commands in `command`.
+    The connection settings of `fabric_hook` or `ssh_conn_id` are used for every host, with the host name replaced.
+
+    The operator returns a summary with the exit code and duration per host, which is pushed to the ``return_value``
+    XCom. It looks like ``{"host1": {"exited": 0, "duration": 1.2}, "host2": {"exited": None, "duration": 0.3,
+    "error": "..."}}``. Hosts that weren't processed because the failure threshold was exceeded are left out. When
+    `xcom_push_key` is set, a dict with the stdout per host is pushed to an XCom with that key.
+
+    :param hosts: list of hosts to execute the command on, or a string with comma-separated hosts, e.g. when it's
+                  rendered from a template. (templated)
+    :param host_group: name of a group of hosts in the ``host_groups`` field in the extras of the connection of
+                       `ssh_conn_id` or `fabric_hook`, e.g. ``{"host_groups": {"web": ["web1", "web2"]}}``. The hosts
+                       of the group are added to `hosts`. (templated)
+    :param max_concurrency: the maximum number of hosts that execute the command at the same time. The default is 10.
+    :param batch_size: the number of hosts per batch. A batch only starts when the previous one has finished, and no
+                       new batch is started when the failure threshold has been exceeded. If None (default), all
+                       hosts are in a single batch.
+    :param failure_threshold: the number of hosts that may fail before the task fails and stops processing new
+                              batches. A float between 0 and 1 is interpreted as a fraction of the number of hosts.
+                              The default is 0, so the task fails on the first failed host.
+    """
+
+    template_fields = FabricOperator.template_fields + ("hosts", "host_group")
+    ui_color = "#e0f6ff"
+
+    @apply_defaults
+    def __init__(self,
+                 hosts: Optional[Union[List[str], str]] = None,
+                 host_group: Optional[str] = None,
+                 max_concurrency: Optional[int] = 10,
+                 batch_size: Optional[int] = None,
+                 failure_threshold: Union[int, float] = 0,
+                 *args,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hosts = hosts or []
+        self.host_group = host_group
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.failure_threshold = failure_threshold
+
+    def execute(self, context: Dict) -> Dict[str, Dict[str, Any]]:
+        """
+        Executes ``self.command`` on all hosts.
+
+        :param context: Context dict provided by airflow
+        :return: a summary with the exit code and duration per host.
+                 On too many failed hosts, raises AirflowException.
+        """
+        hosts = self.get_hosts()
+
+        if not self.command:
+            raise AirflowException("SSH command not specified. Aborting.")
+
+        if self.use_sudo and self.use_sudo_shell:
+            raise AirflowException("Cannot use use_sudo and use_sudo_shell at the same time. Aborting.")
+
+        if self.get_pty:
+            raise AirflowException("Cannot use get_pty with FabricMultiHostOperator. Aborting.")
+
+        if isinstance(self.command, list):
+            raise AirflowException("Cannot use a list of commands with FabricMultiHostOperator. Aborting.")
+
+        if self.check_freshness:
+            raise AirflowException("Cannot use check_freshness with FabricMultiHostOperator. Aborting.")
+
+        self.prepare_base_hook(hosts[0])
+
+        # Create the watchers once here to validate them up front
+        self.get_watchers()
+
+        max_failures = self.get_max_failures(len(hosts))
+        batch_size = self.batch_size or len(hosts)
+        summary = {}
+        stdout = {}
+        failures = 0
+
+        self.log.info(f"Running command on {len(hosts)} hosts in batches of {batch_size}, with a maximum of "
+                      f"{self.max_concurrency} at the same time")
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, batch_size)) as executor:
+            for start in range(0, len(hosts), batch_size):
+                batch = hosts[start:start + batch_size]
+
+                for host, (host_summary, host_stdout) in zip(batch, executor.map(self.run_on_host, batch)):
+                    summary[host] = host_summary
+                    stdout[host] = self.get_xcom_value(host_stdout)
+                    if host_summary["exited"] != 0:
+                        failures += 1
+
+                if failures > max_failures:
+                    self.log.error(f"{failures} hosts failed, which exceeds the failure threshold of {max_failures}. "
+                                   f"Skipping the remaining {len(hosts) - start - len(batch)} hosts.")
+                    break
+
+        if self.xcom_push_key:
+            task_inst = context["task_instance"]
+            task_inst.xcom_push(self.xcom_push_key, stdout)
+
+        if failures > max_failures:
+            # Push the summary explicitly, since there's no return value on failure
+            context["task_instance"].xcom_push("return_value", summary)
+            raise AirflowException(f"Command failed on {failures} of {len(summary)} hosts. See log output for details.")
+
+        return summary
+
+    def get_hosts(self) -> List[str]:
+        """
+        Combines ``self.hosts`` and the hosts of ``self.host_group``, without duplicates.
+
+        :return: list of hosts
+        """
+        hosts = self.hosts.split(",") if isinstance(self.hosts, str) else list(self.hosts)
+
+        if self.host_group:
+            # A lazy hook has its connection id without being resolved
+            if isinstance(self.fabric_hook, (FabricHook, LazyFabricHook)):
+                conn_id = self.fabric_hook.ssh_conn_id
+            else:
+                conn_id = self.ssh_conn_id
+            if not conn_id:
+                raise AirflowException("host_group requires a connection id in ssh_conn_id or fabric_hook.")
+
+            host_groups = FabricHook.get_connection(conn_id).extra_dejson.get("host_groups", {})
+            if self.host_group not in host_groups:
+                raise AirflowException(f"Host group {self.host_group} not found in the extras of connection "
+                                       f"{conn_id}.")
+
+            group = host_groups[self.host_group]
+            hosts.extend(group.split(",") if isinstance(group, str) else group)
+
+        hosts = list(dict.fromkeys(host.strip() for host in hosts if host.strip()))
+        if not hosts:
+            raise AirflowException("No hosts specified in hosts or host_group. Aborting.")
+
+        return hosts
+
+    def get_max_failures(self, num_hosts: int) -> int:
+        """
+        Converts ``self.failure_threshold`` to a number of hosts.
+
+        :param num_hosts: the total number of hosts
+        :return: the number of hosts that may fail
+        """
+        if isinstance(self.failure_threshold, float) and 0 <= self.failure_threshold < 1:
+            return math.floor(self.failure_threshold * num_hosts)
+
+        return int(self.failure_threshold)
+
+    def prepare_base_hook(self, first_host: str):
+        """
+        Makes sure ``self.fabric_hook`` is set. It's used as the template for the hook of every host.
+
+        :param first_host: a host to create the hook with, in case the connection of `ssh_conn_id` has no host
+        """
+        if self.remote_host is not None:
+            self.log.info("remote_host is ignored by FabricMultiHostOperator. Use hosts or host_group instead.")
+            self.remote_host = None
+
+        # The host of every host's hook is replaced, so the first host is only needed to create the hook
+        self.fabric_hook = prepare_fabric_hook(self.fabric_hook,
+                                               ssh_conn_id=self.ssh_conn_id,
+                                               remote_host=first_host,
+                                               transport_profile=self.transport_profile,
+                                               timeout=self.connect_timeout,
+                                               inline_ssh_env=self.inline_ssh_env)
+
+    def get_host_hook(self, host: str) -> FabricHook:
+        """
+        Creates a copy of ``self.fabric_hook`` for a single host.
+
+        :param host: the remote host
+        :return: `FabricHook` object
+        """
+        hook = copy.copy(self.fabric_hook)
+        hook.remote_host = host
+        return hook
+
+    def run_on_host(self, host: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Executes the command on a single host. Exceptions are logged and included in the summary.
+
+        :param host: the remote host
+        :return: the summary and stdout for this host
+        """
+        hook = self.get_host_hook(host)
+        started = time.monotonic()
+
+        try:
+            conn = hook.get_pooled_fabric_conn() if self.use_connection_pool else hook.get_fabric_conn()
+            try:
+                res = self.run_fabric_command(conn, self.get_remote_command(conn), self.get_watchers(), hide=True)
+            except Exception:
+                self._release_host_conn(hook, conn, discard=True)
+                raise
+            self._release_host_conn(hook, conn)
+
+        except Exception as e:
+            duration = round(time.monotonic() - started, 3)
+            self.log.error(f"[{host}] Fabric operator error after {duration}s: {e}")
+            return {"exited": None, "duration": duration, "error": str(e)}, None
+
+        duration = round(time.monotonic() - started, 3)
+        self.log.info(f"[{host}] Command exited with return code {res.exited} after {duration}s:\n{res.stdout}")
+        close_result(res)
+        return {"exited": res.exited, "duration": duration}, res.stdout
+
+    def _release_host_conn(self, hook: FabricHook, conn: Connection, discard: bool = False):
+        if self.is_released_on_kill(conn):
+            return
+
+        if self.use_connection_pool:
+            hook.release_fabric_conn(conn, discard=discard)
+        else:
+            conn.close()
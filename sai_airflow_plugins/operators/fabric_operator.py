@@ -1,12 +1,44 @@
-from typing import Dict, List, Any, Optional
-
-from airflow.exceptions import AirflowException
+import asyncio
+import functools
+import posixpath
+import shlex
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Any, Optional, Tuple, Type, Union
+
+from airflow.exceptions import AirflowException, AirflowSkipException
 from airflow.models.baseoperator import BaseOperator
 from airflow.utils.decorators import apply_defaults
-from fabric import Result
+from fabric import Connection, Result
+from fabric.runners import Remote
 from invoke import Responder, StreamWatcher
+from paramiko import AuthenticationException
+
+from sai_airflow_plugins.hooks.fabric_compression import DecompressingRemote, OutputCompression
+from sai_airflow_plugins.hooks.fabric_freshness import compute_fingerprint, get_fingerprint_store
+from sai_airflow_plugins.hooks.fabric_hook import CommandResult, FabricHook, LazyFabricHook, prepare_fabric_hook
+from sai_airflow_plugins.hooks.fabric_metrics import (CONNECTION_LOOKUP, OUTPUT_HANDLING, CommandTiming, PhaseTimer,
+                                                      TimedRemote)
+from sai_airflow_plugins.hooks.fabric_output import DEFAULT_WINDOW_SIZE, CapturedResult, CapturingRemote, close_result
+from sai_airflow_plugins.hooks.fabric_process import DEFAULT_GRACE_PERIOD, RemoteProcessGroup, TrackedRemote
+from sai_airflow_plugins.hooks.fabric_script_cache import RemoteScriptCache
+from sai_airflow_plugins.hooks.fabric_watchers import CombinedWatcher, WatcherStats
+from sai_airflow_plugins.hooks.xcom_offload import offload
+
+
+@functools.lru_cache(maxsize=None)
+def get_runner_class(runner_classes: Tuple[Type[Remote], ...]) -> Type[Remote]:
+    """
+    Returns a Fabric runner class that combines the given runner classes, in that order. The combined class is created
+    once per combination, so runners of the same combination have the same class.
+
+    :param runner_classes: the runner classes to combine
+    :return: the combined runner class
+    """
+    if len(runner_classes) == 1:
+        return runner_classes[0]
 
-from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+    return type("FabricOperatorRemote", runner_classes, {})
 
 
 class FabricOperator(BaseOperator):
@@ -19,12 +51,28 @@ class FabricOperator(BaseOperator):
     some of these require the FabricHook to be configured with a password and not a private key.
 
     :param fabric_hook: predefined fabric_hook to use for remote execution. Either `fabric_hook` or `ssh_conn_id` needs
-                        to be provided.
+                        to be provided. Use a :class:`~sai_airflow_plugins.hooks.fabric_hook.LazyFabricHook` to only
+                        create the hook when the task runs, instead of every time the DAG file is parsed.
     :param ssh_conn_id: connection id from airflow Connections. `ssh_conn_id` will be ignored if `fabric_hook` is
                         provided. (templated)
     :param remote_host: remote host to connect. (templated) Nullable. If provided, it will replace the `remote_host`
                         which was defined in `fabric_hook` or predefined in the connection of `ssh_conn_id`.
-    :param command: command to execute on remote host. (templated)
+    :param command: command to execute on remote host, or a list of commands that are executed one after the other
+                    over a single SSH connection. With a list, the task fails if any of the commands exits with a
+                    non-zero code, and when using `xcom_push_key`, a list with a dict per executed command containing
+                    its exit code, duration and stdout is pushed, e.g. ``[{"exited": 0, "duration": 0.12, "stdout":
+                    "..."}]``. (templated)
+    :param stop_on_failure: when `command` is a list, don't execute the remaining commands after a command exited with
+                            a non-zero code. Those commands are left out of the XCom. If False, all commands are
+                            executed. The default is True.
+    :param xcom_include_stdout: when `command` is a list, include the stdout of every command in the XCom. Set this to
+                                False to only push the exit codes and durations. The default is True.
+    :param parallel_commands: list of commands to execute concurrently instead of `command`, each on its own channel
+                              of a single SSH connection. The task fails if any of them exits with a non-zero code.
+                              When using `xcom_push_key`, a list with a dict per command containing its exit code,
+                              stdout and duration is pushed. This mode doesn't support `get_pty`. (templated)
+    :param max_parallel_commands: the maximum number of `parallel_commands` that run at the same time. The default is
+                                  10.
     :param use_sudo: uses Fabric's sudo function instead of run. Because this function automatically adds a responder
                      for the password prompt, parameter `add_sudo_password_responder` will be ignored. It uses the
                      SSH connection's password as reply.
@@ -68,18 +116,85 @@ class FabricOperator(BaseOperator):
                     output will be included in stdout, and thus added to an XCom when using `xcom_push_key`.
     :param keepalive: The number of seconds to send keepalive packets to the server. This corresponds to the ssh option
                       ``ServerAliveInterval``. The default is 0, which disables keepalive.
+    :param use_connection_pool: get the connection from the worker-wide connection pool and hand it back after the
+                                command has finished, so subsequent tasks for the same host can reuse it. If False, a
+                                new connection is opened and closed again after the command. The default is True.
+    :param use_asyncio: drive the command channels from an asyncio event loop instead of Fabric's threaded runner.
+                        The semantics are the same, but no threads are started per command, which matters when running
+                        many `parallel_commands`. In this mode `parallel_commands` also supports `get_pty`.
+                        See :class:`~sai_airflow_plugins.hooks.fabric_async.AsyncFabricRunner`.
+    :param transport_profile: SSH transport tuning profile, e.g. ``lan-bulk``, ``wan`` or ``low-cpu``. If provided, it
+                              replaces the profile of `fabric_hook` or the ``transport_profile`` in the extras of the
+                              connection of `ssh_conn_id`. See
+                              :class:`~sai_airflow_plugins.hooks.fabric_transport_profile.TransportProfile`.
+    :param max_output_memory: keep at most this many characters of stdout and stderr in memory. Output beyond that is
+                              spilled to a temporary file, and stdout then only contains its first and last
+                              `output_window_size` characters, e.g. when it's pushed to an XCom. Watchers also only see
+                              the last `output_window_size` characters. If None (default), the full output is kept in
+                              memory. See :class:`~sai_airflow_plugins.hooks.fabric_output.OutputCapture`.
+    :param output_window_size: the number of characters at the start and the end of the output that are kept when
+                               using `max_output_memory`. The default is 64 KiB.
+    :param combine_watchers: combine all watchers, including the predefined responders, into a single watcher that
+                             scans the output once for all patterns, instead of letting every watcher scan it. The
+                             number of matches per pattern and the scan time are logged after the command. See
+                             :class:`~sai_airflow_plugins.hooks.fabric_watchers.CombinedWatcher`.
+    :param cache_script: upload `command` as a script to a content-addressed cache on the remote host and execute it
+                         by path, instead of sending the full command every time. A script that's already in the cache
+                         isn't uploaded again. With `use_sudo_shell`, the script is passed to the sudo shell as input.
+                         With `use_sudo` and a `sudo_user` other than root, that user can't read the script. See
+                         :class:`~sai_airflow_plugins.hooks.fabric_script_cache.RemoteScriptCache`.
+    :param xcom_offload_threshold: when using `xcom_push_key`, stdout longer than this many characters is compressed
+                                   and written to the blob store of
+                                   :mod:`~sai_airflow_plugins.hooks.xcom_offload`, and only a reference to it with its
+                                   size and checksum is pushed. When the output was spilled to disk because of
+                                   `max_output_memory`, the full output is offloaded. Use
+                                   :func:`~sai_airflow_plugins.hooks.xcom_offload.resolve` or
+                                   :class:`~sai_airflow_plugins.hooks.xcom_offload.LazyXCom` to get the value after
+                                   pulling the XCom. If None (default), stdout is always pushed as it is.
+    :param check_freshness: skip the work if nothing changed since the last successful run, like make does. Before
+                            running, a fingerprint of the host, the rendered command, the environment and the state of
+                            `input_files` is computed, with a single remote command to check the files. If it's the
+                            same as the fingerprint of the last successful run, the command isn't executed and no XCom
+                            is pushed. The fingerprints are kept in the store returned by
+                            :func:`~sai_airflow_plugins.hooks.fabric_freshness.get_fingerprint_store`.
+    :param input_files: remote files that the outcome of the command depends on, when using `check_freshness`.
+                        (templated)
+    :param hash_input_files: compare the content hash of `input_files` instead of their size and modification time.
+    :param skip_when_fresh: when the fingerprint is unchanged, mark the task as skipped instead of successful.
+    :param track_remote_process: keep track of the remote process group of the command, so it's terminated when the
+                                 task is killed, e.g. when it's cleared or times out. This is off by default: without
+                                 it, killing the task leaves the command running on the remote host and only
+                                 releases the connection. The command is wrapped to write
+                                 the process id of its shell to a file in ``/tmp``. On kill, SIGTERM is sent to the
+                                 process group over a new channel, and SIGKILL after `kill_grace_period`. With
+                                 `use_sudo` or `use_sudo_shell` the signals are sent with sudo. This doesn't apply to
+                                 `parallel_commands`. See
+                                 :class:`~sai_airflow_plugins.hooks.fabric_process.RemoteProcessGroup`.
+    :param kill_grace_period: the number of seconds to wait for the remote processes to exit after SIGTERM when the
+                              task is killed. The default is 10.
+    :param compress_output: compress stdout on the remote host with ``gzip`` or ``zstd``, and decompress it while it's
+                            received, to send less data over slow links. Watchers, the log and the XCom still get the
+                            plain output, and the number of received and decompressed bytes is logged. ``auto`` uses
+                            zstd if the ``zstandard`` package is installed locally and ``zstd`` on the remote host,
+                            and gzip otherwise. If the program isn't installed on the remote host, the output isn't
+                            compressed. This can't be used with `get_pty` and doesn't apply to `parallel_commands`.
+                            See :class:`~sai_airflow_plugins.hooks.fabric_compression.OutputCompression`.
     """
 
-    template_fields = ("ssh_conn_id", "command", "remote_host", "environment")
+    template_fields = ("ssh_conn_id", "command", "parallel_commands", "remote_host", "environment", "input_files")
     template_ext = (".sh",)
     ui_color = "#ebfaff"
 
     @apply_defaults
     def __init__(self,
-                 fabric_hook: Optional[FabricHook] = None,
+                 fabric_hook: Optional[Union[FabricHook, LazyFabricHook]] = None,
                  ssh_conn_id: Optional[str] = None,
                  remote_host: Optional[str] = None,
-                 command: str = None,
+                 command: Union[str, List[str]] = None,
+                 stop_on_failure: Optional[bool] = True,
+                 xcom_include_stdout: Optional[bool] = True,
+                 parallel_commands: Optional[List[str]] = None,
+                 max_parallel_commands: Optional[int] = 10,
                  use_sudo: Optional[bool] = False,
                  use_sudo_shell: Optional[bool] = False,
                  sudo_user: Optional[str] = None,
@@ -94,6 +209,21 @@ class FabricOperator(BaseOperator):
                  strip_stdout: Optional[bool] = False,
                  get_pty: Optional[bool] = False,
                  keepalive: Optional[int] = 0,
+                 use_connection_pool: Optional[bool] = True,
+                 use_asyncio: Optional[bool] = False,
+                 transport_profile: Optional[str] = None,
+                 max_output_memory: Optional[int] = None,
+                 output_window_size: Optional[int] = DEFAULT_WINDOW_SIZE,
+                 combine_watchers: Optional[bool] = False,
+                 cache_script: Optional[bool] = False,
+                 xcom_offload_threshold: Optional[int] = None,
+                 check_freshness: Optional[bool] = False,
+                 input_files: Optional[List[str]] = None,
+                 hash_input_files: Optional[bool] = False,
+                 skip_when_fresh: Optional[bool] = False,
+                 track_remote_process: Optional[bool] = False,
+                 kill_grace_period: Optional[float] = DEFAULT_GRACE_PERIOD,
+                 compress_output: Optional[str] = None,
                  *args,
                  **kwargs):
         super().__init__(*args, **kwargs)
@@ -101,6 +231,10 @@ class FabricOperator(BaseOperator):
         self.ssh_conn_id = ssh_conn_id
         self.remote_host = remote_host
         self.command = command
+        self.stop_on_failure = stop_on_failure
+        self.xcom_include_stdout = xcom_include_stdout
+        self.parallel_commands = parallel_commands
+        self.max_parallel_commands = max_parallel_commands
         self.use_sudo = use_sudo
         self.use_sudo_shell = use_sudo_shell
         self.sudo_user = sudo_user
@@ -115,6 +249,23 @@ class FabricOperator(BaseOperator):
         self.strip_stdout = strip_stdout
         self.get_pty = get_pty
         self.keepalive = keepalive
+        self.use_connection_pool = use_connection_pool
+        self.use_asyncio = use_asyncio
+        self.transport_profile = transport_profile
+        self.max_output_memory = max_output_memory
+        self.output_window_size = output_window_size
+        self.combine_watchers = combine_watchers
+        self.cache_script = cache_script
+        self.xcom_offload_threshold = xcom_offload_threshold
+        self.check_freshness = check_freshness
+        self.input_files = input_files or []
+        self.hash_input_files = hash_input_files
+        self.skip_when_fresh = skip_when_fresh
+        self.track_remote_process = track_remote_process
+        self.kill_grace_period = kill_grace_period
+        self.compress_output = compress_output
+        self._remote_processes: Dict[RemoteProcessGroup, Connection] = {}
+        self._released_on_kill: Dict[int, Connection] = {}
 
     def execute(self, context: Dict):
         """
@@ -124,139 +275,705 @@ class FabricOperator(BaseOperator):
         :return: True if the command executed correctly.
                  On an error, raises AirflowException.
         """
-        result = self.execute_fabric_command()
+        if not self.check_freshness:
+            return self.execute_command(context)
 
-        if result.exited == 0:
-            # Push the output to an XCom if requested
-            if self.xcom_push_key and result.stdout:
-                task_inst = context["task_instance"]
-                task_inst.xcom_push(self.xcom_push_key, result.stdout)
+        store = get_fingerprint_store()
+        key = self.get_fingerprint_key(context)
+        fingerprint = self.get_fingerprint()
 
+        if store.get(key) == fingerprint:
+            message = f"Fingerprint {fingerprint} is unchanged since the last successful run. Nothing to do."
+            if self.skip_when_fresh:
+                raise AirflowSkipException(message)
+
+            self.log.info(message)
             return True
-        else:
-            raise AirflowException(f"Command exited with return code {result.exited}. See log output for details.")
 
-    def execute_fabric_command(self) -> Result:
+        result = self.execute_command(context)
+        store.set(key, fingerprint)
+        return result
+
+    def execute_command(self, context: Dict):
         """
-        Executes ``self.command`` over the configured SSH connection.
+        Executes ``self.command`` or ``self.parallel_commands``, depending on which one is provided.
 
-        :return: The `Result` object from Fabric's `run` method
+        :param context: Context dict provided by airflow
+        :return: True if the command executed correctly.
+                 On an error, raises AirflowException.
         """
+        if self.parallel_commands:
+            return self.execute_parallel(context)
+
+        if isinstance(self.command, list):
+            return self.execute_sequential(context)
+
+        result = self.execute_fabric_command()
         try:
-            if self.fabric_hook and isinstance(self.fabric_hook, FabricHook):
-                if self.ssh_conn_id:
-                    self.log.info("ssh_conn_id is ignored when fabric_hook is provided.")
-
-                if self.remote_host is not None:
-                    self.log.info("remote_host is provided explicitly. It will replace the remote_host which was "
-                                  "defined in fabric_hook.")
-                    self.fabric_hook.remote_host = self.remote_host
-
-            elif self.ssh_conn_id:
-                self.log.info("fabric_hook is not provided or invalid. Trying ssh_conn_id to create FabricHook.")
-                if self.remote_host is None:
-                    self.fabric_hook = FabricHook(ssh_conn_id=self.ssh_conn_id,
-                                                  timeout=self.connect_timeout,
-                                                  inline_ssh_env=self.inline_ssh_env)
-                else:
-                    # Prevent empty `SSHHook.remote_host` field which would otherwise raise an exception
-                    self.log.info("remote_host is provided explicitly. It will replace the remote_host which was "
-                                  "predefined in the connection specified by ssh_conn_id.")
-                    self.fabric_hook = FabricHook(ssh_conn_id=self.ssh_conn_id,
-                                                  remote_host=self.remote_host,
-                                                  timeout=self.connect_timeout,
-                                                  inline_ssh_env=self.inline_ssh_env)
+            if result.exited == 0:
+                # Push the output to an XCom if requested
+                if self.xcom_push_key and result.stdout:
+                    task_inst = context["task_instance"]
+                    task_inst.xcom_push(self.xcom_push_key, self.get_xcom_value(result.stdout, result))
 
+                return True
             else:
-                raise AirflowException("Cannot operate without fabric_hook or ssh_conn_id.")
+                raise AirflowException(f"Command exited with return code {result.exited}. See log output for details.")
+        finally:
+            # The output has been used, so a spill file of a captured result can be removed
+            close_result(result)
 
-            if not self.command:
-                raise AirflowException("SSH command not specified. Aborting.")
+    def execute_parallel(self, context: Dict) -> bool:
+        """
+        Executes ``self.parallel_commands`` concurrently over the configured SSH connection.
+
+        :param context: Context dict provided by airflow
+        :return: True if all commands executed correctly.
+                 On an error, raises AirflowException.
+        """
+        results = self.execute_parallel_fabric_commands()
+
+        for res in results:
+            self.log.info(f"Command exited with return code {res.exited} after {res.duration:.3f}s: {res.command}\n"
+                          f"{res.stdout}")
+
+        if self.xcom_push_key:
+            task_inst = context["task_instance"]
+            task_inst.xcom_push(self.xcom_push_key, [dict(res._asdict(), stdout=self.get_xcom_value(res.stdout))
+                                                     for res in results])
+
+        failed = [res for res in results if res.exited != 0]
+        if failed:
+            raise AirflowException(f"{len(failed)} of {len(results)} commands exited with a non-zero return code. "
+                                   f"See log output for details.")
+
+        return True
+
+    def execute_sequential(self, context: Dict) -> bool:
+        """
+        Executes the list of commands in ``self.command`` one after the other over the configured SSH connection.
+
+        :param context: Context dict provided by airflow
+        :return: True if all commands executed correctly.
+                 On an error, raises AirflowException.
+        """
+        results = self.execute_sequential_fabric_commands()
+
+        if self.xcom_push_key:
+            summary = []
+            for res in results:
+                item = {"exited": res.exited, "duration": round(res.duration, 3)}
+                if self.xcom_include_stdout:
+                    item["stdout"] = self.get_xcom_value(res.stdout)
+                summary.append(item)
+
+            task_inst = context["task_instance"]
+            task_inst.xcom_push(self.xcom_push_key, summary)
+
+        failed = [res for res in results if res.exited != 0]
+        if failed:
+            skipped = len(self.command) - len(results)
+            raise AirflowException(f"{len(failed)} of {len(self.command)} commands exited with a non-zero return code "
+                                   f"and {skipped} were skipped. See log output for details.")
+
+        return True
+
+    def on_kill(self):
+        """
+        Terminates the remote commands that are still running, if ``self.track_remote_process`` is True, and
+        discards their connections. The execution that's interrupted doesn't release these connections again.
+        """
+        for process, conn in list(self._remote_processes.items()):
+            self.log.info(f"Terminating remote process group of {process.pid_file} on {conn.host}")
+            try:
+                res = process.terminate(conn,
+                                        grace_period=self.kill_grace_period,
+                                        sudo=self.use_sudo or self.use_sudo_shell,
+                                        password=self.fabric_hook.password)
+                self.log.info(f"Remote process group {res.stdout.strip() or 'was no longer running'}")
+            except Exception as e:
+                self.log.warning(f"Could not terminate the remote process group: {e}")
+            finally:
+                self._remote_processes.pop(process, None)
+                self.release_conn_on_kill(conn)
+
+    def release_conn_on_kill(self, conn: Connection):
+        """
+        Discards a connection when the task is killed, and remembers it so the execution that's interrupted doesn't
+        release it a second time.
+
+        :param conn: the `Connection` object to discard
+        """
+        self.release_fabric_conn(conn, discard=True)
+        self._released_on_kill[id(conn)] = conn
+
+    def is_released_on_kill(self, conn: Connection) -> bool:
+        """
+        Checks whether a connection was already released by `on_kill`, and forgets it.
+
+        :param conn: the `Connection` object to check
+        :return: True if it was released by `on_kill`
+        """
+        return self._released_on_kill.pop(id(conn), None) is not None
+
+    def get_fingerprint_key(self, context: Dict) -> str:
+        """
+        Returns the key of the fingerprint of this task in the fingerprint store. Every instance of a mapped task has
+        its own fingerprint, since it has its own command or input files.
+
+        :param context: Context dict provided by airflow
+        :return: the key
+        """
+        task_instance = context.get("ti") or context.get("task_instance")
+        map_index = getattr(task_instance, "map_index", -1)
+        if isinstance(map_index, int) and map_index >= 0:
+            return f"{self.dag_id}/{self.task_id}/{map_index}"
+
+        return f"{self.dag_id}/{self.task_id}"
+
+    def get_fingerprint(self) -> str:
+        """
+        Computes the fingerprint of the work of this task with
+        :func:`~sai_airflow_plugins.hooks.fabric_freshness.compute_fingerprint`.
+
+        :return: the fingerprint
+        """
+        self.prepare_fabric_hook()
+        commands = self.parallel_commands or self.command
+        if isinstance(commands, list):
+            commands = [self.get_command(command) for command in commands]
+        else:
+            commands = self.get_command(commands)
+
+        conn = self.acquire_fabric_conn()
+        try:
+            fingerprint = compute_fingerprint(conn, commands, self.environment, self.input_files,
+                                              hash_files=self.hash_input_files,
+                                              sudo=[self.use_sudo, self.sudo_user])
+        except Exception:
+            self.release_fabric_conn(conn, discard=True)
+            raise
+
+        self.release_fabric_conn(conn)
+        self.log.info(f"Fingerprint of the command, environment and {len(self.input_files)} input files: "
+                      f"{fingerprint}")
+        return fingerprint
+
+    def get_xcom_value(self, stdout: Optional[str], result: Optional[Result] = None) -> Any:
+        """
+        Returns the value to push to an XCom for the stdout of a command: stdout itself, or a reference to it in the
+        blob store if it's longer than ``self.xcom_offload_threshold``.
+
+        :param stdout: the stdout of the command
+        :param result: the `Result` of the command. If its output was spilled to disk, the full output is offloaded.
+        :return: the XCom value
+        """
+        if self.xcom_offload_threshold is None or stdout is None:
+            return stdout
+
+        if isinstance(result, CapturedResult) and result.stdout_capture.spilled:
+            value, size = result.stdout_capture.chunks(), result.stdout_capture.size
+        else:
+            value, size = stdout, len(stdout)
+
+        if size <= self.xcom_offload_threshold:
+            return stdout
+
+        reference = offload(value, key_prefix=f"{self.dag_id}/{self.task_id}")
+        self.log.info(f"Offloaded stdout of {reference['size']} bytes to {reference['uri']} "
+                      f"({reference['stored_size']} bytes compressed)")
+        return reference
+
+    def execute_parallel_fabric_commands(self) -> List[CommandResult]:
+        """
+        Executes ``self.parallel_commands`` concurrently over a single SSH connection, using `FabricHook.run_many`.
+
+        :return: a `CommandResult` for every command, in the same order as ``self.parallel_commands``
+        """
+        timer = PhaseTimer()
+        try:
+            with timer.phase(CONNECTION_LOOKUP):
+                self.prepare_fabric_hook()
+            timer.tags.update(self.get_metric_tags())
+
+            if self.command:
+                self.log.info("command is ignored when parallel_commands is provided.")
 
             if self.use_sudo and self.use_sudo_shell:
                 raise AirflowException("Cannot use use_sudo and use_sudo_shell at the same time. Aborting.")
 
-            conn = self.fabric_hook.get_fabric_conn()
-
-            # Create watcher objects, using the provided dictionary to instantiate the class and supply its kwargs
-            watchers = []
-            for watcher_dict in self.watchers:
-                try:
-                    watcher_class = watcher_dict.pop("class")
-                except KeyError:
-                    self.log.info(f"Watcher class missing. Defaulting to {Responder}.")
-                    watcher_class = Responder
-
-                if not issubclass(watcher_class, StreamWatcher):
-                    raise AirflowException(
-                        f"The class attribute of a watcher dict must contain a subclass of {StreamWatcher}."
-                    )
-
-                watcher = watcher_class(**watcher_dict)
-                watchers.append(watcher)
-
-            # Add predefined watchers
-            if self.add_sudo_password_responder:
-                watchers.append(self.fabric_hook.get_sudo_pass_responder())
-
-            if self.add_generic_password_responder:
-                watchers.append(self.fabric_hook.get_generic_pass_responder())
-
-            if self.add_unknown_host_key_responder:
-                watchers.append(self.fabric_hook.get_unknown_host_key_responder())
-
-            # Wrap command in sudo shell if requested
-            if self.use_sudo_shell:
-                sudo_params = f"-su {self.sudo_user}" if self.sudo_user else "-s"
-                command = f"sudo {sudo_params} -- <<'__end_of_sudo_shell__'\n" \
-                          f"{self.command}\n" \
-                          f"__end_of_sudo_shell__"
-            else:
-                command = self.command
+            if self.get_pty and not self.use_asyncio:
+                raise AirflowException("Cannot use get_pty with parallel_commands without use_asyncio. Aborting.")
+
+            # Watchers are created for every command; create them once here to validate them up front
+            self.get_watchers()
+            commands = [self.get_command(command) for command in self.parallel_commands]
 
+            self.log.info(f"Running {len(commands)} commands with a maximum of {self.max_parallel_commands} "
+                          f"at the same time")
+
+            run_kwargs = dict(env=self.environment)
             if self.use_sudo:
+                run_kwargs["password"] = self.fabric_hook.password
                 if self.sudo_user:
-                    self.log.info(f"Running sudo command as '{self.sudo_user}': {command}")
+                    run_kwargs["user"] = self.sudo_user
+
+            with timer.phase(CONNECTION_LOOKUP):
+                conn = self.acquire_fabric_conn()
+            try:
+                with timer.connect(conn):
+                    conn.open()
+                conn.transport.set_keepalive(self.keepalive)
+                if self.use_asyncio:
+                    results = asyncio.run(self.fabric_hook.run_many_async(commands,
+                                                                          max_concurrency=self.max_parallel_commands,
+                                                                          conn=conn,
+                                                                          sudo=self.use_sudo,
+                                                                          watchers_factory=self.get_watchers,
+                                                                          pty=self.get_pty,
+                                                                          hide=True,
+                                                                          timer=timer,
+                                                                          **run_kwargs))
                 else:
-                    self.log.info(f"Running sudo command: {command}")
+                    results = self.fabric_hook.run_many(commands,
+                                                        max_concurrency=self.max_parallel_commands,
+                                                        conn=conn,
+                                                        use_sudo=self.use_sudo,
+                                                        watchers_factory=self.get_watchers,
+                                                        timer=timer,
+                                                        **run_kwargs)
+            except Exception:
+                self.release_fabric_conn(conn, discard=True)
+                raise
+
+            self.release_fabric_conn(conn)
+
+            if self.strip_stdout:
+                with timer.phase(OUTPUT_HANDLING):
+                    results = [res._replace(stdout=res.stdout.strip()) for res in results]
+
+            return results
+
+        except Exception as e:
+            if isinstance(e, AuthenticationException):
+                self.fabric_hook.invalidate_cached_connection(self.fabric_hook.ssh_conn_id)
+            raise AirflowException(f"Fabric operator error: {e}")
+
+        finally:
+            timer.emit()
+
+    def execute_sequential_fabric_commands(self) -> List[CommandResult]:
+        """
+        Executes the list of commands in ``self.command`` one after the other over a single SSH connection. If
+        ``self.stop_on_failure`` is True, the remaining commands are skipped after a command exited with a non-zero
+        code.
+
+        :return: a `CommandResult` for every executed command, in the same order as ``self.command``
+        """
+        timer = PhaseTimer()
+        try:
+            with timer.phase(CONNECTION_LOOKUP):
+                self.prepare_fabric_hook()
+            timer.tags.update(self.get_metric_tags())
+
+            if not self.command:
+                raise AirflowException("SSH command not specified. Aborting.")
+
+            if self.use_sudo and self.use_sudo_shell:
+                raise AirflowException("Cannot use use_sudo and use_sudo_shell at the same time. Aborting.")
+
+            if self.compress_output and self.get_pty:
+                raise AirflowException("Cannot use compress_output with get_pty. Aborting.")
+
+            # Create the watchers once here to validate them up front
+            self.get_watchers()
+            results = []
+
+            with timer.phase(CONNECTION_LOOKUP):
+                conn = self.acquire_fabric_conn()
+            try:
+                for i, command in enumerate(self.command, 1):
+                    self.log.info(f"Running command {i} of {len(self.command)}")
+                    started = time.monotonic()
+                    res = self.run_fabric_command(conn, self.get_remote_command(conn, command), self.get_watchers(),
+                                                  timer=timer)
+                    duration = time.monotonic() - started
+                    results.append(CommandResult(command, res.exited, res.stdout, res.stderr, duration))
+                    close_result(res)
+                    self.log.info(f"Command {i} exited with return code {res.exited} after {duration:.3f}s")
+
+                    if res.exited != 0 and self.stop_on_failure and i < len(self.command):
+                        self.log.info(f"Skipping the remaining {len(self.command) - i} commands")
+                        break
+            except Exception:
+                self.release_fabric_conn(conn, discard=True)
+                raise
+
+            self.release_fabric_conn(conn)
+            return results
+
+        except Exception as e:
+            if isinstance(e, AuthenticationException):
+                self.fabric_hook.invalidate_cached_connection(self.fabric_hook.ssh_conn_id)
+            raise AirflowException(f"Fabric operator error: {e}")
+
+        finally:
+            timer.emit()
+
+    def execute_fabric_command(self, command: Optional[str] = None) -> Result:
+        """
+        Executes ``self.command`` over the configured SSH connection.
+
+        :param command: the command to execute instead of ``self.command``, e.g. a command derived from it
+        :return: The `Result` object from Fabric's `run` method
+        """
+        timer = PhaseTimer()
+        try:
+            with timer.phase(CONNECTION_LOOKUP):
+                self.prepare_fabric_hook()
+            timer.tags.update(self.get_metric_tags())
+
+            if not self.command:
+                raise AirflowException("SSH command not specified. Aborting.")
+
+            if self.use_sudo and self.use_sudo_shell:
+                raise AirflowException("Cannot use use_sudo and use_sudo_shell at the same time. Aborting.")
+
+            if self.compress_output and self.get_pty:
+                raise AirflowException("Cannot use compress_output with get_pty. Aborting.")
+
+            watchers = self.get_watchers()
+
+            with timer.phase(CONNECTION_LOOKUP):
+                conn = self.acquire_fabric_conn()
+            try:
+                res = self.run_fabric_command(conn, self.get_remote_command(conn, command), watchers, timer=timer)
+            except Exception:
+                self.release_fabric_conn(conn, discard=True)
+                raise
+
+            self.release_fabric_conn(conn)
+            return res
+
+        except Exception as e:
+            if isinstance(e, AuthenticationException):
+                self.fabric_hook.invalidate_cached_connection(self.fabric_hook.ssh_conn_id)
+            raise AirflowException(f"Fabric operator error: {e}")
+
+        finally:
+            timer.emit()
+
+    def get_metric_tags(self) -> Dict[str, str]:
+        """
+        Returns the tags of the phase timers of this task: the remote host and the connection id, if any.
+
+        :return: dict of tags
+        """
+        tags = {"host": self.fabric_hook.remote_host, "conn_id": self.fabric_hook.ssh_conn_id}
+        return {k: str(v) for k, v in tags.items() if v is not None}
+
+    def prepare_fabric_hook(self):
+        """
+        Makes sure ``self.fabric_hook`` is set, either by using the provided hook or by creating one from
+        ``self.ssh_conn_id``, and applies ``self.remote_host`` to it if provided. A `LazyFabricHook` is resolved.
+        """
+        self.fabric_hook = prepare_fabric_hook(self.fabric_hook,
+                                               ssh_conn_id=self.ssh_conn_id,
+                                               remote_host=self.remote_host,
+                                               transport_profile=self.transport_profile,
+                                               log=self.log,
+                                               timeout=self.connect_timeout,
+                                               inline_ssh_env=self.inline_ssh_env)
+
+    def get_watchers(self, stats: Optional[WatcherStats] = None) -> List[StreamWatcher]:
+        """
+        Creates the watcher objects from ``self.watchers`` and adds the requested predefined watchers. If
+        ``self.combine_watchers`` is True, they're combined into a single `CombinedWatcher`.
+
+        :param stats: the `WatcherStats` for the combined watcher. If None, a new one is created.
+        :return: list of `StreamWatcher` objects
+        """
+        # Create watcher objects, using the provided dictionary to instantiate the class and supply its kwargs
+        watchers = []
+        for watcher_dict in self.watchers:
+            # Copy the dict, so the watchers can be created again, e.g. on the next poke of a sensor
+            watcher_dict = dict(watcher_dict)
+            try:
+                watcher_class = watcher_dict.pop("class")
+            except KeyError:
+                self.log.info(f"Watcher class missing. Defaulting to {Responder}.")
+                watcher_class = Responder
+
+            if not issubclass(watcher_class, StreamWatcher):
+                raise AirflowException(
+                    f"The class attribute of a watcher dict must contain a subclass of {StreamWatcher}."
+                )
+
+            watcher = watcher_class(**watcher_dict)
+            watchers.append(watcher)
+
+        # Add predefined watchers
+        if self.add_sudo_password_responder:
+            watchers.append(self.fabric_hook.get_sudo_pass_responder())
+
+        if self.add_generic_password_responder:
+            watchers.append(self.fabric_hook.get_generic_pass_responder())
+
+        if self.add_unknown_host_key_responder:
+            watchers.append(self.fabric_hook.get_unknown_host_key_responder())
+
+        if self.combine_watchers:
+            return [CombinedWatcher(watchers, stats=stats or WatcherStats())]
+
+        return watchers
+
+    def get_command(self, command: Optional[str] = None, script_path: Optional[str] = None) -> str:
+        """
+        Returns the command, wrapped in a sudo shell if requested.
+
+        :param command: the command to wrap. If None, ``self.command`` is used.
+        :param script_path: the remote path of a script to execute instead of the command
+        :return: the command to execute
+        """
+        command = self.command if command is None else command
+
+        if script_path is not None:
+            script_path = shlex.quote(script_path if posixpath.isabs(script_path) else f"./{script_path}")
+
+        if self.use_sudo_shell:
+            sudo_params = f"-su {self.sudo_user}" if self.sudo_user else "-s"
+            if script_path is not None:
+                return f"sudo {sudo_params} -- < {script_path}"
+
+            return f"sudo {sudo_params} -- <<'__end_of_sudo_shell__'\n" \
+                   f"{command}\n" \
+                   f"__end_of_sudo_shell__"
+
+        return command if script_path is None else script_path
+
+    def get_remote_command(self, conn: Connection, command: Optional[str] = None) -> str:
+        """
+        Returns the command to execute on a connection. If ``self.cache_script`` is True, the command is uploaded to
+        the remote script cache if necessary, and the returned command executes it by path.
+
+        :param conn: the `Connection` object to use
+        :param command: the command to execute. If None, ``self.command`` is used.
+        :return: the command to execute
+        """
+        command = self.command if command is None else command
+
+        if not self.cache_script:
+            return self.get_command(command)
+
+        return self.get_command(script_path=RemoteScriptCache(conn).upload(command))
+
+    def acquire_fabric_conn(self) -> Connection:
+        """
+        Gets a connection from the connection pool, or creates a new one if ``self.use_connection_pool`` is False.
+
+        :return: `Connection` object
+        """
+        if self.use_connection_pool:
+            return self.fabric_hook.get_pooled_fabric_conn()
+
+        return self.fabric_hook.get_fabric_conn()
+
+    def release_fabric_conn(self, conn: Connection, discard: bool = False):
+        """
+        Hands a connection back to the connection pool, or closes it if ``self.use_connection_pool`` is False.
+
+        :param conn: the `Connection` object obtained with `acquire_fabric_conn`
+        :param discard: close the connection instead of keeping it open for reuse
+        """
+        if self.is_released_on_kill(conn):
+            return
+
+        if self.use_connection_pool:
+            self.fabric_hook.release_fabric_conn(conn, discard=discard)
+        else:
+            conn.close()
+
+    def run_fabric_command(self,
+                           conn: Connection,
+                           command: str,
+                           watchers: List[StreamWatcher],
+                           hide: bool = False,
+                           timer: Optional[PhaseTimer] = None) -> Result:
+        """
+        Opens the connection if needed and runs a command on it with the runtime options of this operator.
+
+        :param conn: the `Connection` object to use
+        :param command: the command to execute
+        :param watchers: the watchers to add to Fabric's run function. When ``self.use_asyncio`` is True, the
+                         watchers are created with `get_watchers` for stdout and stderr separately instead.
+        :param hide: capture the command output without echoing it, e.g. when running commands concurrently
+        :param timer: the `PhaseTimer` to record the time spent opening the connection and the channels, running the
+                      command and handling its output in
+        :return: The `Result` object from Fabric's `run` method
+        """
+        if self.use_sudo:
+            if self.sudo_user:
+                self.log.info(f"Running sudo command as '{self.sudo_user}': {command}")
             else:
-                self.log.info(f"Running command: {command}")
+                self.log.info(f"Running sudo command: {command}")
+        else:
+            self.log.info(f"Running command: {command}")
 
-            if self.environment:
-                formatted_env_msg = "\n".join(f"{k}={v}" for k, v in self.environment.items())
-                self.log.info(f"With environment variables:\n{formatted_env_msg}")
+        if self.environment:
+            formatted_env_msg = "\n".join(f"{k}={v}" for k, v in self.environment.items())
+            self.log.info(f"With environment variables:\n{formatted_env_msg}")
 
-            # Open connection and set transport-specific options
+        # Open connection and set transport-specific options
+        with timer.connect(conn) if timer else nullcontext():
             conn.open()
-            conn.transport.set_keepalive(self.keepalive)
-
-            # Set up runtime options and run the command
-            run_kwargs = dict(
-                command=command,
-                pty=self.get_pty,
-                env=self.environment,
-                watchers=watchers,
-                warn=True  # don't directly raise an UnexpectedExit when the exit code is non-zero
-            )
+        conn.transport.set_keepalive(self.keepalive)
+
+        # With asyncio, watchers are created for stdout and stderr separately, so they're given the same stats
+        stats = next((watcher.stats for watcher in watchers if isinstance(watcher, CombinedWatcher)), None)
+        watchers_factory = self.get_watchers
+        if self.use_asyncio and self.combine_watchers:
+            stats = WatcherStats()
+            watchers_factory = functools.partial(self.get_watchers, stats=stats)
+
+        # Set up runtime options and run the command
+        run_kwargs = dict(
+            command=command,
+            pty=self.get_pty,
+            env=self.environment,
+            watchers=watchers,
+            warn=True  # don't directly raise an UnexpectedExit when the exit code is non-zero
+        )
+
+        if hide:
+            run_kwargs["hide"] = True
+
+        compression = OutputCompression(self.compress_output) if self.compress_output else None
+        process = RemoteProcessGroup() if self.track_remote_process else None
+        if process is not None:
+            self._remote_processes[process] = conn
 
+        try:
+            with timer.command() if timer else nullcontext() as timing:
+                res = self._run_command(conn, command, run_kwargs, watchers_factory, hide, process, compression,
+                                        timing)
+        finally:
+            self._remote_processes.pop(process, None)
+
+        with timer.phase(OUTPUT_HANDLING) if timer else nullcontext():
+            return self._handle_output(conn, res, stats, compression)
+
+    def _handle_output(self,
+                       conn: Connection,
+                       res: Result,
+                       stats: Optional[WatcherStats],
+                       compression: Optional[OutputCompression] = None) -> Result:
+        """
+        Logs the watcher statistics, output compression and output capture of a command, and strips its stdout as
+        requested.
+        """
+        if stats is not None:
+            self.log.info(f"Watchers {stats}")
+
+        if compression is not None:
+            self.log.info(f"Received {compression.compressed_size} bytes of {compression.format} compressed stdout "
+                          f"for {compression.size} bytes of output (ratio {compression.ratio:.1f})")
+
+        if isinstance(res, CapturedResult) and res.spilled:
+            self.log.info(f"The command output exceeded {self.max_output_memory} characters and was spilled to a "
+                          f"temporary file. Only the first and last {self.output_window_size} characters of stdout "
+                          f"({res.stdout_capture.size} characters in total) are kept.")
+
+        if res.stdout:
+            # Strip sudo prompt from stdout when using sudo and a pty
+            if self.use_sudo and self.get_pty:
+                res.stdout = res.stdout.replace(conn.config.sudo.prompt, "")
+
+            # Strip stdout if requested
+            if self.strip_stdout:
+                res.stdout = res.stdout.strip()
+
+        return res
+
+    def create_runner(self,
+                      conn: Connection,
+                      process: Optional[RemoteProcessGroup] = None,
+                      compression: Optional[OutputCompression] = None,
+                      timing: Optional[CommandTiming] = None) -> Remote:
+        """
+        Creates the Fabric runner for a command that needs a bounded output capture, process tracking or output
+        compression. The runner combines the runner classes of these features.
+
+        :param conn: the `Connection` object to use
+        :param process: the `RemoteProcessGroup` to track the command with
+        :param compression: the `OutputCompression` of the command's stdout
+        :param timing: the `CommandTiming` to mark the opened channel and the first output of the command in
+        :return: the runner
+        """
+        kwargs = dict(context=conn, inline_env=conn.inline_ssh_env)
+        runner_classes = []
+
+        # The command is compressed before it's tracked, so the tracked shell is the one that runs the whole pipeline
+        if compression is not None:
+            runner_classes.append(DecompressingRemote)
+            kwargs["compression"] = compression
+
+        if process is not None:
+            runner_classes.append(TrackedRemote)
+            kwargs["process"] = process
+
+        if self.max_output_memory is not None:
+            runner_classes.append(CapturingRemote)
+            kwargs.update(max_memory=self.max_output_memory, window_size=self.output_window_size)
+
+        # Last, so it sees the output as it's received, before it's decompressed or captured
+        if timing is not None:
+            runner_classes.append(TimedRemote)
+            kwargs["timing"] = timing
+
+        return get_runner_class(tuple(runner_classes))(**kwargs)
+
+    def _run_command(self,
+                     conn: Connection,
+                     command: str,
+                     run_kwargs: Dict[str, Any],
+                     watchers_factory: Callable[[], List[StreamWatcher]],
+                     hide: bool,
+                     process: Optional[RemoteProcessGroup],
+                     compression: Optional[OutputCompression] = None,
+                     timing: Optional[CommandTiming] = None) -> Result:
+        """
+        Runs a command with Fabric's run or sudo function, or with the asyncio runner if ``self.use_asyncio`` is True.
+        When the command has its own runner, it marks the opened channel and the first output in `timing`.
+        """
+        if self.use_asyncio:
+            res = asyncio.run(self.fabric_hook.run_async(command,
+                                                         conn=conn,
+                                                         pty=self.get_pty,
+                                                         env=self.environment,
+                                                         watchers_factory=watchers_factory,
+                                                         hide=hide,
+                                                         sudo=self.use_sudo,
+                                                         password=self.fabric_hook.password,
+                                                         user=self.sudo_user,
+                                                         max_output_memory=self.max_output_memory,
+                                                         output_window_size=self.output_window_size,
+                                                         process=process,
+                                                         compression=compression,
+                                                         timing=timing))
+        else:
             if self.use_sudo:
                 run_kwargs["password"] = self.fabric_hook.password
                 if self.sudo_user:
                     run_kwargs["user"] = self.sudo_user
+
+            if self.max_output_memory is not None or process is not None or compression is not None:
+                # Fabric's run and sudo functions always use the runner from the connection's config, which would
+                # change it for every task that uses this connection, so the runner is passed explicitly instead
+                runner = self.create_runner(conn, process, compression, timing)
+                res = conn._sudo(runner, **run_kwargs) if self.use_sudo else conn._run(runner, **run_kwargs)
+            elif self.use_sudo:
                 res = conn.sudo(**run_kwargs)
             else:
                 res = conn.run(**run_kwargs)
 
-            if res.stdout:
-                # Strip sudo prompt from stdout when using sudo and a pty
-                if self.use_sudo and self.get_pty:
-                    res.stdout = res.stdout.replace(conn.config.sudo.prompt, "")
-
-                # Strip stdout if requested
-                if self.strip_stdout:
-                    res.stdout = res.stdout.strip()
-
-            return res
-
-        except Exception as e:
-            raise AirflowException(f"Fabric operator error: {e}")
+        return res
@@ -0,0 +1,112 @@
+from typing import Any, Dict, Optional, Union
+
+from airflow.exceptions import AirflowException
+from airflow.models.baseoperator import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook, LazyFabricHook, prepare_fabric_hook
+from sai_airflow_plugins.hooks.fabric_sync import DEFAULT_BLOCK_SIZE, DEFAULT_DELTA_THRESHOLD
+
+
+class FabricSyncOperator(BaseOperator):
+    """
+    Operator to synchronize a local directory to a remote directory over SFTP using `FabricHook`. Only the files that
+    changed are sent, based on their size, modification time and SHA-256 hash. Of large files that already exist
+    remotely, only the changed blocks are sent. The remote manifest is cached between runs, so unchanged remote
+    files aren't hashed again.
+
+    The operator returns a dict with the uploaded, patched and deleted files, the number of unchanged files, the
+    number of bytes sent and the duration, which is pushed to the ``return_value`` XCom.
+
+    :param fabric_hook: predefined fabric_hook to use for the sync. Either `fabric_hook` or `ssh_conn_id` needs
+                        to be provided. A :class:`~sai_airflow_plugins.hooks.fabric_hook.LazyFabricHook` is resolved
+                        when the task runs.
+    :param ssh_conn_id: connection id from airflow Connections. `ssh_conn_id` will be ignored if `fabric_hook` is
+                        provided. (templated)
+    :param remote_host: remote host to connect. (templated) Nullable. If provided, it will replace the `remote_host`
+                        which was defined in `fabric_hook` or predefined in the connection of `ssh_conn_id`.
+    :param local_dir: the local source directory. (templated)
+    :param remote_dir: the remote destination directory. It's created if it doesn't exist. (templated)
+    :param delete: delete remote files that don't exist in the local directory. The default is False.
+    :param checksum: compare the hashes of all files, instead of skipping files with the same size and modification
+                     time. The default is False.
+    :param block_size: the size of the blocks that are compared for large files. The default is 1 MiB.
+    :param delta_threshold: the minimum file size for sending only changed blocks. The default is 64 MiB.
+    :param connect_timeout: Connection timeout, in seconds. The default is 10.
+    :param transport_profile: SSH transport tuning profile, e.g. ``lan-bulk``, ``wan`` or ``low-cpu``. If provided, it
+                              replaces the profile of `fabric_hook` or the ``transport_profile`` in the extras of the
+                              connection of `ssh_conn_id`. See
+                              :class:`~sai_airflow_plugins.hooks.fabric_transport_profile.TransportProfile`.
+    """
+
+    template_fields = ("ssh_conn_id", "remote_host", "local_dir", "remote_dir")
+    ui_color = "#ebfff5"
+
+    @apply_defaults
+    def __init__(self,
+                 fabric_hook: Optional[Union[FabricHook, LazyFabricHook]] = None,
+                 ssh_conn_id: Optional[str] = None,
+                 remote_host: Optional[str] = None,
+                 local_dir: str = None,
+                 remote_dir: str = None,
+                 delete: Optional[bool] = False,
+                 checksum: Optional[bool] = False,
+                 block_size: Optional[int] = DEFAULT_BLOCK_SIZE,
+                 delta_threshold: Optional[int] = DEFAULT_DELTA_THRESHOLD,
+                 connect_timeout: Optional[int] = 10,
+                 transport_profile: Optional[str] = None,
+                 *args,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fabric_hook = fabric_hook
+        self.ssh_conn_id = ssh_conn_id
+        self.remote_host = remote_host
+        self.local_dir = local_dir
+        self.remote_dir = remote_dir
+        self.delete = delete
+        self.checksum = checksum
+        self.block_size = block_size
+        self.delta_threshold = delta_threshold
+        self.connect_timeout = connect_timeout
+        self.transport_profile = transport_profile
+
+    def execute(self, context: Dict) -> Dict[str, Any]:
+        """
+        Synchronizes the directory over the configured SSH connection.
+
+        :param context: Context dict provided by airflow
+        :return: a dict with the details of the sync.
+                 On an error, raises AirflowException.
+        """
+        if not self.local_dir or not self.remote_dir:
+            raise AirflowException("Both local_dir and remote_dir must be specified. Aborting.")
+
+        hook = self.get_fabric_hook()
+
+        try:
+            result = hook.sync_dir(self.local_dir,
+                                   self.remote_dir,
+                                   delete=self.delete,
+                                   checksum=self.checksum,
+                                   block_size=self.block_size,
+                                   delta_threshold=self.delta_threshold)
+        except AirflowException:
+            raise
+        except Exception as e:
+            raise AirflowException(f"Fabric sync operator error: {e}")
+
+        return result._asdict()
+
+    def get_fabric_hook(self) -> FabricHook:
+        """
+        Returns the provided hook, or creates one from ``self.ssh_conn_id``, with ``self.remote_host`` applied. A
+        `LazyFabricHook` is resolved.
+
+        :return: `FabricHook` object
+        """
+        self.fabric_hook = prepare_fabric_hook(self.fabric_hook,
+                                               ssh_conn_id=self.ssh_conn_id,
+                                               remote_host=self.remote_host,
+                                               transport_profile=self.transport_profile,
+                                               timeout=self.connect_timeout)
+        return self.fabric_hook
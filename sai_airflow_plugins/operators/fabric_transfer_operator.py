@@ -0,0 +1,121 @@
+from typing import Any, Dict, Optional, Union
+
+from airflow.exceptions import AirflowException
+from airflow.models.baseoperator import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook, LazyFabricHook, prepare_fabric_hook
+from sai_airflow_plugins.hooks.fabric_transfer import DEFAULT_CHUNK_SIZE, GET, PUT
+
+
+class FabricTransferOperator(BaseOperator):
+    """
+    Operator to upload or download a file over SFTP using `FabricHook`. Large files are split into chunks that are
+    transferred over several pooled connections at the same time. An interrupted transfer, e.g. because of a
+    disconnect, resumes with the chunks that weren't completed yet when the task is retried, and the SHA-256
+    checksums of both files are compared at the end.
+
+    The operator returns a dict with the source, destination, size, number of bytes transferred in this run, duration
+    and checksum, which is pushed to the ``return_value`` XCom.
+
+    :param fabric_hook: predefined fabric_hook to use for the transfer. Either `fabric_hook` or `ssh_conn_id` needs
+                        to be provided. A :class:`~sai_airflow_plugins.hooks.fabric_hook.LazyFabricHook` is resolved
+                        when the task runs.
+    :param ssh_conn_id: connection id from airflow Connections. `ssh_conn_id` will be ignored if `fabric_hook` is
+                        provided. (templated)
+    :param remote_host: remote host to connect. (templated) Nullable. If provided, it will replace the `remote_host`
+                        which was defined in `fabric_hook` or predefined in the connection of `ssh_conn_id`.
+    :param direction: ``"put"`` to upload `local_path` to `remote_path`, or ``"get"`` to download `remote_path` to
+                      `local_path`
+    :param local_path: path of the local file. (templated)
+    :param remote_path: path of the remote file. (templated)
+    :param chunk_size: the number of bytes per chunk. The default is 8 MiB.
+    :param max_concurrency: the maximum number of chunks that are transferred at the same time. The default is 4.
+    :param resume: continue a previously interrupted transfer of the same file. The default is True.
+    :param verify: compare the checksums of the local and remote file after the transfer. The default is True.
+    :param connect_timeout: Connection timeout, in seconds. The default is 10.
+    :param transport_profile: SSH transport tuning profile, e.g. ``lan-bulk``, ``wan`` or ``low-cpu``. If provided, it
+                              replaces the profile of `fabric_hook` or the ``transport_profile`` in the extras of the
+                              connection of `ssh_conn_id`. See
+                              :class:`~sai_airflow_plugins.hooks.fabric_transport_profile.TransportProfile`.
+    """
+
+    template_fields = ("ssh_conn_id", "remote_host", "local_path", "remote_path")
+    ui_color = "#ebfff5"
+
+    @apply_defaults
+    def __init__(self,
+                 fabric_hook: Optional[Union[FabricHook, LazyFabricHook]] = None,
+                 ssh_conn_id: Optional[str] = None,
+                 remote_host: Optional[str] = None,
+                 direction: str = PUT,
+                 local_path: str = None,
+                 remote_path: str = None,
+                 chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+                 max_concurrency: Optional[int] = 4,
+                 resume: Optional[bool] = True,
+                 verify: Optional[bool] = True,
+                 connect_timeout: Optional[int] = 10,
+                 transport_profile: Optional[str] = None,
+                 *args,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fabric_hook = fabric_hook
+        self.ssh_conn_id = ssh_conn_id
+        self.remote_host = remote_host
+        self.direction = direction
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.resume = resume
+        self.verify = verify
+        self.connect_timeout = connect_timeout
+        self.transport_profile = transport_profile
+
+    def execute(self, context: Dict) -> Dict[str, Any]:
+        """
+        Transfers the file over the configured SSH connection.
+
+        :param context: Context dict provided by airflow
+        :return: a dict with the details of the transfer.
+                 On an error, raises AirflowException.
+        """
+        if self.direction not in (PUT, GET):
+            raise AirflowException(f"Unknown transfer direction {self.direction}. Use '{PUT}' or '{GET}'.")
+
+        if not self.local_path or not self.remote_path:
+            raise AirflowException("Both local_path and remote_path must be specified. Aborting.")
+
+        hook = self.get_fabric_hook()
+        transfer = hook.put if self.direction == PUT else hook.get
+        paths = (self.local_path, self.remote_path) if self.direction == PUT else (self.remote_path, self.local_path)
+
+        try:
+            result = transfer(*paths,
+                              chunk_size=self.chunk_size,
+                              max_concurrency=self.max_concurrency,
+                              resume=self.resume,
+                              verify=self.verify)
+        except AirflowException:
+            raise
+        except Exception as e:
+            raise AirflowException(f"Fabric transfer operator error: {e}")
+
+        self.log.info(f"Transferred {result.transferred} of {result.size} bytes from {result.source} to "
+                      f"{result.destination} in {result.duration:.3f}s")
+        return result._asdict()
+
+    def get_fabric_hook(self) -> FabricHook:
+        """
+        Returns the provided hook, or creates one from ``self.ssh_conn_id``, with ``self.remote_host`` applied. A
+        `LazyFabricHook` is resolved.
+
+        :return: `FabricHook` object
+        """
+        self.fabric_hook = prepare_fabric_hook(self.fabric_hook,
+                                               ssh_conn_id=self.ssh_conn_id,
+                                               remote_host=self.remote_host,
+                                               transport_profile=self.transport_profile,
+                                               timeout=self.connect_timeout)
+        return self.fabric_hook
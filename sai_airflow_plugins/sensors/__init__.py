@@ -0,0 +1,9 @@
+from sai_airflow_plugins.lazy_loading import lazy_attributes
+
+# The sensors are imported on first use, e.g. `from sai_airflow_plugins.sensors import FabricSensor`
+__getattr__, __dir__ = lazy_attributes(globals(), {
+    "ConditionalBashSensor": "sai_airflow_plugins.sensors.conditional_sensors",
+    "ConditionalFabricSensor": "sai_airflow_plugins.sensors.conditional_sensors",
+    "ConditionalPythonSensor": "sai_airflow_plugins.sensors.conditional_sensors",
+    "FabricSensor": "sai_airflow_plugins.sensors.fabric_sensor",
+})
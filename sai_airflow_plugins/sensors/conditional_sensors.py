@@ -1,40 +1,66 @@
-from airflow.contrib.sensors.bash_sensor import BashSensor
-from airflow.contrib.sensors.python_sensor import PythonSensor
-
+"""
+Conditional versions of common sensors. The classes are created on first use, so importing this module doesn't import
+the sensors they're based on, nor Fabric and paramiko for `ConditionalFabricSensor`.
+"""
+from sai_airflow_plugins.lazy_loading import lazy_attributes
 from sai_airflow_plugins.operators.conditional_skip_mixin import ConditionalSkipMixin
-from sai_airflow_plugins.sensors.fabric_sensor import FabricSensor
 
+# The classes are defined by __getattr__
+__all__ = ["ConditionalBashSensor", "ConditionalPythonSensor", "ConditionalFabricSensor"]  # noqa: F822
+
+
+def _create_conditional_bash_sensor() -> type:
+    from airflow.contrib.sensors.bash_sensor import BashSensor
+
+    class ConditionalBashSensor(ConditionalSkipMixin, BashSensor):
+        """
+        Conditional bash sensor.
+
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~airflow.contrib.sensors.bash_sensor.BashSensor`
+        """
+        template_fields = BashSensor.template_fields + ConditionalSkipMixin.template_fields
+        template_ext = BashSensor.template_ext
+        ui_color = "#ede4ff"
+
+    return ConditionalBashSensor
+
+
+def _create_conditional_python_sensor() -> type:
+    from airflow.contrib.sensors.python_sensor import PythonSensor
+
+    class ConditionalPythonSensor(ConditionalSkipMixin, PythonSensor):
+        """
+        Conditional python sensor.
+
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~airflow.contrib.sensors.bash_sensorPythonSensor`
+        """
+        template_fields = PythonSensor.template_fields + ConditionalSkipMixin.template_fields
+        ui_color = "#ffebff"
 
-class ConditionalBashSensor(ConditionalSkipMixin, BashSensor):
-    """
-    Conditional bash sensor.
+    return ConditionalPythonSensor
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~airflow.contrib.sensors.bash_sensor.BashSensor`
-    """
-    template_fields = BashSensor.template_fields + ConditionalSkipMixin.template_fields
-    template_ext = BashSensor.template_ext
-    ui_color = "#ede4ff"
 
+def _create_conditional_fabric_sensor() -> type:
+    from sai_airflow_plugins.sensors.fabric_sensor import FabricSensor
 
-class ConditionalPythonSensor(ConditionalSkipMixin, PythonSensor):
-    """
-    Conditional python sensor.
+    class ConditionalFabricSensor(ConditionalSkipMixin, FabricSensor):
+        """
+        Conditional Fabric sensor.
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~airflow.contrib.sensors.bash_sensorPythonSensor`
-    """
-    template_fields = PythonSensor.template_fields + ConditionalSkipMixin.template_fields
-    ui_color = "#ffebff"
+        .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
+                     :class:`~sai_airflow_plugins.sensors.fabric_sensor.FabricSensor`
+        """
+        template_fields = FabricSensor.template_fields + ConditionalSkipMixin.template_fields
+        template_ext = FabricSensor.template_ext
+        ui_color = "#e6f2eb"
 
+    return ConditionalFabricSensor
 
-class ConditionalFabricSensor(ConditionalSkipMixin, FabricSensor):
-    """
-    Conditional Fabric sensor.
 
-    .. seealso:: :class:`~sai_airflow_plugins.operators.conditional_skip_mixin.ConditionalSkipMixin` and
-                 :class:`~sai_airflow_plugins.sensors.fabric_sensor.FabricSensor`
-    """
-    template_fields = FabricSensor.template_fields + ConditionalSkipMixin.template_fields
-    template_ext = FabricSensor.template_ext
-    ui_color = "#e6f2eb"
+__getattr__, __dir__ = lazy_attributes(globals(), {
+    "ConditionalBashSensor": _create_conditional_bash_sensor,
+    "ConditionalPythonSensor": _create_conditional_python_sensor,
+    "ConditionalFabricSensor": _create_conditional_fabric_sensor,
+})
@@ -1,34 +1,217 @@
-from typing import Dict
+import math
+import shlex
+from typing import Dict, List, Optional, Union
 
+from airflow.exceptions import AirflowException, AirflowSensorTimeout, AirflowSkipException
 from airflow.sensors.base_sensor_operator import BaseSensorOperator
 from airflow.utils.decorators import apply_defaults
+from fabric import Connection
 
+from sai_airflow_plugins.hooks.fabric_output import close_result
 from sai_airflow_plugins.operators.fabric_operator import FabricOperator
 
+# Exit code of the remote polling loop when the command didn't exit with code 0 before the timeout, like timeout(1)
+REMOTE_POLLING_TIMEOUT = 124
+
+
+def get_polling_command(command: Union[str, List[str]], interval: float, timeout: float) -> str:
+    """
+    Returns a shell loop that evaluates a command every `interval` seconds on the remote host, until it exits with code
+    0 or `timeout` seconds have passed. The loop exits with code 0 in the first case and with `REMOTE_POLLING_TIMEOUT`
+    in the second. Each evaluation runs in a subshell, so a command that calls ``exit`` doesn't end the loop.
+
+    :param command: the command to evaluate. If it's a list, all commands must exit with code 0, and the remaining
+                    commands aren't evaluated after a command failed.
+    :param interval: the number of seconds between evaluations
+    :param timeout: the number of seconds after which the loop gives up
+    :return: the loop
+    """
+    commands = command if isinstance(command, list) else [command]
+    condition = " && ".join(f"( {cmd}\n)" for cmd in commands)
+    return f"__sensor_deadline=$(( $(date +%s) + {math.ceil(timeout)} ))\n" \
+           f"while :; do\n" \
+           f"{condition} && exit 0\n" \
+           f"[ \"$(date +%s)\" -lt \"$__sensor_deadline\" ] || exit {REMOTE_POLLING_TIMEOUT}\n" \
+           f"sleep {interval:g}\n" \
+           f"done"
+
 
 class FabricSensor(BaseSensorOperator, FabricOperator):
     """
     Executes a command on a remote host using the [Fabric](https://www.fabfile.org) library and returns True if and
     only if the exit code is 0. Like `FabricOperator` it uses a standard `SSHHook` for the connection configuration.
 
-    The parameters for this sensor are the combined parameters of `FabricOperator` and `BaseSensorOperator`.
+    The parameters for this sensor are the combined parameters of `FabricOperator` and `BaseSensorOperator`, plus:
+
+    :param keep_connection: keep the SSH connection open between pokes, so every poke only opens a new channel on it
+                            instead of setting up a connection. A connection that was lost is replaced transparently.
+                            The connection is released when the sensor finishes, times out or is killed. In
+                            ``reschedule`` mode every poke is a separate execution, so this has no effect there.
+                            The default is True.
+    :param remote_polling: evaluate the command in a loop on the remote host every `poke_interval` seconds, until it
+                           exits with code 0 or `timeout` seconds have passed, instead of poking over SSH. The sensor
+                           waits for the loop on a single channel, so it notices success right away instead of after
+                           the next poke. The loop is terminated when the task is killed, as with
+                           `track_remote_process`. `poke_interval` is the fixed interval of the loop, so
+                           `exponential_backoff` doesn't apply, and this can't be used in ``reschedule`` mode. The
+                           default is False.
     """
 
     template_fields = FabricOperator.template_fields
     template_ext = FabricOperator.template_ext
 
     @apply_defaults
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, keep_connection: Optional[bool] = True, remote_polling: Optional[bool] = False,
+                 **kwargs):
         super().__init__(*args, **kwargs)
+        self.keep_connection = keep_connection
+        self.remote_polling = remote_polling
+        # A loop that's left behind would keep evaluating the command until the timeout
+        self.track_remote_process = self.track_remote_process or remote_polling
+        self._sensor_conn: Optional[Connection] = None
+        self._holding_conn = False
+
+    def execute(self, context: Dict):
+        """
+        Pokes until the command exits with code 0, keeping the SSH connection open between pokes if
+        ``self.keep_connection`` is True.
+
+        :param context: Context dict provided by airflow
+        """
+        if self.remote_polling:
+            return self.execute_remote_polling()
+
+        self._holding_conn = bool(self.keep_connection)
+        try:
+            return super().execute(context)
+        finally:
+            self._holding_conn = False
+            self.close_sensor_conn()
+
+    def execute_remote_polling(self):
+        """
+        Evaluates ``self.command`` in a loop on the remote host until it exits with code 0, and raises
+        `AirflowSensorTimeout` if it didn't before ``self.timeout``, or `AirflowSkipException` if ``self.soft_fail`` is
+        True.
+        """
+        if self.reschedule:
+            raise AirflowException("Cannot use remote_polling in reschedule mode. Aborting.")
+
+        if not self.command:
+            raise AirflowException("SSH command not specified. Aborting.")
+
+        self.log.info(f"Polling on the remote host every {self.poke_interval}s for at most {self.timeout}s")
+        result = self.execute_fabric_command(self.get_remote_polling_command())
+        close_result(result)
+
+        if result.exited == 0:
+            self.log.info("Success criteria met. Exiting.")
+            return
+
+        if result.exited == REMOTE_POLLING_TIMEOUT:
+            message = f"Sensor has timed out; the command didn't exit with code 0 within {self.timeout} seconds."
+            if self.soft_fail:
+                raise AirflowSkipException(message)
+            raise AirflowSensorTimeout(message)
+
+        raise AirflowException(f"Remote polling loop exited with return code {result.exited}. "
+                               f"See log output for details.")
+
+    def get_remote_polling_command(self) -> str:
+        """
+        Returns the polling loop for ``self.command``. With ``self.use_sudo``, the loop is passed to ``sh -c`` as a
+        single argument, since sudo would otherwise only apply to its first line.
+
+        :return: the command to execute
+        """
+        loop = get_polling_command(self.command, self.poke_interval, self.timeout)
+        return f"sh -c {shlex.quote(loop)}" if self.use_sudo else loop
 
     def poke(self, context: Dict) -> bool:
         """
-        Executes ``self.command`` over the configured SSH connection and checks its exit code.
+        Executes ``self.command`` over the configured SSH connection and checks its exit code. If ``self.command`` is
+        a list, all commands must exit with code 0. If a poke fails on a connection that was kept open from a previous
+        poke, it's retried once on a new connection.
 
         :param context: Context dict provided by airflow
         :return: True if the command's exit code was 0, else False.
         """
+        reused = self._sensor_conn is not None
+        try:
+            return self.poke_command()
+        except AirflowException as e:
+            if not reused:
+                raise
+
+            self.log.warning(f"Poke failed on the connection kept open from the previous poke. Reconnecting. {e}")
+            return self.poke_command()
+
+    def poke_command(self) -> bool:
+        """
+        Executes ``self.command`` once and checks its exit code.
+
+        :return: True if the command's exit code was 0, else False.
+        """
+        if isinstance(self.command, list):
+            results = self.execute_sequential_fabric_commands()
+            self.log.info(f"Fabric commands exited with {[res.exited for res in results]}")
+
+            return len(results) == len(self.command) and all(res.exited == 0 for res in results)
+
         result = self.execute_fabric_command()
+        close_result(result)
         self.log.info(f"Fabric command exited with {result.exited}")
 
         return not result.exited
+
+    def on_kill(self):
+        """
+        Terminates the remote commands that are still running and discards the connection kept open between pokes.
+        """
+        super().on_kill()
+
+        conn = self._sensor_conn
+        if conn is not None:
+            self.log.info(f"Closing the SSH connection to {conn.host}")
+            self.release_conn_on_kill(conn)
+
+    def acquire_fabric_conn(self) -> Connection:
+        """
+        Returns the connection that's kept open between pokes, or acquires a new one if there is none yet or if the
+        previous one was lost.
+
+        :return: `Connection` object
+        """
+        if not self._holding_conn:
+            return super().acquire_fabric_conn()
+
+        if self._sensor_conn is not None and not self._sensor_conn.is_connected:
+            self.log.info("The SSH connection kept open between pokes was lost. Reconnecting.")
+            self.close_sensor_conn(discard=True)
+
+        if self._sensor_conn is None:
+            self._sensor_conn = super().acquire_fabric_conn()
+
+        return self._sensor_conn
+
+    def release_fabric_conn(self, conn: Connection, discard: bool = False):
+        """
+        Keeps the connection open for the next poke, unless it's discarded after an error.
+
+        :param conn: the `Connection` object obtained with `acquire_fabric_conn`
+        :param discard: close the connection instead of keeping it open for reuse
+        """
+        if conn is not self._sensor_conn:
+            super().release_fabric_conn(conn, discard=discard)
+        elif discard:
+            self.close_sensor_conn(discard=True)
+
+    def close_sensor_conn(self, discard: bool = False):
+        """
+        Releases the connection that's kept open between pokes, if any.
+
+        :param discard: close the connection instead of handing it back to the connection pool
+        """
+        conn, self._sensor_conn = self._sensor_conn, None
+        if conn is not None:
+            super().release_fabric_conn(conn, discard=discard)
@@ -39,7 +39,8 @@ setup(
     include_package_data=True,
     install_requires=requirements,
     extras_require={"docs": requirements_docs,
-                    'tests': requirements_tests},
+                    'tests': requirements_tests,
+                    "zstd": ["zstandard"]},
     test_suite="tests",
     tests_require=requirements_tests,
     classifiers=[
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from airflow.configuration import conf
+
+from sai_airflow_plugins.hooks.configurable_store import ConfigurableStore, write_file_atomically
+
+
+class RecordingStore(object):
+    created = 0
+
+    def __init__(self):
+        RecordingStore.created += 1
+
+
+class OtherStore(RecordingStore):
+    pass
+
+
+class ConfigurableStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStore.created = 0
+
+    def test_default_class(self):
+        store = ConfigurableStore("test_store", RecordingStore)
+        self.assertEqual(RecordingStore.created, 0)
+
+        self.assertIsInstance(store.get(), RecordingStore)
+        self.assertIs(store.get(), store.get())
+        self.assertEqual(RecordingStore.created, 1)
+
+    def test_configured_class(self):
+        store = ConfigurableStore("test_store", RecordingStore)
+
+        with patch.object(conf, "get", return_value=f"{__name__}.OtherStore") as get:
+            self.assertIsInstance(store.get(), OtherStore)
+
+        get.assert_called_once_with("sai_airflow_plugins", "test_store", fallback=None)
+
+    def test_threads(self):
+        """
+        Test that concurrent first calls get the same store
+        """
+        store = ConfigurableStore("test_store", RecordingStore)
+        stores = []
+        threads = [threading.Thread(target=lambda: stores.append(store.get())) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(RecordingStore.created, 1)
+        self.assertEqual(len(set(map(id, stores))), 1)
+
+
+class WriteFileAtomicallyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "a", "b")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write(self):
+        write_file_atomically(self.path, [b"ab", b"c"])
+        write_file_atomically(self.path, ["def"], mode="w")
+
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "def")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["b"])
+
+    def test_failed_write(self):
+        """
+        Test that a failed write leaves the previous file and no temporary file
+        """
+        def chunks():
+            yield b"new"
+            raise ValueError()
+
+        write_file_atomically(self.path, [b"old"])
+        with self.assertRaises(ValueError):
+            write_file_atomically(self.path, chunks())
+
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["b"])
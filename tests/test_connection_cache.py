@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.hooks.base_hook import BaseHook
+from airflow.models import Connection
+from faker import Faker
+
+from sai_airflow_plugins.hooks.connection_cache import ConnectionCache, get_connection_cache
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.mattermost_webhook_hook import MattermostWebhookHook
+
+faker = Faker()
+
+
+class ConnectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ConnectionCache(ttl=60)
+        self.conn_id = faker.pystr()
+        self.loader = Mock(side_effect=lambda conn_id: Connection(conn_id=conn_id))
+
+    def test_hit_and_miss(self):
+        """
+        Test that a connection is loaded once and then served from the cache, and that the counters are updated
+        """
+        conn1 = self.cache.get(self.conn_id, self.loader)
+        conn2 = self.cache.get(self.conn_id, self.loader)
+
+        self.assertIs(conn1, conn2)
+        self.loader.assert_called_once_with(self.conn_id)
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 1, "size": 1})
+
+    def test_expiry(self):
+        """
+        Test that a connection is loaded again after the TTL has expired
+        """
+        self.cache.get(self.conn_id, self.loader)
+        with patch("sai_airflow_plugins.hooks.connection_cache.time.monotonic", return_value=10 ** 9):
+            self.cache.get(self.conn_id, self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_invalidate(self):
+        """
+        Test that an invalidated connection is loaded again
+        """
+        self.cache.get(self.conn_id, self.loader)
+        self.cache.invalidate(self.conn_id)
+        self.cache.get(self.conn_id, self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_disabled(self):
+        """
+        Test that nothing is cached with a TTL of 0
+        """
+        self.cache.ttl = 0
+        self.cache.get(self.conn_id, self.loader)
+        self.cache.get(self.conn_id, self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertEqual(self.cache.stats["size"], 0)
+
+
+class HookConnectionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        get_connection_cache().invalidate()
+        self.conn_id = faker.pystr()
+        self.conn = Connection(conn_id=self.conn_id, host=faker.hostname(), login=faker.user_name(),
+                               extra='{"webhook_token": "token"}')
+
+    def test_fabric_hook_uses_cache(self):
+        """
+        Test that creating multiple `FabricHook` objects for the same connection id queries the connection once
+        """
+        with patch.object(BaseHook, "get_connection", return_value=self.conn) as mock_get_connection:
+            FabricHook(ssh_conn_id=self.conn_id)
+            hook = FabricHook(ssh_conn_id=self.conn_id)
+
+        mock_get_connection.assert_called_once_with(self.conn_id)
+        self.assertEqual(hook.remote_host, self.conn.host)
+
+    def test_fabric_hook_invalidates_on_failure(self):
+        """
+        Test that the cached connection is invalidated if the hook can't be set up with it
+        """
+        with patch.object(BaseHook, "get_connection", return_value=self.conn):
+            FabricHook(ssh_conn_id=self.conn_id)
+
+        with patch.object(FabricHook, "_pkey_from_private_key", side_effect=ValueError()):
+            self.conn.extra = '{"private_key": "invalid"}'
+            with self.assertRaises(ValueError):
+                FabricHook(ssh_conn_id=self.conn_id)
+
+        self.assertEqual(get_connection_cache().stats["size"], 0)
+
+    def test_mattermost_hook_uses_cache(self):
+        """
+        Test that creating multiple `MattermostWebhookHook` objects for the same connection id queries the
+        connection once
+        """
+        with patch.object(BaseHook, "get_connection", return_value=self.conn) as mock_get_connection:
+            MattermostWebhookHook(http_conn_id=self.conn_id)
+            hook = MattermostWebhookHook(http_conn_id=self.conn_id)
+
+        mock_get_connection.assert_called_once_with(self.conn_id)
+        self.assertEqual(hook.webhook_token, "token")
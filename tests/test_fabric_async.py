@@ -0,0 +1,185 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import Mock
+
+from faker import Faker
+from invoke import Responder
+from invoke.exceptions import AuthFailure
+
+from sai_airflow_plugins.hooks.fabric_async import AsyncFabricRunner
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+
+TEST_TASK_ID = "test_fabric_async"
+SUDO_PROMPT = "[sudo] password: "
+
+faker = Faker()
+
+
+class FakeChannel(object):
+    """
+    Minimal stand-in for a paramiko channel of a command that has already finished, with buffered output
+    """
+
+    def __init__(self, stdout=(), stderr=(), exit_code=0):
+        self.stdout = [chunk.encode() for chunk in stdout]
+        self.stderr = [chunk.encode() for chunk in stderr]
+        self.exit_code = exit_code
+        self.eof_received = True
+        self.sent = []
+        self.command = None
+        self.environment = None
+        self.pty = False
+        self.closed = False
+        self._read_fd, self._write_fd = os.pipe()
+        os.write(self._write_fd, b"x")
+
+    def exec_command(self, command):
+        self.command = command
+
+    def update_environment(self, env):
+        self.environment = env
+
+    def get_pty(self, **kwargs):
+        self.pty = True
+
+    def setblocking(self, blocking):
+        pass
+
+    def fileno(self):
+        return self._read_fd
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, nbytes):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, nbytes):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.exit_code
+
+    def sendall(self, data):
+        self.sent.append(data.decode())
+
+    def close(self):
+        self.closed = True
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
+def create_conn(*channels) -> Mock:
+    conn = Mock()
+    conn.inline_ssh_env = False
+    conn.config.sudo.prompt = SUDO_PROMPT
+    conn.transport.open_session.side_effect = list(channels)
+    return conn
+
+
+class AsyncFabricRunnerTest(unittest.TestCase):
+
+    def test_run(self):
+        """
+        Test that run returns a `Result` with the exit code and output, and sets the environment and pty
+        """
+        channel = FakeChannel(stdout=["hello ", "world\n"], stderr=["warning\n"], exit_code=3)
+        conn = create_conn(channel)
+        env = {"MY_VAR": "1"}
+
+        res = asyncio.run(AsyncFabricRunner(conn).run("my command", env=env, pty=True, hide=True))
+
+        self.assertEqual(res.exited, 3)
+        self.assertEqual(res.stdout, "hello world\n")
+        self.assertEqual(res.stderr, "warning\n")
+        self.assertEqual(channel.command, "my command")
+        self.assertEqual(channel.environment, env)
+        self.assertTrue(channel.pty)
+        self.assertTrue(channel.closed)
+
+    def test_inline_env(self):
+        """
+        Test that the environment is prefixed to the command when the connection uses inline_ssh_env
+        """
+        channel = FakeChannel()
+        conn = create_conn(channel)
+        conn.inline_ssh_env = True
+
+        asyncio.run(AsyncFabricRunner(conn).run("ls", env={"B": "2", "A": "1"}, hide=True))
+        self.assertEqual(channel.command, "export A=1 B=2 && ls")
+
+    def test_watchers(self):
+        """
+        Test that watchers created by the factory respond to the output
+        """
+        channel = FakeChannel(stdout=["Continue? "])
+        conn = create_conn(channel)
+        factory = Mock(side_effect=lambda: [Responder(pattern=r"Continue\? ", response="yes\n")])
+
+        asyncio.run(AsyncFabricRunner(conn).run("ls", watchers_factory=factory, hide=True))
+
+        self.assertEqual(channel.sent, ["yes\n"])
+        self.assertEqual(factory.call_count, 2)
+
+    def test_sudo(self):
+        """
+        Test that sudo wraps the command like Fabric's sudo and responds to the password prompt
+        """
+        channel = FakeChannel(stderr=[SUDO_PROMPT])
+        conn = create_conn(channel)
+
+        asyncio.run(AsyncFabricRunner(conn).run("ls", sudo=True, password="secret", user="admin", hide=True))
+
+        self.assertEqual(channel.command, f"sudo -S -p '{SUDO_PROMPT}' -H -u admin ls")
+        self.assertEqual(channel.sent, ["secret\n"])
+
+    def test_sudo_wrong_password(self):
+        """
+        Test that a rejected sudo password raises `AuthFailure`
+        """
+        channel = FakeChannel(stderr=[SUDO_PROMPT, "Sorry, try again.\n"])
+        conn = create_conn(channel)
+
+        with self.assertRaises(AuthFailure):
+            asyncio.run(AsyncFabricRunner(conn).run("ls", sudo=True, password="wrong", hide=True))
+
+    def test_hook_run_many_async(self):
+        """
+        Test that `FabricHook.run_many_async` returns a result per command in the same order
+        """
+        conn = create_conn(*(FakeChannel(stdout=[f"out {i}"], exit_code=i) for i in range(5)))
+        hook = FabricHook(remote_host=faker.hostname())
+
+        results = asyncio.run(hook.run_many_async([f"cmd {i}" for i in range(5)], max_concurrency=2, conn=conn,
+                                                  hide=True))
+
+        self.assertEqual([res.command for res in results], [f"cmd {i}" for i in range(5)])
+        self.assertEqual([res.exited for res in results], list(range(5)))
+        self.assertEqual([res.stdout for res in results], [f"out {i}" for i in range(5)])
+        conn.open.assert_called()
+
+    def test_operator_use_asyncio(self):
+        """
+        Test that `FabricOperator` with `use_asyncio` runs the command with the asyncio runner
+        """
+        channel = FakeChannel(stdout=["done\n"])
+        conn = create_conn(channel)
+        hook = FabricHook(remote_host=faker.hostname())
+        hook.get_fabric_conn = Mock(return_value=conn)
+
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=hook, command="ls", use_asyncio=True,
+                            use_connection_pool=False, strip_stdout=True)
+        res = op.execute_fabric_command()
+
+        self.assertEqual(res.exited, 0)
+        self.assertEqual(res.stdout, "done")
+        self.assertEqual(channel.command, "ls")
+        conn.run.assert_not_called()
@@ -0,0 +1,221 @@
+import asyncio
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException
+from fabric import Connection
+from faker import Faker
+from invoke import Responder
+
+from sai_airflow_plugins.hooks.fabric_async import AsyncFabricRunner
+from sai_airflow_plugins.hooks.fabric_compression import DecompressingRemote, OutputCompression, zstd_available
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_output import CapturedResult, CapturingRemote
+from sai_airflow_plugins.hooks.fabric_process import TrackedRemote
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+from tests.test_fabric_async import FakeChannel, create_conn
+from tests.test_fabric_output import FakeSessionChannel
+
+TEST_TASK_ID = "test_fabric_compression"
+
+faker = Faker()
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def run_wrapped(compression: OutputCompression, command: str, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Runs a wrapped command locally, like an SSH server does, and decompresses its stdout in small chunks
+    """
+    proc = subprocess.run(["/bin/sh", "-c", compression.wrap(command)], stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, timeout=30, **kwargs)
+    proc.stdout = b"".join(compression.decompress(chunk) for chunk in split(proc.stdout, 100)) + compression.flush()
+    return proc
+
+
+class OutputCompressionTest(unittest.TestCase):
+
+    def test_gzip(self):
+        """
+        Test that stdout is compressed and decompressed, and stderr and the exit code are passed on
+        """
+        compression = OutputCompression("gzip")
+
+        proc = run_wrapped(compression, "seq 1 20000; echo warning >&2; exit 3")
+
+        self.assertEqual(proc.returncode, 3)
+        self.assertEqual(proc.stdout, "".join(f"{i}\n" for i in range(1, 20001)).encode())
+        self.assertEqual(proc.stderr, b"warning\n")
+        self.assertEqual(compression.format, "gzip")
+        self.assertEqual(compression.size, len(proc.stdout))
+        self.assertLess(compression.compressed_size, compression.size / 2)
+        self.assertGreater(compression.ratio, 2)
+
+    def test_stdin_and_heredoc(self):
+        """
+        Test that the command still reads stdin, and a heredoc at the end of the command is terminated
+        """
+        compression = OutputCompression("gzip")
+
+        proc = run_wrapped(compression, "cat; cat <<'__end__'\nheredoc\n__end__", input=b"input\n")
+
+        self.assertEqual(proc.returncode, 0)
+        self.assertEqual(proc.stdout, b"input\nheredoc\n")
+
+    def test_program_not_available(self):
+        """
+        Test that the output is sent uncompressed if the compression program isn't installed
+        """
+        compression = OutputCompression("gzip")
+
+        with tempfile.TemporaryDirectory() as path:
+            os.symlink(shutil.which("cat"), os.path.join(path, "cat"))
+            proc = run_wrapped(compression, "echo hello", env={"PATH": path})
+
+        self.assertEqual(proc.stdout, b"hello\n")
+        self.assertEqual(compression.format, "none")
+        self.assertEqual(compression.ratio, 1.0)
+
+    def test_short_uncompressed_output(self):
+        compression = OutputCompression("gzip")
+
+        self.assertEqual(compression.decompress(b"\x1f"), b"")
+        self.assertEqual(compression.flush(), b"\x1f")
+        self.assertEqual(compression.flush(), b"")
+
+    def test_concatenated_gzip(self):
+        compression = OutputCompression("gzip")
+        data = gzip.compress(b"first\n") + gzip.compress(b"second\n")
+
+        output = b"".join(compression.decompress(chunk) for chunk in split(data, 7)) + compression.flush()
+
+        self.assertEqual(output, b"first\nsecond\n")
+
+    def test_auto(self):
+        compress_command = OutputCompression("auto").get_compress_command()
+
+        self.assertEqual("zstd" in compress_command, zstd_available())
+        self.assertIn("gzip -c", compress_command)
+
+    @unittest.skipUnless(zstd_available(), "zstandard is not installed")
+    def test_zstd(self):
+        import zstandard
+        compression = OutputCompression("zstd")
+        data = zstandard.ZstdCompressor().compress(b"x" * 10000)
+
+        output = b"".join(compression.decompress(chunk) for chunk in split(data, 3)) + compression.flush()
+
+        self.assertEqual(output, b"x" * 10000)
+        self.assertEqual(compression.format, "zstd")
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(AirflowException, "Unknown output compression"):
+            OutputCompression("bzip2")
+
+        if not zstd_available():
+            with self.assertRaisesRegex(AirflowException, "zstandard package is required"):
+                OutputCompression("zstd")
+
+
+class DecompressingRemoteTest(unittest.TestCase):
+
+    def test_run(self):
+        """
+        Test that watchers and the result see the decompressed output, also when a character is split over chunks
+        """
+        compression = OutputCompression("gzip")
+        conn = Connection(faker.hostname())
+        channel = FakeSessionChannel(stderr=["warning\n"], exit_code=3)
+        channel.stdout = split(gzip.compress("Continue? ünïcödé\n".encode()), 5)
+        runner = DecompressingRemote(context=conn, inline_env=False, compression=compression)
+        runner.read_chunk_size = 5
+
+        with patch.object(Connection, "create_session", return_value=channel):
+            res = conn._run(runner, "ls", hide=True, warn=True, in_stream=False,
+                            watchers=[Responder(pattern=r"Continue\?", response="yes\n")])
+
+        self.assertEqual(channel.command, compression.wrap("ls"))
+        self.assertEqual(res.command, "ls")
+        self.assertEqual(res.exited, 3)
+        self.assertEqual(res.stdout, "Continue? ünïcödé\n")
+        self.assertEqual(res.stderr, "warning\n")
+        self.assertEqual(channel.sent, ["yes\n"])
+
+    def test_async(self):
+        compression = OutputCompression("gzip")
+        channel = FakeChannel()
+        channel.stdout = split(gzip.compress("ünïcödé\n".encode()), 5)
+
+        res = asyncio.run(AsyncFabricRunner(create_conn(channel)).run("ls", hide=True, compression=compression))
+
+        self.assertEqual(channel.command, compression.wrap("ls"))
+        self.assertEqual(res.stdout, "ünïcödé\n")
+        self.assertEqual(compression.size, len("ünïcödé\n".encode()))
+
+
+class FabricOperatorCompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(),
+                                     password=faker.password())
+        get_connection_pool().close_all()
+
+    def test_compress_output(self):
+        """
+        Test that the plain output is pushed to an XCom and the byte counts are logged
+        """
+        channel = FakeSessionChannel()
+        channel.stdout = [gzip.compress(b"x" * 1000 + b"\n")]
+        task_inst = Mock()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", xcom_push_key="test_xcom",
+                            strip_stdout=True, compress_output="gzip")
+
+        with patch.object(Connection, "create_session", return_value=channel), patch("sys.stdin", io.StringIO()), \
+                self.assertLogs(op.log, level="INFO") as logs:
+            self.assertTrue(op.execute(context={"task_instance": task_inst}))
+
+        task_inst.xcom_push.assert_called_with("test_xcom", "x" * 1000)
+        self.assertTrue(channel.command.endswith("exit ${rc:-255}"))
+        self.assertTrue(any("bytes of gzip compressed stdout for 1001 bytes of output" in line
+                            for line in logs.output))
+
+    def test_combined_runner(self):
+        """
+        Test that the runner combines output compression, process tracking and the bounded output capture
+        """
+        channel = FakeSessionChannel()
+        channel.stdout = [gzip.compress(b"done\n")]
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", compress_output="gzip",
+                            track_remote_process=True, max_output_memory=100)
+
+        with patch.object(Connection, "create_session", return_value=channel), patch("sys.stdin", io.StringIO()):
+            res = op.execute_fabric_command()
+
+        self.assertIsInstance(res, CapturedResult)
+        self.assertEqual(res.stdout, "done\n")
+        self.assertTrue(channel.command.startswith("echo $$ > "))
+        self.assertIn("gzip -c", channel.command)
+
+        runner = op.create_runner(Connection(faker.hostname()), Mock(), OutputCompression("gzip"))
+        for runner_class in (DecompressingRemote, TrackedRemote, CapturingRemote):
+            self.assertIsInstance(runner, runner_class)
+
+        # The combined class is created once
+        self.assertIs(type(op.create_runner(Connection(faker.hostname()), Mock(), OutputCompression("gzip"))),
+                      type(runner))
+
+    def test_get_pty(self):
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", compress_output="gzip",
+                            get_pty=True)
+
+        with self.assertRaisesRegex(AirflowException, "Cannot use compress_output with get_pty"):
+            op.execute(context={})
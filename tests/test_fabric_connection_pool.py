@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException
+from fabric import Connection
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_connection_pool import FabricConnectionPool, FabricGatewayPool, PoolKey, \
+    PooledGateway
+
+faker = Faker()
+
+
+def create_key(host: str = None) -> PoolKey:
+    return PoolKey(conn_id=faker.pystr(), host=host or faker.hostname(), user=faker.user_name(),
+                   port=faker.port_number(), auth_fingerprint=faker.sha256())
+
+
+def create_conn(alive: bool = True) -> Mock:
+    conn = Mock()
+    conn.is_connected = alive
+    return conn
+
+
+class FabricConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FabricConnectionPool(max_idle_time=60, max_per_host=2, acquire_timeout=0)
+        self.key = create_key()
+
+    def test_reuse_released_connection(self):
+        """
+        Test that a released connection is handed out again for the same key and not for another key
+        """
+        conn = self.pool.acquire(self.key, create_conn)
+        self.pool.release(conn)
+
+        self.assertIs(self.pool.acquire(self.key, create_conn), conn)
+        self.assertIsNot(self.pool.acquire(create_key(), create_conn), conn)
+
+    def test_dead_connection_not_reused(self):
+        """
+        Test that an idle connection that's no longer alive is closed instead of reused
+        """
+        conn = self.pool.acquire(self.key, create_conn)
+        self.pool.release(conn)
+        conn.is_connected = False
+
+        self.assertIsNot(self.pool.acquire(self.key, create_conn), conn)
+        conn.close.assert_called()
+
+    def test_discard(self):
+        """
+        Test that a discarded connection is closed and not reused
+        """
+        conn = self.pool.acquire(self.key, create_conn)
+        self.pool.release(conn, discard=True)
+
+        conn.close.assert_called()
+        self.assertEqual(self.pool.stats, {"idle": 0, "in_use": 0})
+
+    def test_idle_eviction(self):
+        """
+        Test that idle connections are closed after `max_idle_time`
+        """
+        conn = self.pool.acquire(self.key, create_conn)
+        self.pool.release(conn)
+
+        with patch("sai_airflow_plugins.hooks.fabric_connection_pool.time.monotonic", return_value=10 ** 9):
+            self.pool.evict_idle()
+
+        conn.close.assert_called()
+        self.assertEqual(self.pool.stats["idle"], 0)
+
+    def test_max_per_host(self):
+        """
+        Test that the pool doesn't exceed `max_per_host`, and that an idle connection with another key for the same
+        host is closed to make room
+        """
+        host = faker.hostname()
+        key1 = create_key(host)._replace(port=22)
+        key2 = create_key(host)._replace(port=22)
+
+        self.pool.acquire(key1, create_conn)
+        idle_conn = self.pool.acquire(key1, create_conn)
+        self.pool.release(idle_conn)
+
+        self.pool.acquire(key2, create_conn)
+        idle_conn.close.assert_called()
+
+        with self.assertRaises(AirflowException):
+            self.pool.acquire(key2, create_conn)
+
+    def test_connection_context_manager(self):
+        """
+        Test that the context manager releases the connection, and discards it on an exception
+        """
+        with self.pool.connection(self.key, create_conn) as conn:
+            pass
+        self.assertEqual(self.pool.stats, {"idle": 1, "in_use": 0})
+
+        with self.assertRaises(ValueError):
+            with self.pool.connection(self.key, create_conn) as conn:
+                raise ValueError()
+        conn.close.assert_called()
+        self.assertEqual(self.pool.stats, {"idle": 0, "in_use": 0})
+
+
+class FabricGatewayPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FabricGatewayPool()
+        self.key = create_key()
+
+    def test_shared_connection(self):
+        """
+        Test that the jump host connection is opened once and shared, also without releasing it
+        """
+        factory = Mock(side_effect=create_conn)
+        conn = self.pool.get(self.key, factory)
+
+        self.assertIs(self.pool.get(self.key, factory), conn)
+        factory.assert_called_once()
+        conn.open.assert_called_once()
+        self.assertEqual(self.pool.stats, {"gateways": 1, "channels": 2})
+
+    def test_reconnect_dead_connection(self):
+        """
+        Test that a jump host connection that's no longer alive is closed and replaced
+        """
+        conn = self.pool.get(self.key, create_conn)
+        conn.transport.send_ignore.side_effect = EOFError()
+
+        new_conn = self.pool.get(self.key, create_conn)
+        self.assertIsNot(new_conn, conn)
+        conn.close.assert_called()
+        self.assertEqual(self.pool.stats["gateways"], 1)
+
+    def test_close_all(self):
+        conns = [self.pool.get(create_key(), create_conn) for _ in range(3)]
+        self.pool.close_all()
+
+        for conn in conns:
+            conn.close.assert_called()
+        self.assertEqual(self.pool.stats["gateways"], 0)
+
+    def test_pooled_gateway(self):
+        """
+        Test that a Fabric connection opens its direct-tcpip channel on the shared jump host connection and leaves it
+        open on close
+        """
+        with patch("sai_airflow_plugins.hooks.fabric_connection_pool.get_gateway_pool", return_value=self.pool):
+            gateway = PooledGateway(self.key, create_conn)
+            target = Connection(host=faker.hostname(), port=faker.port_number(), gateway=gateway)
+            channel = target.open_gateway()
+
+            gateway_conn = self.pool.get(self.key, create_conn)
+            self.assertIs(channel, gateway_conn.transport.open_channel.return_value)
+            self.assertEqual(gateway_conn.transport.open_channel.call_args[1]["dest_addr"],
+                             (target.host, target.port))
+
+            gateway.close()
+            gateway_conn.close.assert_not_called()
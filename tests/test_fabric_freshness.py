@@ -0,0 +1,178 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException, AirflowSkipException
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_freshness import FingerprintStore, LocalFingerprintStore, \
+    VariableFingerprintStore, compute_fingerprint, stat_remote_files
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+from tests.test_fabric_sync import LocalConnection
+
+TEST_TASK_ID = "test_fabric_freshness"
+
+faker = Faker()
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.conn = LocalConnection()
+        self.conn.host, self.conn.port, self.conn.user = faker.hostname(), 22, faker.user_name()
+        self.path = os.path.join(self.tmp_dir, "input file.txt")
+        self.write(b"a" * 100, mtime=1000000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, data, mtime):
+        with open(self.path, "wb") as f:
+            f.write(data)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_stat_remote_files(self):
+        missing = os.path.join(self.tmp_dir, "missing.txt")
+
+        self.assertEqual(stat_remote_files(self.conn, [self.path, missing]), ["100 1000000", "missing"])
+        self.assertEqual(len(self.conn.commands), 1)
+
+        lines = stat_remote_files(self.conn, [self.path], hash_files=True)
+        self.assertRegex(lines[0], r"^100 1000000 [0-9a-f]{64}$")
+        self.assertEqual(stat_remote_files(self.conn, []), [])
+
+    def test_stat_remote_files_error(self):
+        self.conn.run = Mock(return_value=Mock(exited=1, stdout="", stderr="error"))
+        with self.assertRaises(AirflowException):
+            stat_remote_files(self.conn, [self.path])
+
+    def test_fingerprint(self):
+        """
+        Test that the fingerprint changes with the command, the environment and the input files
+        """
+        fingerprint = compute_fingerprint(self.conn, "make", {"A": 1}, [self.path])
+
+        self.assertEqual(compute_fingerprint(self.conn, "make", {"A": 1}, [self.path]), fingerprint)
+        self.assertNotEqual(compute_fingerprint(self.conn, "make all", {"A": 1}, [self.path]), fingerprint)
+        self.assertNotEqual(compute_fingerprint(self.conn, "make", {"A": 2}, [self.path]), fingerprint)
+        self.assertNotEqual(compute_fingerprint(self.conn, "make", {"A": 1}, [self.path], sudo=True), fingerprint)
+
+        # Without hashing, a change with the same size and modification time isn't noticed
+        hashed = compute_fingerprint(self.conn, "make", {"A": 1}, [self.path], hash_files=True)
+        self.write(b"b" * 100, mtime=1000000)
+        self.assertEqual(compute_fingerprint(self.conn, "make", {"A": 1}, [self.path]), fingerprint)
+        self.assertNotEqual(compute_fingerprint(self.conn, "make", {"A": 1}, [self.path], hash_files=True), hashed)
+
+        self.write(b"b" * 100, mtime=1000001)
+        self.assertNotEqual(compute_fingerprint(self.conn, "make", {"A": 1}, [self.path]), fingerprint)
+
+
+class FingerprintStoreTest(unittest.TestCase):
+
+    def test_local_store(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            store = LocalFingerprintStore(tmp_dir)
+            self.assertIsNone(store.get("my_dag/my_task"))
+            store.set("my_dag/my_task", "abc")
+            store.set("my_dag/my_task", "def")
+            self.assertEqual(store.get("my_dag/my_task"), "def")
+            self.assertEqual(os.listdir(os.path.join(tmp_dir, "my_dag")), ["my_task"])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_variable_store(self):
+        with patch("sai_airflow_plugins.hooks.fabric_freshness.Variable") as variable:
+            store = VariableFingerprintStore()
+            store.set("my_dag/my_task", "abc")
+            store.get("my_dag/my_task")
+
+        variable.set.assert_called_with("sai_airflow_plugins_fingerprint/my_dag/my_task", "abc")
+        variable.get.assert_called_with("sai_airflow_plugins_fingerprint/my_dag/my_task", default_var=None)
+
+    def test_incomplete_store(self):
+        """
+        Test that a store that doesn't implement all methods can't be created
+        """
+        class IncompleteFingerprintStore(FingerprintStore):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            IncompleteFingerprintStore()
+
+
+class FabricOperatorFreshnessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = LocalFingerprintStore(self.tmp_dir)
+        self.hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(),
+                                     password=faker.password())
+        get_connection_pool().close_all()
+        patcher = patch("sai_airflow_plugins.operators.fabric_operator.get_fingerprint_store",
+                        return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_check_freshness(self):
+        """
+        Test that the command only runs again when the fingerprint changed, and only after a successful run
+        """
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="make", check_freshness=True)
+
+        with patch.object(FabricOperator, "execute_command", side_effect=AirflowException("failed")) as execute:
+            with self.assertRaises(AirflowException):
+                op.execute(context={})
+        self.assertEqual(execute.call_count, 1)
+
+        with patch.object(FabricOperator, "execute_command", return_value=True) as execute:
+            self.assertTrue(op.execute(context={}))
+            self.assertTrue(op.execute(context={}))
+            self.assertEqual(execute.call_count, 1)
+
+            op.environment = {"A": 1}
+            self.assertTrue(op.execute(context={}))
+            self.assertEqual(execute.call_count, 2)
+
+    def test_skip_when_fresh(self):
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=["make", "make install"],
+                            check_freshness=True, skip_when_fresh=True)
+
+        self.assertTrue(op.execute(context={}))
+        with self.assertRaises(AirflowSkipException):
+            op.execute(context={})
+
+    def test_mapped_task_instances(self):
+        """
+        Test that every instance of a mapped task has its own fingerprint
+        """
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="make", check_freshness=True)
+        contexts = [{"ti": Mock(map_index=map_index)} for map_index in (0, 1)]
+
+        with patch.object(FabricOperator, "execute_command", return_value=True) as execute:
+            for context in contexts:
+                op.execute(context=context)
+            self.assertEqual(execute.call_count, 2)
+
+            op.environment = {"A": 1}
+            op.execute(context=contexts[0])
+            self.assertEqual(execute.call_count, 3)
+
+            # The second instance still has the old fingerprint, and runs again as well
+            op.execute(context=contexts[1])
+            self.assertEqual(execute.call_count, 4)
+            for context in contexts:
+                op.execute(context=context)
+            self.assertEqual(execute.call_count, 4)
+
+        self.assertEqual(op.get_fingerprint_key(contexts[1]), f"{op.dag_id}/{TEST_TASK_ID}/1")
+        self.assertEqual(op.get_fingerprint_key({"ti": Mock(map_index=-1)}), f"{op.dag_id}/{TEST_TASK_ID}")
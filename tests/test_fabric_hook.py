@@ -1,12 +1,21 @@
 import getpass
+import copy
+import json
+import pickle
+import threading
+import time
 import unittest
+from unittest.mock import Mock, patch
 
 from airflow.exceptions import AirflowException
+from airflow.models import Connection as AirflowConnection
 from faker import Faker
 from invoke import FailingResponder
 from paramiko.config import SSH_PORT
 
-from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.fabric_connection_pool import PooledGateway
+from sai_airflow_plugins.hooks.fabric_hook import CommandResult, FabricHook, LazyFabricHook, prepare_fabric_hook, \
+    resolve_fabric_hook
 
 faker = Faker()
 
@@ -67,6 +76,26 @@ class GetFabricConnectionTest(unittest.TestCase):
         self.assertNotIn("sock", conn.connect_kwargs)
         self.assertFalse(conn.inline_ssh_env)
 
+    def test_get_fabric_conn_gateway(self):
+        """
+        With a jump host in the connection extras, the Connection object must get a pooled gateway for the jump host
+        instead of the proxy command
+        """
+        target = AirflowConnection(conn_id="target", host=self.kwargs["remote_host"],
+                                   extra=json.dumps({"gateway_conn_id": "bastion"}))
+        bastion = AirflowConnection(conn_id="bastion", host=faker.hostname(), login=faker.user_name())
+        connections = {"target": target, "bastion": bastion}
+
+        with patch.object(FabricHook, "get_connection", side_effect=connections.get):
+            hook = FabricHook(ssh_conn_id="target")
+            hook.host_proxy = self.host_proxy
+            conn = hook.get_fabric_conn()
+
+        self.assertIsInstance(conn.gateway, PooledGateway)
+        self.assertEqual((conn.gateway.key.host, conn.gateway.key.user), (bastion.host, bastion.login))
+        self.assertNotIn("sock", conn.connect_kwargs)
+        self.assertNotEqual(hook.get_pool_key(), FabricHook(remote_host=target.host).get_pool_key())
+
 
 class RespondersTest(unittest.TestCase):
 
@@ -110,3 +139,150 @@ class RespondersTest(unittest.TestCase):
         responder = hook.get_generic_pass_responder()
         self.assertIsInstance(responder, FailingResponder)
         self.assertEqual(responder.response, self.password + "\n")
+
+
+class RunManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = FabricHook(remote_host=faker.hostname())
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+        def run(command, **kwargs):
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(0.05)
+            with self.lock:
+                self.running -= 1
+            return Mock(exited=int(command), stdout=f"out {command}", stderr="")
+
+        self.conn = Mock()
+        self.conn.run = Mock(side_effect=run)
+
+    def test_run_many_results(self):
+        """
+        Test that run_many returns a result per command in the same order, with exit code, stdout and duration
+        """
+        results = self.hook.run_many(["0", "1", "2"], conn=self.conn)
+
+        self.assertEqual([res.exited for res in results], [0, 1, 2])
+        self.assertEqual([res.stdout for res in results], ["out 0", "out 1", "out 2"])
+        self.assertTrue(all(isinstance(res, CommandResult) and res.duration > 0 for res in results))
+        self.conn.open.assert_called()
+
+    def test_run_many_concurrency_limit(self):
+        """
+        Test that run_many runs commands concurrently, but not more than `max_concurrency` at the same time
+        """
+        self.hook.run_many(["0"] * 6, max_concurrency=3, conn=self.conn)
+        self.assertEqual(self.max_running, 3)
+
+    def test_run_many_watchers_factory(self):
+        """
+        Test that every command gets its own watchers from the factory and that output is hidden
+        """
+        factory = Mock(side_effect=lambda: [Mock()])
+        self.hook.run_many(["0", "0"], conn=self.conn, watchers_factory=factory, env={"A": "1"})
+
+        self.assertEqual(factory.call_count, 2)
+        kwargs = self.conn.run.call_args[1]
+        self.assertEqual(kwargs["env"], {"A": "1"})
+        self.assertTrue(kwargs["hide"])
+        self.assertTrue(kwargs["warn"])
+
+    def test_run_many_no_pty(self):
+        """
+        Test that run_many refuses to run commands in a pty
+        """
+        with self.assertRaises(AirflowException):
+            self.hook.run_many(["0"], conn=self.conn, pty=True)
+
+
+class LazyFabricHookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = AirflowConnection(conn_id="target", host=faker.hostname(), login=faker.user_name(),
+                                            password=faker.password())
+
+    def test_resolve(self):
+        """
+        Test that the Airflow connection is only read when the hook is resolved, and the hook is created once
+        """
+        with patch.object(FabricHook, "get_connection", return_value=self.connection) as get_connection:
+            lazy_hook = LazyFabricHook("target", transport_profile="wan", timeout=30)
+            get_connection.assert_not_called()
+
+            hook = resolve_fabric_hook(lazy_hook, timeout=5, remote_host=None)
+
+        self.assertIsInstance(hook, FabricHook)
+        self.assertIs(lazy_hook.resolve(), hook)
+        self.assertEqual((hook.ssh_conn_id, hook.remote_host, hook.username),
+                         ("target", self.connection.host, self.connection.login))
+        self.assertEqual((hook.transport_profile, hook.timeout), ("wan", 30))
+        self.assertEqual(lazy_hook.password, self.connection.password)
+        self.assertIs(resolve_fabric_hook(hook), hook)
+        self.assertIsNone(resolve_fabric_hook(None))
+
+    def test_defaults(self):
+        """
+        Test that defaults are used for the arguments that the reference doesn't set
+        """
+        remote_host = faker.hostname()
+        lazy_hook = LazyFabricHook(remote_host=remote_host, username=faker.user_name())
+
+        hook = lazy_hook.resolve(remote_host=faker.hostname(), port=2222)
+
+        self.assertEqual(hook.remote_host, remote_host)
+        self.assertEqual(hook.port, 2222)
+
+    def test_copy(self):
+        """
+        Test that copies and pickles only contain the arguments of the hook, not the hook itself
+        """
+        lazy_hook = LazyFabricHook(remote_host=faker.hostname(), timeout=30)
+        lazy_hook.resolve()
+
+        for other in (copy.deepcopy(lazy_hook), pickle.loads(pickle.dumps(lazy_hook))):
+            self.assertIsNone(other._hook)
+            self.assertEqual(other.kwargs, lazy_hook.kwargs)
+            self.assertIsNot(other.resolve(), lazy_hook.resolve())
+
+        self.assertEqual(repr(lazy_hook), f"LazyFabricHook(None, remote_host={lazy_hook.kwargs['remote_host']!r}, "
+                                          f"timeout=30)")
+
+
+class PrepareFabricHookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = AirflowConnection(conn_id="target", host=faker.hostname(), login=faker.user_name(),
+                                            password=faker.password())
+
+    def test_provided_hook(self):
+        """
+        Test that the remote host and transport profile are applied to a provided hook
+        """
+        hook = FabricHook(remote_host=faker.hostname(), username=faker.user_name(), password=faker.password())
+        remote_host = faker.hostname()
+
+        self.assertIs(prepare_fabric_hook(hook, ssh_conn_id="ignored", remote_host=remote_host,
+                                          transport_profile="wan", timeout=5), hook)
+        self.assertEqual((hook.remote_host, hook.transport_profile), (remote_host, "wan"))
+
+    def test_ssh_conn_id(self):
+        """
+        Test that a hook is created from the connection id, or from a LazyFabricHook
+        """
+        remote_host = faker.hostname()
+
+        with patch.object(FabricHook, "get_connection", return_value=self.connection):
+            hook = prepare_fabric_hook(None, ssh_conn_id="target", remote_host=remote_host, timeout=5)
+            lazy_hook = prepare_fabric_hook(LazyFabricHook("target"), timeout=5)
+
+        self.assertEqual((hook.ssh_conn_id, hook.remote_host, hook.timeout), ("target", remote_host, 5))
+        self.assertEqual((lazy_hook.remote_host, lazy_hook.timeout), (self.connection.host, 5))
+
+    def test_no_hook(self):
+        with self.assertRaisesRegex(AirflowException, "Cannot operate without fabric_hook or ssh_conn_id"):
+            prepare_fabric_hook(None)
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+import paramiko
+from airflow.exceptions import AirflowException
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.fabric_key_cache import PrivateKeyCache, get_key_cache
+
+faker = Faker()
+
+
+class PrivateKeyCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rsa_key = paramiko.RSAKey.generate(1024)
+
+    def setUp(self):
+        self.cache = PrivateKeyCache()
+        fd, self.key_file = tempfile.mkstemp()
+        os.close(fd)
+        self.rsa_key.write_private_key_file(self.key_file)
+
+    def tearDown(self):
+        os.remove(self.key_file)
+
+    def test_get_from_file(self):
+        """
+        Test that a key file is parsed once and the same key object is returned afterwards
+        """
+        pkey1 = self.cache.get_from_file(self.key_file)
+        pkey2 = self.cache.get_from_file(self.key_file)
+
+        self.assertIs(pkey1, pkey2)
+        self.assertEqual(pkey1, self.rsa_key)
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 1, "size": 1})
+
+    def test_changed_file_is_reloaded(self):
+        """
+        Test that a key file is parsed again after its modification time changed
+        """
+        pkey1 = self.cache.get_from_file(self.key_file)
+        stat = os.stat(self.key_file)
+        os.utime(self.key_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        pkey2 = self.cache.get_from_file(self.key_file)
+
+        self.assertIsNot(pkey1, pkey2)
+        self.assertEqual(self.cache.stats["misses"], 2)
+
+    def test_invalid_file(self):
+        """
+        Test that a file that isn't a private key raises an `AirflowException`
+        """
+        with open(self.key_file, "w") as f:
+            f.write(faker.text())
+
+        with self.assertRaises(AirflowException):
+            self.cache.get_from_file(self.key_file)
+
+    def test_get_from_string(self):
+        """
+        Test that an inline key is parsed once per content and passphrase
+        """
+        loader = Mock(side_effect=lambda key, passphrase: Mock())
+        private_key = faker.pystr()
+
+        pkey = self.cache.get_from_string(private_key, None, loader)
+        self.assertIs(self.cache.get_from_string(private_key, None, loader), pkey)
+        self.assertIsNot(self.cache.get_from_string(private_key, "secret", loader), pkey)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_max_size(self):
+        """
+        Test that the least recently used key is dropped when the cache is full
+        """
+        self.cache.max_size = 1
+        loader = Mock(side_effect=lambda key, passphrase: Mock())
+
+        self.cache.get_from_string("key1", None, loader)
+        self.cache.get_from_string("key2", None, loader)
+        self.cache.get_from_string("key1", None, loader)
+
+        self.assertEqual(loader.call_count, 3)
+        self.assertEqual(self.cache.stats["size"], 1)
+
+    def test_fabric_hook_uses_cached_key_file(self):
+        """
+        Test that `FabricHook` passes the cached key instead of the key file name to the connection
+        """
+        get_key_cache().clear()
+        hook = FabricHook(remote_host=faker.hostname(), key_file=self.key_file)
+        conn1 = hook.get_fabric_conn()
+        conn2 = hook.get_fabric_conn()
+
+        self.assertNotIn("key_filename", conn1.connect_kwargs)
+        self.assertIs(conn1.connect_kwargs["pkey"], conn2.connect_kwargs["pkey"])
+        self.assertEqual(conn1.connect_kwargs["pkey"], self.rsa_key)
@@ -0,0 +1,180 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from faker import Faker
+from paramiko import BadHostKeyException, ECDSAKey, HostKeys, RSAKey, SSHException, Transport
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.fabric_known_hosts import KnownHostsIndex, KnownHostsPolicy, get_host_key_name
+
+faker = Faker()
+
+RSA_KEY = RSAKey.generate(1024)
+ECDSA_KEY = ECDSAKey.generate()
+OTHER_KEY = RSAKey.generate(1024)
+
+
+class KnownHostsIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.known_hosts = os.path.join(self.tmp_dir, "known_hosts")
+        self.store = os.path.join(self.tmp_dir, "store", "known_hosts_airflow")
+        self.host = faker.hostname()
+        self.write_known_hosts(f"{self.host},{faker.ipv4()} {RSA_KEY.get_name()} {RSA_KEY.get_base64()}\n")
+        self.index = KnownHostsIndex([self.known_hosts], store_path=self.store)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_known_hosts(self, *lines, mtime=None):
+        with open(self.known_hosts, "a") as f:
+            f.writelines(lines)
+        if mtime is not None:
+            os.utime(self.known_hosts, (mtime, mtime))
+
+    def test_lookup_plain(self):
+        self.assertEqual(self.index.lookup(self.host), {RSA_KEY.get_name(): RSA_KEY.get_base64()})
+        self.assertEqual(self.index.lookup(faker.hostname()), {})
+
+    def test_lookup_hashed_and_port(self):
+        name = get_host_key_name(faker.hostname(), 2222)
+        self.write_known_hosts(f"{HostKeys.hash_host(name)} {ECDSA_KEY.get_name()} {ECDSA_KEY.get_base64()}\n")
+
+        self.assertTrue(name.endswith("]:2222"))
+        self.assertEqual(self.index.lookup(name), {ECDSA_KEY.get_name(): ECDSA_KEY.get_base64()})
+
+    def test_lookup_patterns(self):
+        self.write_known_hosts(f"*.example.com,!bad.example.com {RSA_KEY.get_name()} {RSA_KEY.get_base64()}\n",
+                               "# comment\n", f"@cert-authority *.example.com {RSA_KEY.get_name()} AAAA\n")
+
+        self.assertIn(RSA_KEY.get_name(), self.index.lookup("good.example.com"))
+        self.assertEqual(self.index.lookup("bad.example.com"), {})
+
+    def test_reload_on_change(self):
+        """
+        Test that a file is only parsed again when it changed
+        """
+        self.index.lookup(self.host)
+        with patch("sai_airflow_plugins.hooks.fabric_known_hosts._KnownHostsFile.load") as load:
+            self.index.lookup(self.host)
+            load.assert_not_called()
+
+        host = faker.hostname()
+        self.write_known_hosts(f"{host} {RSA_KEY.get_name()} {RSA_KEY.get_base64()}\n", mtime=1000000)
+        self.assertIn(RSA_KEY.get_name(), self.index.lookup(host))
+
+    def test_learn(self):
+        host = faker.hostname()
+        self.index.learn(host, ECDSA_KEY)
+
+        self.assertEqual(self.index.lookup(host), {ECDSA_KEY.get_name(): ECDSA_KEY.get_base64()})
+        with open(self.store) as f:
+            self.assertTrue(f.read().startswith("|1|"))
+
+        # A new index finds the learned key in the store
+        self.assertIn(ECDSA_KEY.get_name(), KnownHostsIndex([], store_path=self.store).lookup(host))
+
+    def test_clear(self):
+        self.index.lookup(self.host)
+        os.remove(self.known_hosts)
+        self.index.clear()
+        self.assertEqual(self.index.lookup(self.host), {})
+
+
+class KnownHostsPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = faker.hostname()
+        self.index = Mock()
+        self.index.lookup.return_value = {RSA_KEY.get_name(): RSA_KEY.get_base64()}
+
+    def test_known_host(self):
+        KnownHostsPolicy(self.index, accept_unknown=False).missing_host_key(Mock(), self.host, RSA_KEY)
+
+        with self.assertRaises(BadHostKeyException):
+            KnownHostsPolicy(self.index, accept_unknown=True).missing_host_key(Mock(), self.host, OTHER_KEY)
+
+        # A known host that presents a key of an unknown type can't be verified
+        with self.assertRaises(BadHostKeyException):
+            KnownHostsPolicy(self.index, accept_unknown=True).missing_host_key(Mock(), self.host, ECDSA_KEY)
+
+    def test_unsupported_known_key_type(self):
+        """
+        Test that a mismatch is reported as an SSHException when paramiko can't parse the known key, and with a
+        parseable known key otherwise
+        """
+        self.index.lookup.return_value = {"ssh-unsupported": RSA_KEY.get_base64()}
+        with self.assertRaisesRegex(SSHException, "known key types are ssh-unsupported"):
+            KnownHostsPolicy(self.index).missing_host_key(Mock(), self.host, OTHER_KEY)
+
+        self.index.lookup.return_value = {"ssh-unsupported": RSA_KEY.get_base64(), "ssh-rsa": RSA_KEY.get_base64()}
+        with self.assertRaises(BadHostKeyException) as assertion:
+            KnownHostsPolicy(self.index).missing_host_key(Mock(), self.host, OTHER_KEY)
+        self.assertEqual(assertion.exception.expected_key, RSA_KEY)
+
+    def test_unknown_host(self):
+        self.index.lookup.return_value = {}
+
+        with self.assertRaisesRegex(SSHException, "not found in known_hosts"):
+            KnownHostsPolicy(self.index, accept_unknown=False).missing_host_key(Mock(), self.host, RSA_KEY)
+
+        KnownHostsPolicy(self.index, accept_unknown=True).missing_host_key(Mock(), self.host, RSA_KEY)
+        self.index.learn.assert_not_called()
+
+        KnownHostsPolicy(self.index, accept_unknown=True, learn=True).missing_host_key(Mock(), self.host, RSA_KEY)
+        self.index.learn.assert_called_with(self.host, RSA_KEY)
+
+    def test_prefer_known_key_types(self):
+        self.index.lookup.return_value = {"ssh-rsa": RSA_KEY.get_base64()}
+        policy = KnownHostsPolicy(self.index)
+        sock, other_sock = socket.socketpair()
+
+        try:
+            transport = policy.prefer_known_key_types(self.host)(sock)
+            self.assertEqual(transport.get_security_options().key_types[0], "ssh-rsa")
+        finally:
+            sock.close()
+            other_sock.close()
+
+        self.index.lookup.return_value = {}
+        self.assertIs(policy.prefer_known_key_types(self.host, Transport), Transport)
+
+
+class FabricHookHostKeyTest(unittest.TestCase):
+
+    def test_host_key_policy(self):
+        """
+        Test that FabricHook follows the host key semantics of SSHHook
+        """
+        hook = FabricHook(remote_host=faker.hostname(), port=2222)
+        conn = hook.get_fabric_conn()
+        self.assertIsInstance(conn.client._policy, KnownHostsPolicy)
+        self.assertTrue(conn.client._policy.accept_unknown)
+
+        hook.no_host_key_check = False
+        hook.host_key = RSA_KEY
+        conn = hook.get_fabric_conn()
+        self.assertFalse(conn.client._policy.accept_unknown)
+        self.assertTrue(conn.client.get_host_keys().check(f"[{hook.remote_host}]:2222", RSA_KEY))
+
+        hook.allow_host_key_change = True
+        self.assertNotIsInstance(hook.get_fabric_conn().client._policy, KnownHostsPolicy)
+
+    def test_no_transport_factory_support(self):
+        """
+        Test that no transport factory is passed to paramiko versions that don't support it
+        """
+        hook = FabricHook(remote_host=faker.hostname(), transport_profile="wan")
+        with patch.object(KnownHostsIndex, "lookup", return_value={"ssh-rsa": RSA_KEY.get_base64()}):
+            self.assertIn("transport_factory", hook.get_fabric_conn().connect_kwargs)
+
+            with patch("sai_airflow_plugins.hooks.fabric_hook.TRANSPORT_FACTORY_SUPPORTED", False):
+                connect_kwargs = hook.get_fabric_conn().connect_kwargs
+
+        self.assertNotIn("transport_factory", connect_kwargs)
+        self.assertTrue(connect_kwargs["compress"])
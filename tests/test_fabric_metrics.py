@@ -0,0 +1,205 @@
+import asyncio
+import io
+import json
+import threading
+import time
+import unittest
+from unittest.mock import ANY, Mock, patch
+
+from fabric import Connection
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_async import AsyncFabricRunner
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_metrics import PhaseTimer, TimedRemote
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+from tests.test_fabric_async import FakeChannel, create_conn
+from tests.test_fabric_output import FakeSessionChannel
+
+TEST_TASK_ID = "test_fabric_metrics"
+
+faker = Faker()
+
+
+class PhaseTimerTest(unittest.TestCase):
+
+    def test_phase(self):
+        timer = PhaseTimer({"host": "my.host", "conn_id": None})
+        with timer.phase("execution"):
+            time.sleep(0.01)
+        with self.assertRaises(ValueError), timer.phase("execution"):
+            raise ValueError()
+        timer.add("connection_lookup", 0.5)
+
+        self.assertEqual(timer.tags, {"host": "my.host"})
+        self.assertGreaterEqual(timer.durations["execution"], 0.01)
+        self.assertEqual(timer.durations["connection_lookup"], 0.5)
+
+    def test_connect(self):
+        """
+        Test that opening a connection is measured without changing the connection, and only when it isn't open yet
+        """
+        conn = Connection("localhost")
+        connect_kwargs = dict(conn.connect_kwargs)
+        timer = PhaseTimer()
+
+        def connect(**kwargs):
+            time.sleep(0.01)
+            conn.client.get_transport = Mock(return_value=Mock(active=True))
+
+        with patch.object(conn.client, "connect", side_effect=connect):
+            with timer.connect(conn):
+                conn.open()
+
+        self.assertEqual(list(timer.durations), ["connect"])
+        self.assertGreaterEqual(timer.durations["connect"], 0.01)
+        self.assertEqual(conn.connect_kwargs, connect_kwargs)
+        self.assertNotIn("_families_and_addresses", vars(conn.client))
+
+        # An open connection isn't measured again
+        connect = timer.durations["connect"]
+        with timer.connect(conn):
+            conn.open()
+        self.assertEqual(timer.durations, {"connect": connect})
+
+    def test_command(self):
+        """
+        Test that the marks of a command are split into the channel_open, first_byte and execution phases
+        """
+        timer = PhaseTimer()
+        with timer.command() as timing:
+            time.sleep(0.01)
+            timing.channel_opened()
+            time.sleep(0.01)
+            timing.output_received()
+            first_byte = timing.first_byte
+            timing.output_received()
+            time.sleep(0.01)
+
+        self.assertEqual(timing.first_byte, first_byte)
+        self.assertEqual(list(timer.durations), ["channel_open", "first_byte", "execution"])
+        self.assertTrue(all(seconds >= 0.01 for seconds in timer.durations.values()))
+
+        # Without marks, e.g. when Fabric's own runner drives the channel, it's all execution
+        timer = PhaseTimer()
+        with self.assertRaises(ValueError), timer.command():
+            raise ValueError()
+        self.assertEqual(list(timer.durations), ["execution"])
+
+    def test_timed_remote(self):
+        """
+        Test that the runner marks the opened channel and the first output, without touching the connection
+        """
+        conn = Connection(faker.hostname())
+        channel = FakeSessionChannel(stdout=["done\n"])
+        timer = PhaseTimer()
+
+        def create_session(self):
+            time.sleep(0.01)
+            return channel
+
+        with patch.object(Connection, "create_session", create_session), timer.command() as timing:
+            res = conn._run(TimedRemote(context=conn, inline_env=False, timing=timing), "ls", hide=True, warn=True,
+                            in_stream=False)
+
+        self.assertEqual(res.stdout, "done\n")
+        self.assertEqual(list(timer.durations), ["channel_open", "first_byte", "execution"])
+        self.assertGreaterEqual(timer.durations["channel_open"], 0.01)
+
+    def test_async_runner(self):
+        """
+        Test that the asyncio runner marks the opened channel and the first output
+        """
+        runner = AsyncFabricRunner(create_conn(FakeChannel(stdout=["done\n"])))
+        timer = PhaseTimer()
+        with timer.command() as timing:
+            asyncio.run(runner.run("ls", hide=True, timing=timing))
+
+        self.assertEqual(list(timer.durations), ["channel_open", "first_byte", "execution"])
+
+    def test_concurrent_commands(self):
+        """
+        Test that commands that run concurrently add all their phases to the same timer
+        """
+        timer = PhaseTimer()
+
+        def run():
+            with timer.command() as timing:
+                timing.channel_opened()
+
+        threads = [threading.Thread(target=run) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(set(timer.durations), {"channel_open", "execution"})
+
+    def test_emit(self):
+        timer = PhaseTimer({"host": "my.host", "conn_id": "ssh_default"})
+        timer.add("execution", 0.25)
+        timer.add("connection_lookup", 0.5)
+
+        with patch("sai_airflow_plugins.hooks.fabric_metrics.Stats") as stats, \
+                self.assertLogs(timer.log, level="INFO") as logs:
+            timer.emit()
+
+        stats.timing.assert_any_call("sai_airflow_plugins.fabric.execution", ANY,
+                                     tags={"host": "my.host", "conn_id": "ssh_default"})
+        self.assertEqual(stats.timing.call_count, 2)
+        summary = json.loads(logs.output[0].split("Fabric phase timings: ", 1)[1])
+        self.assertEqual(summary, {"host": "my.host", "conn_id": "ssh_default", "total": 0.75,
+                                   "phases": {"connection_lookup": 0.5, "execution": 0.25}})
+        self.assertEqual(list(summary["phases"]), ["connection_lookup", "execution"])
+
+
+class FabricOperatorMetricsTest(unittest.TestCase):
+
+    def test_execute_fabric_command(self):
+        """
+        Test that the phases of a command are emitted once per execution, with the host as tag
+        """
+        hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(), password=faker.password())
+        get_connection_pool().close_all()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=hook, command="ls")
+
+        with patch("sai_airflow_plugins.hooks.fabric_metrics.Stats") as stats:
+            op.execute_fabric_command()
+
+        phases = {call.args[0].rsplit(".", 1)[1] for call in stats.timing.call_args_list}
+        self.assertEqual(phases, {"connection_lookup", "execution", "output_handling"})
+        self.assertEqual(stats.timing.call_args.kwargs["tags"], {"host": hook.remote_host})
+
+    def test_own_runner(self):
+        """
+        Test that a command with its own runner also has the channel_open and first_byte phases
+        """
+        hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(), password=faker.password())
+        get_connection_pool().close_all()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=hook, command="ls", max_output_memory=1000)
+        channel = FakeSessionChannel(stdout=["done\n"])
+
+        with patch("sai_airflow_plugins.hooks.fabric_metrics.Stats") as stats, \
+                patch.object(Connection, "create_session", return_value=channel), patch("sys.stdin", io.StringIO()):
+            op.execute_fabric_command()
+
+        phases = {call.args[0].rsplit(".", 1)[1] for call in stats.timing.call_args_list}
+        self.assertEqual(phases, {"connection_lookup", "channel_open", "first_byte", "execution", "output_handling"})
+
+    def test_parallel_commands(self):
+        """
+        Test that the phases of parallel commands are emitted once, with the run time of all commands as execution
+        """
+        hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(), password=faker.password())
+        get_connection_pool().close_all()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=hook, parallel_commands=["ls", "pwd"])
+
+        with patch("sai_airflow_plugins.hooks.fabric_metrics.Stats") as stats, \
+                patch("sai_airflow_plugins.hooks.fabric_metrics.PhaseTimer.add",
+                      autospec=True, side_effect=PhaseTimer.add) as add:
+            op.execute_parallel_fabric_commands()
+
+        phases = {call.args[0].rsplit(".", 1)[1] for call in stats.timing.call_args_list}
+        self.assertEqual(phases, {"connection_lookup", "execution"})
+        self.assertEqual(len([call for call in add.call_args_list if call.args[1] == "execution"]), 2)
@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException
+from airflow.models import Connection
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook, LazyFabricHook
+from sai_airflow_plugins.operators.fabric_multi_host_operator import FabricMultiHostOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+
+TEST_TASK_ID = "test_fabric_multi_host_operator"
+
+faker = Faker()
+
+
+class FailingHostsFabricHook(MockedFabricHook):
+    """
+    Mocked hook that exits with code 1 on hosts whose name starts with "fail"
+    """
+    def get_fabric_conn(self):
+        self.exit_code = 1 if self.remote_host.startswith("fail") else 0
+        return super().get_fabric_conn()
+
+
+class FabricMultiHostOperatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = FailingHostsFabricHook(
+            remote_host=faker.hostname(),
+            username=faker.user_name(),
+            password=faker.password()
+        )
+        self.task_inst = Mock()
+        get_connection_pool().close_all()
+
+    def test_all_hosts(self):
+        """
+        Test that the command runs on every host and a summary per host is returned
+        """
+        hosts = [faker.unique.hostname() for _ in range(5)]
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", hosts=hosts,
+                                     max_concurrency=2, xcom_push_key="test_xcom")
+        summary = op.execute(context={"task_instance": self.task_inst})
+
+        self.assertEqual(list(summary.keys()), hosts)
+        self.assertTrue(all(host_summary["exited"] == 0 for host_summary in summary.values()))
+        self.task_inst.xcom_push.assert_called_with("test_xcom", {host: self.hook.stdout for host in hosts})
+        self.assertEqual(get_connection_pool().stats, {"idle": 5, "in_use": 0})
+
+    def test_failure_threshold_stops_batches(self):
+        """
+        Test that no new batch is started after the failure threshold has been exceeded
+        """
+        hosts = ["fail1", "ok1", "ok2", "ok3"]
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", hosts=hosts,
+                                     batch_size=2)
+
+        with self.assertRaises(AirflowException):
+            op.execute(context={"task_instance": self.task_inst})
+
+        key, summary = self.task_inst.xcom_push.call_args[0]
+        self.assertEqual(key, "return_value")
+        self.assertEqual(list(summary.keys()), ["fail1", "ok1"])
+        self.assertEqual(summary["fail1"]["exited"], 1)
+
+    def test_failure_threshold_fraction(self):
+        """
+        Test that failures within a fractional threshold don't fail the task
+        """
+        hosts = ["fail1", "ok1", "ok2", "ok3"]
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", hosts=hosts,
+                                     batch_size=2, failure_threshold=0.25)
+        summary = op.execute(context={"task_instance": self.task_inst})
+
+        self.assertEqual(len(summary), 4)
+
+    def test_host_group(self):
+        """
+        Test that hosts are taken from the host group in the connection extras and combined with `hosts`
+        """
+        conn = Connection(conn_id="test", extra='{"host_groups": {"web": ["web1", "web2"], "db": "db1,db2"}}')
+        self.hook.ssh_conn_id = "test"
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", hosts=["web1"],
+                                     host_group="web")
+
+        with patch.object(FabricHook, "get_connection", return_value=conn):
+            self.assertEqual(op.get_hosts(), ["web1", "web2"])
+            op.host_group = "db"
+            self.assertEqual(op.get_hosts(), ["web1", "db1", "db2"])
+            op.host_group = "unknown"
+            with self.assertRaises(AirflowException):
+                op.get_hosts()
+
+    def test_host_group_lazy_fabric_hook(self):
+        """
+        Test that the host group is taken from the connection of a lazy hook, without resolving the hook
+        """
+        conn = Connection(conn_id="test", extra='{"host_groups": {"web": ["web1", "web2"]}}')
+        hook = LazyFabricHook("test", hook_class=FailingHostsFabricHook)
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=hook, command="ls", host_group="web")
+
+        with patch.object(FabricHook, "get_connection", return_value=conn):
+            self.assertEqual(op.get_hosts(), ["web1", "web2"])
+        self.assertIsNone(hook._hook)
+
+    def test_hosts_string(self):
+        """
+        Test that a string of comma-separated hosts, e.g. rendered from a template, is split into hosts
+        """
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls",
+                                     hosts="web1, web2,db1")
+
+        self.assertEqual(op.get_hosts(), ["web1", "web2", "db1"])
+
+    def test_check_freshness(self):
+        """
+        Test that check_freshness isn't silently ignored
+        """
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", hosts=["h1"],
+                                     check_freshness=True)
+
+        with self.assertRaisesRegex(AirflowException, "Cannot use check_freshness"):
+            op.execute(context={"task_instance": self.task_inst})
+
+    def test_host_error_in_summary(self):
+        """
+        Test that an exception on a host is included in the summary and counts as a failure
+        """
+        op = FabricMultiHostOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", hosts=["h1", "h2"],
+                                     failure_threshold=1)
+        with patch.object(op, "get_host_hook", side_effect=lambda host: self.hook if host == "h1" else None):
+            summary = op.execute(context={"task_instance": self.task_inst})
+
+        self.assertEqual(summary["h1"]["exited"], 0)
+        self.assertIsNone(summary["h2"]["exited"])
+        self.assertIn("error", summary["h2"])
+
+    def test_lazy_fabric_hook(self):
+        """
+        Test that a lazy hook for a connection without a host is resolved with the first host
+        """
+        connection = Connection(conn_id="group", login=faker.user_name(), password=faker.password())
+        hosts = [faker.unique.hostname() for _ in range(3)]
+
+        with patch.object(FabricHook, "get_connection", return_value=connection):
+            op = FabricMultiHostOperator(task_id=TEST_TASK_ID, command="ls", hosts=hosts,
+                                         fabric_hook=LazyFabricHook("group", hook_class=FailingHostsFabricHook))
+            summary = op.execute(context={"task_instance": self.task_inst})
+
+        self.assertIsInstance(op.fabric_hook, FailingHostsFabricHook)
+        self.assertEqual(op.fabric_hook.remote_host, hosts[0])
+        self.assertEqual(list(summary.keys()), hosts)
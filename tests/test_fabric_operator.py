@@ -1,10 +1,13 @@
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from airflow.exceptions import AirflowException
+from airflow.models import Connection as AirflowConnection
 from faker import Faker
 from invoke import Responder
 
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook, LazyFabricHook
 from sai_airflow_plugins.operators.fabric_operator import FabricOperator
 from tests.mocked_fabric_hook import MockedFabricHook
 
@@ -21,6 +24,7 @@ class FabricOperatorTest(unittest.TestCase):
             username=faker.user_name(),
             password=faker.password()
         )
+        get_connection_pool().close_all()
 
     def test_ssh_conn_id_or_fabric_hook_required(self):
         """
@@ -143,6 +147,25 @@ class FabricOperatorTest(unittest.TestCase):
 
         self.assertEqual(res.conn.host, remote_host)
 
+    def test_lazy_fabric_hook(self):
+        """
+        Test that a lazy hook doesn't read the connection when the operator is created, and is resolved on execute
+        """
+        connection = AirflowConnection(conn_id="target", login=faker.user_name(), password=faker.password())
+        remote_host = faker.hostname()
+
+        with patch.object(FabricHook, "get_connection", return_value=connection) as get_connection:
+            op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=LazyFabricHook("target", hook_class=MockedFabricHook),
+                                command="ls", remote_host=remote_host)
+            get_connection.assert_not_called()
+
+            res = op.execute_fabric_command()
+
+        get_connection.assert_called_with("target")
+        self.assertIsInstance(op.fabric_hook, MockedFabricHook)
+        self.assertEqual(res.conn.host, remote_host)
+        self.assertEqual(res.conn.user, connection.login)
+
     def test_watcher(self):
         """
         Test that a watcher dict is converted correctly into the specified Watcher object
@@ -223,3 +246,97 @@ class FabricOperatorTest(unittest.TestCase):
 
         res.conn.open.assert_called()
         res.conn.transport.set_keepalive.assert_called_with(60)
+
+    def test_connection_pool_reuse(self):
+        """
+        Test that the connection is returned to the pool after the command and reused by the next execution
+        """
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls")
+        res1 = op.execute_fabric_command()
+        res2 = op.execute_fabric_command()
+
+        self.assertIs(res1.conn, res2.conn)
+        self.assertEqual(get_connection_pool().stats, {"idle": 1, "in_use": 0})
+
+    def test_without_connection_pool(self):
+        """
+        Test that a new connection is used and closed afterwards if `use_connection_pool` is False
+        """
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", use_connection_pool=False)
+        with patch("fabric.Connection.close") as mock_close:
+            res1 = op.execute_fabric_command()
+            res2 = op.execute_fabric_command()
+
+        self.assertIsNot(res1.conn, res2.conn)
+        self.assertEqual(mock_close.call_count, 2)
+        self.assertEqual(get_connection_pool().stats, {"idle": 0, "in_use": 0})
+
+    def test_parallel_commands(self):
+        """
+        Test that `parallel_commands` runs every command on the same connection and pushes the results to an XCom
+        """
+        task_inst = Mock()
+        commands = ["ls", "pwd", "whoami"]
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, parallel_commands=commands,
+                            xcom_push_key="test_xcom", strip_stdout=True)
+        self.assertTrue(op.execute(context={"task_instance": task_inst}))
+
+        key, results = task_inst.xcom_push.call_args[0]
+        self.assertEqual(key, "test_xcom")
+        self.assertEqual([res["command"] for res in results], commands)
+        self.assertEqual([res["stdout"] for res in results], [self.hook.stdout.strip()] * 3)
+        self.assertEqual(get_connection_pool().stats, {"idle": 1, "in_use": 0})
+
+    def test_parallel_commands_failure(self):
+        """
+        Test that the task fails if one of the `parallel_commands` exits with a non-zero code, and that pty is refused
+        """
+        self.hook.exit_code = 1
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, parallel_commands=["ls", "pwd"])
+        with self.assertRaises(AirflowException):
+            op.execute(context={})
+
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, parallel_commands=["ls"], get_pty=True)
+        with self.assertRaises(AirflowException):
+            op.execute_parallel_fabric_commands()
+
+    def test_command_list(self):
+        """
+        Test that a list of commands is executed in order on the same connection and the results are pushed to an XCom
+        """
+        task_inst = Mock()
+        commands = ["ls", "pwd", "whoami"]
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=commands, xcom_push_key="test_xcom",
+                            strip_stdout=True)
+        with patch.object(op, "run_fabric_command", wraps=op.run_fabric_command) as run:
+            self.assertTrue(op.execute(context={"task_instance": task_inst}))
+
+        self.assertEqual([call.args[1] for call in run.call_args_list], commands)
+        self.assertEqual(len({id(call.args[0]) for call in run.call_args_list}), 1)
+        self.assertEqual(get_connection_pool().stats, {"idle": 1, "in_use": 0})
+
+        key, results = task_inst.xcom_push.call_args[0]
+        self.assertEqual(key, "test_xcom")
+        self.assertEqual([sorted(res) for res in results], [["duration", "exited", "stdout"]] * 3)
+        self.assertEqual([res["stdout"] for res in results], [self.hook.stdout.strip()] * 3)
+
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=commands, xcom_push_key="test_xcom",
+                            xcom_include_stdout=False)
+        op.execute(context={"task_instance": task_inst})
+        self.assertEqual([sorted(res) for res in task_inst.xcom_push.call_args[0][1]], [["duration", "exited"]] * 3)
+
+    def test_command_list_failure(self):
+        """
+        Test that the remaining commands are skipped after a failure, unless `stop_on_failure` is False
+        """
+        for stop_on_failure, executed in ((True, 2), (False, 3)):
+            task_inst = Mock()
+            op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=["ls", "false", "pwd"],
+                                stop_on_failure=stop_on_failure, xcom_push_key="test_xcom")
+            results = [Mock(exited=0, stdout="a"), Mock(exited=1, stdout="b"), Mock(exited=0, stdout="c")]
+            with patch.object(FabricOperator, "run_fabric_command", side_effect=results) as run:
+                with self.assertRaisesRegex(AirflowException, "1 of 3 commands"):
+                    op.execute(context={"task_instance": task_inst})
+
+            self.assertEqual(run.call_count, executed)
+            self.assertEqual([res["exited"] for res in task_inst.xcom_push.call_args[0][1]], [0, 1, 0][:executed])
@@ -0,0 +1,177 @@
+import asyncio
+import io
+import unittest
+from unittest.mock import Mock, patch
+
+from faker import Faker
+from fabric import Connection
+from invoke import Responder, StreamWatcher
+
+from sai_airflow_plugins.hooks.fabric_async import AsyncFabricRunner
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_output import CapturedResult, CapturingRemote, OutputCapture
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+from tests.test_fabric_async import FakeChannel, create_conn
+
+TEST_TASK_ID = "test_fabric_output"
+
+faker = Faker()
+
+
+class FakeSessionChannel(FakeChannel):
+    """
+    Fake channel with the blocking interface that Fabric's runner uses
+    """
+
+    def recv(self, nbytes):
+        return self.stdout.pop(0) if self.stdout else b""
+
+    def recv_stderr(self, nbytes):
+        return self.stderr.pop(0) if self.stderr else b""
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def shutdown_write(self):
+        pass
+
+
+class OutputCaptureTest(unittest.TestCase):
+
+    def test_in_memory(self):
+        capture = OutputCapture(max_memory=100, window_size=4)
+        for text in ("hello ", "world", ""):
+            capture.append(text)
+
+        self.assertFalse(capture.spilled)
+        self.assertEqual(capture.size, 11)
+        self.assertEqual(capture.head, "hell")
+        self.assertEqual(capture.tail, "orld")
+        self.assertEqual(capture.summary(), "hello world")
+        self.assertEqual("".join(capture.chunks()), "hello world")
+
+    def test_spill(self):
+        chunks = [faker.pystr(min_chars=1, max_chars=50) for _ in range(100)]
+        output = "".join(chunks)
+        capture = OutputCapture(max_memory=200, window_size=30)
+        for chunk in chunks:
+            capture.append(chunk)
+
+        self.assertTrue(capture.spilled)
+        self.assertEqual(capture._parts, [])
+        self.assertEqual(capture.head, output[:30])
+        self.assertEqual(capture.tail, output[-30:])
+        self.assertEqual(capture.summary(),
+                         f"{output[:30]}\n[... {len(output) - 60} characters omitted ...]\n{output[-30:]}")
+
+        # The full output can be read more than once, and more output can be added afterwards
+        self.assertEqual("".join(capture.chunks(chunk_size=64)), output)
+        capture.append("end")
+        self.assertEqual("".join(capture.chunks()), output + "end")
+
+        capture.close()
+        self.assertFalse(capture.spilled)
+
+    def test_spill_overlapping_head_and_tail(self):
+        capture = OutputCapture(max_memory=5, window_size=4)
+        capture.append("abcdef")
+
+        self.assertTrue(capture.spilled)
+        self.assertEqual(capture.summary(), "abcdef")
+
+    def test_window_watchers(self):
+        """
+        Test that watchers respond to output in the window exactly once, also when the output is longer than the window
+        """
+        capture = OutputCapture(max_memory=100, window_size=20)
+        responder = Responder(pattern=r"Continue\?", response="yes\n")
+        responses = []
+
+        for text in ["x" * 50, "Continue?"] + ["y" * 15] * 10 + ["Continue?"]:
+            capture.append(text)
+            responses.extend(capture.respond([responder]))
+
+        self.assertEqual(responses, ["yes\n", "yes\n"])
+        self.assertEqual(responder.index, len(capture.tail))
+
+    def test_respond_plain_tail(self):
+        """
+        Test that watchers are given the tail itself, a plain string whose length matches its content
+        """
+        capture = OutputCapture(max_memory=100, window_size=20)
+        watcher = Mock(spec=StreamWatcher)
+        watcher.submit.return_value = []
+
+        for text in ["x" * 50, "Continue?"]:
+            capture.append(text)
+            list(capture.respond([watcher]))
+
+        stream = watcher.submit.call_args[0][0]
+        self.assertIs(type(stream), str)
+        self.assertEqual(stream, capture.tail)
+        self.assertEqual(len(stream), 20)
+
+
+class CapturingRemoteTest(unittest.TestCase):
+
+    def test_run(self):
+        """
+        Test that the runner captures the output within its budget, lets watchers respond and returns a CapturedResult
+        """
+        stdout = ["a" * 50, "Continue?", "b" * 100, "end\n"]
+        channel = FakeSessionChannel(stdout=stdout, stderr=["warning\n"], exit_code=3)
+        conn = Connection(faker.hostname())
+        runner = CapturingRemote(context=conn, inline_env=False, max_memory=64, window_size=20)
+
+        with patch.object(Connection, "create_session", return_value=channel):
+            res = conn._run(runner, "my command", hide=True, warn=True, in_stream=False,
+                            watchers=[Responder(pattern=r"Continue\?", response="yes\n")])
+
+        self.assertIsInstance(res, CapturedResult)
+        self.assertIs(res.connection, conn)
+        self.assertEqual(res.exited, 3)
+        self.assertTrue(res.spilled)
+        self.assertEqual(res.stdout, f"{'a' * 20}\n[... 123 characters omitted ...]\n{'b' * 16}end\n")
+        self.assertEqual("".join(res.stdout_capture.chunks()), "".join(stdout))
+        self.assertEqual(res.stderr, "warning\n")
+        self.assertEqual(channel.sent, ["yes\n"])
+
+
+class AsyncOutputCaptureTest(unittest.TestCase):
+
+    def test_run(self):
+        channel = FakeChannel(stdout=["a" * 30, "b" * 30], stderr=["warning\n"])
+        res = asyncio.run(AsyncFabricRunner(create_conn(channel)).run("ls", hide=True, max_output_memory=40,
+                                                                      output_window_size=10))
+
+        self.assertIsInstance(res, CapturedResult)
+        self.assertEqual(res.stdout, f"{'a' * 10}\n[... 40 characters omitted ...]\n{'b' * 10}")
+        self.assertEqual(res.stderr, "warning\n")
+
+
+class FabricOperatorOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(),
+                                     password=faker.password())
+        get_connection_pool().close_all()
+
+    def test_max_output_memory(self):
+        """
+        Test that the operator pushes the head and tail of stdout to an XCom when the output exceeds its budget
+        """
+        channel = FakeSessionChannel(stdout=["  start", "x" * 1000, "end  \n"])
+        task_inst = Mock()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", xcom_push_key="test_xcom",
+                            strip_stdout=True, max_output_memory=100, output_window_size=8)
+
+        with patch.object(Connection, "create_session", return_value=channel), patch("sys.stdin", io.StringIO()), \
+                patch.object(CapturedResult, "close", autospec=True, side_effect=CapturedResult.close) as close:
+            self.assertTrue(op.execute(context={"task_instance": task_inst}))
+
+        task_inst.xcom_push.assert_called_with("test_xcom", "startx\n[... 997 characters omitted ...]\nxxend")
+        # The spill file is removed once the XCom value has been extracted
+        close.assert_called_once()
+        self.assertFalse(close.call_args[0][0].spilled)
@@ -0,0 +1,181 @@
+import asyncio
+import io
+import os
+import subprocess
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from fabric import Connection
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_async import AsyncFabricRunner
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_output import CapturedResult, CapturingRemote
+from sai_airflow_plugins.hooks.fabric_process import RemoteProcessGroup, TrackedRemote
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator, get_runner_class
+from tests.mocked_fabric_hook import MockedFabricHook
+from tests.test_fabric_async import FakeChannel, create_conn
+from tests.test_fabric_output import FakeSessionChannel
+from tests.test_fabric_sync import LocalConnection
+
+TEST_TASK_ID = "test_fabric_process"
+
+faker = Faker()
+
+
+class RemoteProcessGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.process = RemoteProcessGroup()
+        self.conn = LocalConnection()
+
+    def tearDown(self):
+        if os.path.exists(self.process.pid_file):
+            os.remove(self.process.pid_file)
+
+    def start(self, command):
+        """
+        Starts a wrapped command in a new session, like an SSH server does, and waits until its pid file exists. The
+        process is reaped as soon as it exits, like an SSH server does, so it doesn't linger as a zombie.
+        """
+        proc = subprocess.Popen(["/bin/sh", "-c", self.process.wrap(command)], start_new_session=True)
+        threading.Thread(target=proc.wait, daemon=True).start()
+        for _ in range(100):
+            if os.path.exists(self.process.pid_file) and os.path.getsize(self.process.pid_file):
+                break
+            time.sleep(0.05)
+        return proc
+
+    def assertGroupGone(self, pgid):
+        for _ in range(100):
+            try:
+                os.killpg(pgid, 0)
+            except ProcessLookupError:
+                return
+            time.sleep(0.05)
+        self.fail(f"Process group {pgid} is still running")
+
+    def test_terminate(self):
+        """
+        Test that the command and its children are terminated, and the pid file is removed
+        """
+        proc = self.start("sleep 60 & sleep 60")
+        with open(self.process.pid_file) as f:
+            self.assertEqual(int(f.read()), proc.pid)
+
+        res = self.process.terminate(self.conn, grace_period=5)
+
+        self.assertEqual(res.stdout.strip(), "terminated")
+        proc.wait(timeout=10)
+        self.assertGroupGone(proc.pid)
+        self.assertFalse(os.path.exists(self.process.pid_file))
+
+    def test_kill_after_grace_period(self):
+        """
+        Test that processes that ignore SIGTERM are killed after the grace period
+        """
+        proc = self.start("trap '' TERM; sleep 60")
+
+        res = self.process.terminate(self.conn, grace_period=1)
+
+        self.assertEqual(res.stdout.strip(), "killed")
+        proc.wait(timeout=10)
+        self.assertGroupGone(proc.pid)
+
+    def test_finished(self):
+        """
+        Test that the pid file is removed when the command finishes, and nothing is killed afterwards
+        """
+        subprocess.run(["/bin/sh", "-c", self.process.wrap("true")], start_new_session=True, check=True)
+
+        self.assertFalse(os.path.exists(self.process.pid_file))
+        self.assertEqual(self.process.terminate(self.conn).stdout, "")
+
+    def test_terminate_with_sudo(self):
+        conn = Mock()
+        self.process.terminate(conn, sudo=True, password="secret")
+        self.assertTrue(conn.sudo.call_args[0][0].startswith("sh -c "))
+        self.assertEqual(conn.sudo.call_args[1]["password"], "secret")
+
+
+class TrackedRemoteTest(unittest.TestCase):
+
+    def test_run(self):
+        process = RemoteProcessGroup()
+        conn = Connection(faker.hostname())
+        channel = FakeSessionChannel(stdout=["done\n"])
+
+        with patch.object(Connection, "create_session", return_value=channel):
+            res = conn._run(TrackedRemote(context=conn, inline_env=False, process=process), "ls", hide=True,
+                            warn=True, in_stream=False)
+
+        self.assertEqual(channel.command, process.wrap("ls"))
+        self.assertEqual(res.command, "ls")
+        self.assertEqual(res.stdout, "done\n")
+
+    def test_sudo(self):
+        """
+        Test that a sudo command is wrapped before sudo
+        """
+        process = RemoteProcessGroup()
+        conn = Connection(faker.hostname())
+        channel = FakeSessionChannel()
+        runner_class = get_runner_class((TrackedRemote, CapturingRemote))
+        runner = runner_class(context=conn, inline_env=False, process=process, max_memory=100)
+
+        with patch.object(Connection, "create_session", return_value=channel):
+            res = conn._sudo(runner, "ls", hide=True, warn=True, in_stream=False, password="secret")
+
+        self.assertIsInstance(res, CapturedResult)
+        self.assertTrue(channel.command.startswith(process.wrap("sudo ")))
+
+    def test_async(self):
+        process = RemoteProcessGroup()
+        channel = FakeChannel(stdout=["done\n"])
+
+        res = asyncio.run(AsyncFabricRunner(create_conn(channel)).run("ls", hide=True, process=process))
+
+        self.assertEqual(channel.command, process.wrap("ls"))
+        self.assertEqual(res.stdout, "done\n")
+
+
+class FabricOperatorKillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(),
+                                     password=faker.password())
+        get_connection_pool().close_all()
+
+    def test_track_remote_process(self):
+        """
+        Test that the process group is tracked while the command runs, and terminated on kill
+        """
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", track_remote_process=True,
+                            use_sudo_shell=True, kill_grace_period=3)
+        tracked = []
+
+        def run(conn, runner, **kwargs):
+            tracked.extend(op._remote_processes.items())
+            op.on_kill()
+            return Mock(exited=0, stdout="")
+
+        with patch.object(Connection, "_run", side_effect=run, autospec=True) as conn_run, \
+                patch.object(RemoteProcessGroup, "terminate", return_value=Mock(stdout="terminated\n")) as terminate, \
+                patch("sys.stdin", io.StringIO()):
+            self.assertTrue(op.execute(context={}))
+
+        runner = conn_run.call_args[0][1]
+        self.assertIsInstance(runner, TrackedRemote)
+        self.assertEqual(len(tracked), 1)
+        self.assertIs(tracked[0][0], runner.process)
+        terminate.assert_called_once_with(tracked[0][1], grace_period=3, sudo=True, password=self.hook.password)
+        self.assertEqual(op._remote_processes, {})
+        # The connection is discarded on kill, and not released again by the interrupted execution
+        self.assertEqual(get_connection_pool().stats, {"idle": 0, "in_use": 0})
+        self.assertEqual(op._released_on_kill, {})
+
+    def test_on_kill_without_command(self):
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", track_remote_process=True)
+        op.on_kill()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_script_cache import RemoteScriptCache
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+from tests.test_fabric_sync import LocalConnection
+
+TEST_TASK_ID = "test_fabric_script_cache"
+
+faker = Faker()
+
+
+class RemoteScriptCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "scripts")
+        self.conn = LocalConnection()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def cached_scripts(self):
+        return sorted(name for name in os.listdir(self.cache_dir) if name.endswith(".sh"))
+
+    def test_upload(self):
+        """
+        Test that a script is uploaded once and can be executed by its path
+        """
+        script = "#!/bin/sh\necho \"hello $1\"\n"
+        cache = RemoteScriptCache(self.conn, cache_dir=self.cache_dir)
+
+        path = cache.upload(script)
+
+        self.assertEqual(path, cache.get_path(script))
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_dir).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+        self.assertEqual(subprocess.check_output([path, "world"]), b"hello world\n")
+
+        os.utime(path, (1000000, 1000000))
+        opened = self.conn.sftp_client.opened
+        self.assertEqual(cache.upload(script), path)
+        self.assertEqual(self.conn.sftp_client.opened, opened)
+        self.assertGreater(os.stat(path).st_mtime, 1000000)
+        self.assertEqual(self.cached_scripts(), [os.path.basename(path)])
+
+    def test_garbage_collection_by_count(self):
+        cache = RemoteScriptCache(self.conn, cache_dir=self.cache_dir, max_age=None, max_count=3)
+        paths = []
+        for i in range(5):
+            paths.append(cache.upload(f"echo {i}\n"))
+            os.utime(paths[-1], (time.time() - 7200 + i, time.time() - 7200 + i))
+
+        self.assertEqual(self.cached_scripts(), sorted(os.path.basename(path) for path in paths[-3:]))
+
+    def test_garbage_collection_keeps_recent(self):
+        """
+        Test that a script above the count isn't removed if it was used recently, e.g. by a concurrent task that is
+        about to execute it
+        """
+        cache = RemoteScriptCache(self.conn, cache_dir=self.cache_dir, max_age=None, max_count=1, min_age=3600)
+        used_path = cache.upload("echo used\n")
+        os.utime(used_path, (time.time() - 60, time.time() - 60))
+
+        new_path = cache.upload("echo new\n")
+        self.assertEqual(self.cached_scripts(), sorted(os.path.basename(path) for path in [used_path, new_path]))
+
+        os.utime(used_path, (time.time() - 7200, time.time() - 7200))
+        newer_path = cache.upload("echo newer\n")
+        self.assertEqual(self.cached_scripts(), sorted(os.path.basename(path) for path in [new_path, newer_path]))
+
+    def test_garbage_collection_by_age(self):
+        cache = RemoteScriptCache(self.conn, cache_dir=self.cache_dir, max_age=3600, max_count=None)
+        old_path = cache.upload("echo old\n")
+        os.utime(old_path, (time.time() - 7200, time.time() - 7200))
+        leftover = os.path.join(self.cache_dir, ".leftover.tmp")
+        open(leftover, "w").close()
+        os.utime(leftover, (time.time() - 7200, time.time() - 7200))
+
+        new_path = cache.upload("echo new\n")
+
+        self.assertEqual(self.cached_scripts(), [os.path.basename(new_path)])
+        self.assertFalse(os.path.exists(leftover))
+
+
+class FabricOperatorScriptCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(),
+                                     password=faker.password())
+
+    def test_get_command(self):
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls")
+        self.assertEqual(op.get_command(script_path=".cache/a b.sh"), "'./.cache/a b.sh'")
+        self.assertEqual(op.get_command(script_path="/tmp/a.sh"), "/tmp/a.sh")
+
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", use_sudo_shell=True,
+                            sudo_user="admin")
+        self.assertEqual(op.get_command(script_path="/tmp/a.sh"), "sudo -su admin -- < /tmp/a.sh")
+
+    def test_cache_script(self):
+        """
+        Test that the command is executed by its path in the script cache
+        """
+        command = faker.text()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=command, cache_script=True)
+
+        with patch("sai_airflow_plugins.operators.fabric_operator.RemoteScriptCache.upload",
+                   return_value="/tmp/script.sh") as upload:
+            res = op.execute_fabric_command()
+
+        upload.assert_called_with(command)
+        res.conn.run.assert_called_with(command="/tmp/script.sh", pty=False, env={}, watchers=[], warn=True)
@@ -1,8 +1,17 @@
+import os
+import stat
+import subprocess
+import tempfile
+import threading
 import unittest
+from unittest.mock import Mock, patch
 
+from airflow.exceptions import AirflowException, AirflowSensorTimeout, AirflowSkipException
+from fabric import Connection
 from faker import Faker
 
-from sai_airflow_plugins.sensors.fabric_sensor import FabricSensor
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.sensors.fabric_sensor import REMOTE_POLLING_TIMEOUT, FabricSensor, get_polling_command
 from tests.mocked_fabric_hook import MockedFabricHook
 
 TEST_TASK_ID = "test_fabric_sensor"
@@ -18,6 +27,7 @@ class FabricSensorTest(unittest.TestCase):
             username=faker.user_name(),
             password=faker.password()
         )
+        get_connection_pool().close_all()
 
     def test_fabric_sensor_with_zero_exit_code(self):
         """
@@ -33,3 +43,194 @@ class FabricSensorTest(unittest.TestCase):
         self.hook.exit_code = faker.pyint(min_value=1)
         op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls")
         self.assertFalse(op.poke(context={}))
+
+    def test_fabric_sensor_with_command_list(self):
+        """
+        Test that poke only returns True if all commands of a list exit with a zero exit code
+        """
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=["ls", "pwd"])
+        self.assertTrue(op.poke(context={}))
+
+        get_connection_pool().close_all()
+        self.hook.exit_code = faker.pyint(min_value=1)
+        self.assertFalse(op.poke(context={}))
+
+    def test_keep_connection(self):
+        """
+        Test that all pokes of an execution use the same connection, which is released afterwards
+        """
+        self.hook.exit_code = faker.pyint(min_value=1)
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", poke_interval=0.01, timeout=0.1)
+
+        with patch.object(self.hook, "get_fabric_conn", wraps=self.hook.get_fabric_conn) as get_fabric_conn, \
+                patch.object(get_connection_pool(), "release", wraps=get_connection_pool().release) as release:
+            with self.assertRaises(AirflowSensorTimeout):
+                op.execute(context={})
+
+        self.assertEqual(get_fabric_conn.call_count, 1)
+        self.assertEqual(release.call_count, 1)
+        self.assertGreater(release.call_args[0][0].run.call_count, 1)
+        self.assertIsNone(op._sensor_conn)
+
+    def test_without_keep_connection(self):
+        """
+        Test that every poke acquires its own connection if keep_connection is False
+        """
+        self.hook.exit_code = faker.pyint(min_value=1)
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", poke_interval=0.01, timeout=0.1,
+                          keep_connection=False, use_connection_pool=False)
+
+        with patch.object(self.hook, "get_fabric_conn", wraps=self.hook.get_fabric_conn) as get_fabric_conn:
+            with self.assertRaises(AirflowSensorTimeout):
+                op.execute(context={})
+
+        self.assertGreater(get_fabric_conn.call_count, 1)
+
+    def test_reconnect_after_lost_connection(self):
+        """
+        Test that a connection that was lost between pokes is replaced
+        """
+        conns = []
+
+        def get_fabric_conn():
+            conn = MockedFabricHook.get_fabric_conn(self.hook)
+            conns.append(conn)
+            # The first poke fails, after which its connection is lost
+            conn.transport.active = len(conns) > 1
+            self.hook.exit_code = 0
+            return conn
+
+        self.hook.exit_code = 1
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", poke_interval=0.01, timeout=5)
+
+        with patch.object(self.hook, "get_fabric_conn", side_effect=get_fabric_conn):
+            op.execute(context={})
+
+        self.assertEqual(len(conns), 2)
+        self.assertEqual(conns[0].run.call_count, 1)
+        self.assertEqual(conns[1].run.call_count, 1)
+
+    def test_retry_on_new_connection(self):
+        """
+        Test that a poke that fails on the connection kept from the previous poke is retried on a new connection
+        """
+        conns = []
+
+        def get_fabric_conn():
+            conn = MockedFabricHook.get_fabric_conn(self.hook)
+            if not conns:
+                conn.run.side_effect = [conn.run.return_value, EOFError("Connection reset")]
+            conns.append(conn)
+            self.hook.exit_code = 0
+            return conn
+
+        self.hook.exit_code = 1
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", poke_interval=0.01, timeout=5)
+
+        with patch.object(self.hook, "get_fabric_conn", side_effect=get_fabric_conn):
+            op.execute(context={})
+
+        self.assertEqual(len(conns), 2)
+        self.assertEqual(conns[0].run.call_count, 2)
+        self.assertEqual(conns[1].run.call_count, 1)
+
+    def test_on_kill_closes_connection(self):
+        """
+        Test that killing the sensor closes the connection kept open between pokes
+        """
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", poke_interval=0.01, timeout=5)
+        conn = Mock()
+        op._sensor_conn = conn
+
+        op.on_kill()
+
+        conn.close.assert_called_once()
+
+    def test_remote_polling(self):
+        """
+        Test that the command is evaluated in a loop on the remote host, which is tracked to terminate it on kill
+        """
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", poke_interval=5, timeout=60,
+                          remote_polling=True)
+        self.assertTrue(op.track_remote_process)
+
+        with patch.object(FabricSensor, "run_fabric_command", return_value=Mock(exited=0)) as run:
+            op.execute(context={})
+
+        run.assert_called_once()
+        self.assertEqual(run.call_args[0][1], get_polling_command("ls", 5, 60))
+
+    def test_remote_polling_timeout(self):
+        """
+        Test that the sensor times out, or is skipped with soft_fail, when the remote loop gave up
+        """
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", remote_polling=True)
+
+        with patch.object(FabricSensor, "run_fabric_command", return_value=Mock(exited=REMOTE_POLLING_TIMEOUT)):
+            with self.assertRaisesRegex(AirflowSensorTimeout, "timed out"):
+                op.execute(context={})
+
+            op.soft_fail = True
+            with self.assertRaises(AirflowSkipException):
+                op.execute(context={})
+
+    def test_remote_polling_failure(self):
+        """
+        Test that the task fails if the remote loop exited otherwise, or in reschedule mode
+        """
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", remote_polling=True)
+
+        with patch.object(FabricSensor, "run_fabric_command", return_value=Mock(exited=255)):
+            with self.assertRaisesRegex(AirflowException, "return code 255"):
+                op.execute(context={})
+
+        op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", remote_polling=True,
+                          mode="reschedule")
+        with self.assertRaisesRegex(AirflowException, "reschedule mode"):
+            op.execute(context={})
+
+    def test_polling_command(self):
+        """
+        Test that the polling loop exits with code 0 as soon as the command does, and gives up after the timeout
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, faker.file_name())
+            timer = threading.Timer(0.3, lambda: open(path, "w").close())
+            timer.start()
+            proc = subprocess.run(["sh", "-c", get_polling_command(["true", f"test -f {path}"], 0.05, 10)])
+            timer.join()
+            self.assertEqual(proc.returncode, 0)
+
+        # A command that calls exit doesn't end the loop
+        proc = subprocess.run(["sh", "-c", get_polling_command("exit 3", 0.05, 1)])
+        self.assertEqual(proc.returncode, REMOTE_POLLING_TIMEOUT)
+
+    def test_remote_polling_with_sudo(self):
+        """
+        Test that sudo applies to the whole polling loop, by running the sudo command locally with a stand-in for sudo
+        that drops its options
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sudo_path = os.path.join(tmp_dir, "sudo")
+            with open(sudo_path, "w") as f:
+                f.write("#!/bin/sh\n"
+                        "while [ $# -gt 0 ]; do\n"
+                        "  case \"$1\" in -p|-u) shift 2;; -*) shift;; *) break;; esac\n"
+                        "done\n"
+                        "exec \"$@\"\n")
+            os.chmod(sudo_path, os.stat(sudo_path).st_mode | stat.S_IXUSR)
+
+            # The command only succeeds on its second evaluation, so the loop must get past its first iteration
+            flag_path = os.path.join(tmp_dir, faker.file_name())
+            command = f"[ -f {flag_path} ] || {{ touch {flag_path}; false; }}"
+            op = FabricSensor(task_id=TEST_TASK_ID, fabric_hook=self.hook, command=command, poke_interval=0.05,
+                              timeout=10, remote_polling=True, use_sudo=True, sudo_user="root")
+
+            runner = Mock()
+            conn = Connection(faker.hostname())
+            conn._sudo(runner, op.get_remote_polling_command(), password=faker.password(), user=op.sudo_user)
+            sudo_command = runner.run.call_args[0][0]
+
+            env = dict(os.environ, PATH=f"{tmp_dir}{os.pathsep}{os.environ['PATH']}")
+            proc = subprocess.run(["sh", "-c", sudo_command], env=env)
+            self.assertEqual(proc.returncode, 0)
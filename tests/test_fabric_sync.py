@@ -0,0 +1,322 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException
+from faker import Faker
+from paramiko import SFTPAttributes
+
+from sai_airflow_plugins.hooks.fabric_hook import LazyFabricHook
+from sai_airflow_plugins.hooks.fabric_sync import DirectorySync, SyncResult
+from sai_airflow_plugins.operators.fabric_sync_operator import FabricSyncOperator
+from tests.test_fabric_transfer import LocalSFTP
+
+TEST_TASK_ID = "test_fabric_sync_operator"
+
+faker = Faker()
+
+
+class LocalSyncSFTP(LocalSFTP):
+    """
+    Stand-in for an SFTP client that operates on local files and records the uploaded files
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.uploads = []
+
+    def put(self, local_path, remote_path):
+        self.uploads.append(remote_path)
+        shutil.copyfile(local_path, remote_path)
+
+    def utime(self, path, times):
+        os.utime(path, times)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def listdir_attr(self, path):
+        raise FileNotFoundError(path)
+
+
+class WalkingSFTP(LocalSyncSFTP):
+    """
+    Local SFTP stand-in that lists directories, failing on the unreadable ones
+    """
+
+    def __init__(self, unreadable):
+        super().__init__()
+        self.unreadable = unreadable
+
+    def listdir_attr(self, path):
+        if path in self.unreadable:
+            raise PermissionError(13, "Permission denied", path)
+        return [SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)), name) for name in os.listdir(path)]
+
+    def stat(self, path):
+        return SFTPAttributes.from_stat(os.stat(path))
+
+
+class LocalConnection(object):
+    """
+    Stand-in for a Fabric connection that executes commands locally and records them
+    """
+
+    def __init__(self):
+        self.sftp_client = LocalSyncSFTP()
+        self.commands = []
+
+    def open(self):
+        pass
+
+    def sftp(self):
+        return self.sftp_client
+
+    def run(self, command, **kwargs):
+        self.commands.append(command)
+        proc = subprocess.run(["/bin/sh", "-c", command], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return Mock(exited=proc.returncode, stdout=proc.stdout.decode())
+
+
+class FailingHashConnection(LocalConnection):
+    """
+    Local connection on which a remote file disappears right before the remote files are hashed
+    """
+
+    def __init__(self, missing_path):
+        super().__init__()
+        self.missing_path = missing_path
+
+    def run(self, command, **kwargs):
+        if "sha256sum" in command and os.path.exists(self.missing_path):
+            os.remove(self.missing_path)
+        return super().run(command, **kwargs)
+
+
+class DirectorySyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.local_dir = os.path.join(self.tmp_dir, "local")
+        self.remote_dir = os.path.join(self.tmp_dir, "remote")
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        os.makedirs(os.path.join(self.local_dir, "sub"))
+        self.write_local("a.txt", b"a" * 100, mtime=1000000)
+        self.write_local("sub/b.txt", b"b" * 200, mtime=1000000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_local(self, path, data, mtime=None):
+        full_path = os.path.join(self.local_dir, path)
+        with open(full_path, "wb") as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(full_path, (mtime, mtime))
+
+    def read_remote(self, path):
+        with open(os.path.join(self.remote_dir, path), "rb") as f:
+            return f.read()
+
+    def read_local(self, path):
+        with open(os.path.join(self.local_dir, path), "rb") as f:
+            return f.read()
+
+    def sync(self, **kwargs):
+        conn = LocalConnection()
+        result = DirectorySync(conn=conn, local_dir=self.local_dir, remote_dir=self.remote_dir, state_id="test",
+                               cache_dir=self.cache_dir, **kwargs).run()
+        return result, conn
+
+    def test_initial_sync(self):
+        result, conn = self.sync()
+        self.assertIsInstance(result, SyncResult)
+        self.assertEqual(result.uploaded, ["a.txt", "sub/b.txt"])
+        self.assertEqual(result.bytes_sent, 300)
+        self.assertEqual(self.read_remote("sub/b.txt"), b"b" * 200)
+        self.assertEqual(os.stat(os.path.join(self.remote_dir, "a.txt")).st_mtime, 1000000)
+
+    def test_unchanged(self):
+        self.sync()
+        result, conn = self.sync()
+        self.assertEqual((result.uploaded, result.patched, result.unchanged, result.bytes_sent), ([], [], 2, 0))
+        # Only the listing of the remote files is needed
+        self.assertEqual(len(conn.commands), 1)
+
+    def test_changed_file(self):
+        self.sync()
+        self.write_local("a.txt", b"c" * 150, mtime=1000001)
+        result, conn = self.sync()
+        self.assertEqual(result.uploaded, ["a.txt"])
+        self.assertEqual(result.unchanged, 1)
+        self.assertEqual(self.read_remote("a.txt"), b"c" * 150)
+
+    def test_touched_file_uses_cached_hash(self):
+        self.sync()
+        self.write_local("a.txt", b"a" * 100, mtime=2000000)
+        result, conn = self.sync()
+        self.assertEqual((result.uploaded, result.unchanged), ([], 2))
+        self.assertFalse(any("sha256sum" in command for command in conn.commands))
+        self.assertEqual(os.stat(os.path.join(self.remote_dir, "a.txt")).st_mtime, 2000000)
+
+    def test_touched_file_without_cache(self):
+        self.sync()
+        shutil.rmtree(self.cache_dir)
+        self.write_local("a.txt", b"a" * 100, mtime=2000000)
+        result, conn = self.sync()
+        self.assertEqual((result.uploaded, result.unchanged), ([], 2))
+        self.assertTrue(any("sha256sum" in command for command in conn.commands))
+
+    def test_patch_blocks(self):
+        data = bytearray(os.urandom(10000))
+        self.write_local("big.bin", bytes(data), mtime=1000000)
+        self.sync(block_size=1000, delta_threshold=5000)
+
+        data[2500] ^= 0xff
+        self.write_local("big.bin", bytes(data + b"tail"), mtime=1000001)
+
+        for cached in (True, False):
+            with self.subTest(cached=cached):
+                if not cached:
+                    shutil.rmtree(self.cache_dir)
+                    self.write_local("big.bin", bytes(data), mtime=1000002)
+                result, conn = self.sync(block_size=1000, delta_threshold=5000)
+                self.assertEqual(result.patched, ["big.bin"])
+                self.assertLessEqual(result.bytes_sent, 2000)
+                self.assertEqual(self.read_remote("big.bin"), self.read_local("big.bin"))
+                self.assertEqual(any("dd if=" in command for command in conn.commands), not cached)
+
+    def test_failed_remote_hash(self):
+        """
+        Test that a remote file that can't be hashed is uploaded, without uploading the other files as well
+        """
+        self.sync()
+        shutil.rmtree(self.cache_dir)
+        self.write_local("a.txt", b"a" * 100, mtime=2000000)
+        self.write_local("sub/b.txt", b"b" * 200, mtime=2000000)
+
+        conn = FailingHashConnection(os.path.join(self.remote_dir, "sub/b.txt"))
+        result = DirectorySync(conn=conn, local_dir=self.local_dir, remote_dir=self.remote_dir, state_id="test",
+                               cache_dir=self.cache_dir).run()
+
+        self.assertEqual((result.uploaded, result.unchanged), (["sub/b.txt"], 1))
+        self.assertEqual(self.read_remote("sub/b.txt"), b"b" * 200)
+
+    def test_newline_in_file_name(self):
+        self.write_local("new\nline.txt", b"n" * 10, mtime=1000000)
+
+        result, _ = self.sync()
+        self.assertIn("new\nline.txt", result.uploaded)
+
+        result, _ = self.sync()
+        self.assertEqual((result.uploaded, result.unchanged), ([], 3))
+
+    def test_symlinks(self):
+        """
+        Test that symlinked files and directories are compared by their target on both sides
+        """
+        target_dir = os.path.join(self.tmp_dir, "target")
+        os.makedirs(target_dir)
+        with open(os.path.join(target_dir, "c.txt"), "wb") as f:
+            f.write(b"c" * 10)
+        os.utime(os.path.join(target_dir, "c.txt"), (1000000, 1000000))
+        os.symlink(os.path.join(self.local_dir, "a.txt"), os.path.join(self.local_dir, "link.txt"))
+        os.symlink(target_dir, os.path.join(self.local_dir, "linked_dir"))
+        os.symlink(self.local_dir, os.path.join(self.local_dir, "sub", "loop"))
+
+        result, _ = self.sync()
+        self.assertEqual(result.uploaded, ["a.txt", "link.txt", "linked_dir/c.txt", "sub/b.txt"])
+
+        # Replace a remote file by a link to a file with the same content
+        remote_target = os.path.join(self.tmp_dir, "remote_a.txt")
+        shutil.move(os.path.join(self.remote_dir, "a.txt"), remote_target)
+        os.symlink(remote_target, os.path.join(self.remote_dir, "a.txt"))
+
+        result, _ = self.sync(delete=True)
+        self.assertEqual((result.uploaded, result.deleted, result.unchanged), ([], [], 4))
+
+    def test_unreadable_remote_dir(self):
+        """
+        Test that the SFTP listing fallback skips an unreadable remote directory instead of aborting the sync
+        """
+        self.sync()
+        os.makedirs(os.path.join(self.remote_dir, "private"))
+        with open(os.path.join(self.remote_dir, "private", "c.txt"), "wb") as f:
+            f.write(b"c")
+
+        conn = LocalConnection()
+        conn.sftp_client = WalkingSFTP([os.path.join(self.remote_dir, "private")])
+        conn.run = Mock(return_value=Mock(exited=1, stdout=""))
+        sync = DirectorySync(conn=conn, local_dir=self.local_dir, remote_dir=self.remote_dir, state_id="test",
+                             cache_dir=self.cache_dir)
+        with self.assertLogs(sync.log, "WARNING") as cm:
+            remote = sync._scan_remote()
+
+        self.assertEqual(sorted(remote), ["a.txt", "sub/b.txt"])
+        self.assertEqual(remote["sub/b.txt"], {"size": 200, "mtime": 1000000})
+        self.assertIn("Skipping remote directory", cm.output[0])
+
+    def test_delete(self):
+        self.sync()
+        os.remove(os.path.join(self.local_dir, "sub/b.txt"))
+
+        result, _ = self.sync()
+        self.assertEqual(result.deleted, [])
+        self.assertTrue(os.path.exists(os.path.join(self.remote_dir, "sub/b.txt")))
+
+        result, _ = self.sync(delete=True)
+        self.assertEqual(result.deleted, ["sub/b.txt"])
+        self.assertFalse(os.path.exists(os.path.join(self.remote_dir, "sub/b.txt")))
+
+
+class FabricSyncOperatorTest(unittest.TestCase):
+
+    def test_execute(self):
+        hook = Mock()
+        hook.sync_dir.return_value = SyncResult(uploaded=["a"], patched=[], deleted=[], unchanged=3, bytes_sent=10,
+                                                duration=0.1)
+        local_dir = faker.file_path()
+        remote_dir = faker.file_path()
+
+        with patch("sai_airflow_plugins.hooks.fabric_hook.FabricHook", Mock):
+            op = FabricSyncOperator(task_id=TEST_TASK_ID, fabric_hook=hook, local_dir=local_dir,
+                                    remote_dir=remote_dir, delete=True)
+            res = op.execute({})
+
+        self.assertEqual(res["uploaded"], ["a"])
+        self.assertEqual(res["unchanged"], 3)
+        self.assertEqual(hook.sync_dir.call_args[0], (local_dir, remote_dir))
+        self.assertTrue(hook.sync_dir.call_args[1]["delete"])
+
+    def test_lazy_fabric_hook(self):
+        hook = Mock()
+        hook.sync_dir.return_value = SyncResult(uploaded=[], patched=[], deleted=[], unchanged=1, bytes_sent=0,
+                                                duration=0.1)
+        hook_class = Mock(return_value=hook)
+
+        with patch("sai_airflow_plugins.hooks.fabric_hook.FabricHook", Mock):
+            op = FabricSyncOperator(task_id=TEST_TASK_ID, fabric_hook=LazyFabricHook("target", hook_class=hook_class),
+                                    local_dir=faker.file_path(), remote_dir=faker.file_path(), connect_timeout=5)
+            hook_class.assert_not_called()
+            res = op.execute({})
+
+        hook_class.assert_called_once_with(ssh_conn_id="target", timeout=5)
+        self.assertEqual(res["unchanged"], 1)
+
+    def test_missing_dirs(self):
+        op = FabricSyncOperator(task_id=TEST_TASK_ID, ssh_conn_id=faker.word(), local_dir=faker.file_path())
+        with self.assertRaisesRegex(AirflowException, "local_dir and remote_dir"):
+            op.execute({})
+
+    def test_wraps_errors(self):
+        hook = Mock()
+        hook.sync_dir.side_effect = OSError("disk full")
+
+        with patch("sai_airflow_plugins.hooks.fabric_hook.FabricHook", Mock):
+            op = FabricSyncOperator(task_id=TEST_TASK_ID, fabric_hook=hook, local_dir=faker.file_path(),
+                                    remote_dir=faker.file_path())
+            with self.assertRaisesRegex(AirflowException, "Fabric sync operator error: disk full"):
+                op.execute({})
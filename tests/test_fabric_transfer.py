@@ -0,0 +1,273 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from airflow.exceptions import AirflowException
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_connection_pool import get_connection_pool
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.fabric_transfer import GET, PUT, ChunkedTransfer
+from sai_airflow_plugins.operators.fabric_transfer_operator import FabricTransferOperator
+
+TEST_TASK_ID = "test_fabric_transfer_operator"
+
+faker = Faker()
+
+
+class LocalFile(object):
+    """
+    Local file with the extra methods of an SFTP file
+    """
+
+    def __init__(self, path, mode, readv_calls=None):
+        self.f = open(path, mode)
+        self.readv_calls = readv_calls if readv_calls is not None else []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.f.close()
+
+    def __getattr__(self, item):
+        return getattr(self.f, item)
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def prefetch(self):
+        pass
+
+    def readv(self, chunks):
+        self.readv_calls.append(list(chunks))
+        for offset, length in chunks:
+            self.f.seek(offset)
+            yield self.f.read(length)
+
+
+class LocalSFTP(object):
+    """
+    Stand-in for an SFTP client that operates on local files. After `fail_after` opened files, opening a file for
+    writing a chunk fails `fail_count` times.
+    """
+
+    def __init__(self):
+        self.fail_after = None
+        self.fail_count = 0
+        self.opened = 0
+        self.readv_calls = []
+
+    def open(self, path, mode="r"):
+        self.opened += 1
+        if self.fail_after is not None and self.opened > self.fail_after and self.fail_count and "+" in mode:
+            self.fail_count -= 1
+            raise EOFError("Connection lost")
+        return LocalFile(path, mode, self.readv_calls)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def truncate(self, path, size):
+        os.truncate(path, size)
+
+
+class ChunkedTransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.local_path = os.path.join(self.tmp_dir, "local.bin")
+        self.remote_path = os.path.join(self.tmp_dir, "remote.bin")
+        self.data = os.urandom(10000)
+        self.sftp = LocalSFTP()
+        self.released = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_conn(self):
+        conn = Mock()
+        conn.sftp.return_value = self.sftp
+        conn.run.return_value = Mock(exited=127, stdout="")
+        return conn
+
+    def create_transfer(self, direction, **kwargs):
+        return ChunkedTransfer(direction=direction,
+                               local_path=self.local_path,
+                               remote_path=self.remote_path,
+                               conn_factory=self.create_conn,
+                               conn_release=lambda conn, discard=False: self.released.append(discard),
+                               state_id=faker.pystr(),
+                               chunk_size=1024,
+                               **kwargs)
+
+    def test_put(self):
+        """
+        Test that put transfers all chunks to the remote file and verifies the checksum
+        """
+        with open(self.local_path, "wb") as f:
+            f.write(self.data)
+
+        result = self.create_transfer(PUT, max_concurrency=3).run()
+
+        with open(self.remote_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(result.size, len(self.data))
+        self.assertEqual(result.transferred, len(self.data))
+        self.assertIsNotNone(result.checksum)
+        self.assertNotIn(True, self.released)
+
+    def test_get(self):
+        """
+        Test that get transfers all chunks to the local file
+        """
+        with open(self.remote_path, "wb") as f:
+            f.write(self.data)
+
+        result = self.create_transfer(GET).run()
+
+        with open(self.local_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        # Every chunk is read with a single pipelined request
+        self.assertEqual(sorted(self.sftp.readv_calls),
+                         [[(offset, min(1024, len(self.data) - offset))] for offset in range(0, len(self.data), 1024)])
+        self.assertEqual(result.source, self.remote_path)
+        self.assertEqual(result.destination, self.local_path)
+
+    def test_resume(self):
+        """
+        Test that a failed transfer resumes with the chunks that weren't completed yet
+        """
+        with open(self.local_path, "wb") as f:
+            f.write(self.data)
+
+        self.sftp.fail_after = 5
+        self.sftp.fail_count = 1
+        transfer = self.create_transfer(PUT, max_concurrency=1, retries=0)
+        with self.assertRaises(AirflowException):
+            transfer.run()
+        self.assertIn(True, self.released)
+
+        result = self.create_transfer(PUT, max_concurrency=1)
+        result.state_id = transfer.state_id
+        result = result.run()
+
+        with open(self.remote_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertLess(result.transferred, len(self.data))
+
+    def test_retry_chunk(self):
+        """
+        Test that a failed chunk is retried on a new connection
+        """
+        with open(self.local_path, "wb") as f:
+            f.write(self.data)
+
+        self.sftp.fail_after = 3
+        self.sftp.fail_count = 1
+        self.create_transfer(PUT, max_concurrency=1, retries=1).run()
+
+        with open(self.remote_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_checksum_mismatch(self):
+        """
+        Test that a different remote checksum fails the transfer
+        """
+        with open(self.local_path, "wb") as f:
+            f.write(self.data)
+
+        transfer = self.create_transfer(PUT)
+        transfer._remote_checksum = Mock(return_value="0" * 64)
+
+        with self.assertRaises(AirflowException):
+            transfer.run()
+
+    def test_max_connections(self):
+        """
+        Test that the number of workers is clamped to the number of connections the pool can hand out per host
+        """
+        with open(self.local_path, "wb") as f:
+            f.write(self.data)
+
+        lock = threading.Lock()
+        held = []
+
+        def acquire():
+            with lock:
+                if len(held) >= 2:
+                    raise AirflowException("Timed out waiting for a pooled connection")
+                conn = self.create_conn()
+                held.append(conn)
+                return conn
+
+        def release(conn, discard=False):
+            with lock:
+                held.remove(conn)
+
+        with self.assertLogs("sai_airflow_plugins.hooks.fabric_transfer.ChunkedTransfer", level="WARNING") as logs:
+            transfer = ChunkedTransfer(direction=PUT,
+                                       local_path=self.local_path,
+                                       remote_path=self.remote_path,
+                                       conn_factory=acquire,
+                                       conn_release=release,
+                                       state_id=faker.pystr(),
+                                       chunk_size=1024,
+                                       max_concurrency=10,
+                                       retries=0,
+                                       max_connections=2)
+            transfer.run()
+
+        self.assertEqual(transfer.max_concurrency, 2)
+        self.assertIn("exceeds the connection pool's limit", logs.output[0])
+        with open(self.remote_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(held, [])
+
+    def test_hook_max_connections(self):
+        """
+        Test that `FabricHook` passes the connection pool's per-host limit to the transfer
+        """
+        hook = FabricHook(remote_host=faker.hostname(), username=faker.user_name(), password=faker.password())
+        with patch("sai_airflow_plugins.hooks.fabric_hook.ChunkedTransfer") as transfer:
+            hook.put(self.local_path, self.remote_path, max_concurrency=20)
+
+        self.assertEqual(transfer.call_args.kwargs["max_concurrency"], 20)
+        self.assertEqual(transfer.call_args.kwargs["max_connections"], get_connection_pool().max_per_host)
+
+
+class FabricTransferOperatorTest(unittest.TestCase):
+
+    def test_put(self):
+        """
+        Test that the operator calls `FabricHook.put` with the paths and options, and returns the result as a dict
+        """
+        hook = Mock()
+        hook.put.return_value = Mock(transferred=1, size=1, source="a", destination="b", duration=0.1)
+        hook.put.return_value._asdict.return_value = {"size": 1}
+
+        with patch(
+                "sai_airflow_plugins.operators.fabric_transfer_operator.FabricTransferOperator.get_fabric_hook",
+                return_value=hook):
+            op = FabricTransferOperator(task_id=TEST_TASK_ID, ssh_conn_id="ssh_default", local_path="a",
+                                        remote_path="b", max_concurrency=2)
+            self.assertEqual(op.execute(context={}), {"size": 1})
+
+        hook.put.assert_called_with("a", "b", chunk_size=op.chunk_size, max_concurrency=2, resume=True,
+                                    verify=True)
+
+    def test_invalid_arguments(self):
+        """
+        Test that an unknown direction or missing path raises an exception
+        """
+        op = FabricTransferOperator(task_id=TEST_TASK_ID, ssh_conn_id="ssh_default", direction="copy",
+                                    local_path="a", remote_path="b")
+        with self.assertRaises(AirflowException):
+            op.execute(context={})
+
+        op = FabricTransferOperator(task_id=TEST_TASK_ID, ssh_conn_id="ssh_default", local_path="a")
+        with self.assertRaises(AirflowException):
+            op.execute(context={})
@@ -0,0 +1,92 @@
+import json
+import socket
+import unittest
+from unittest.mock import patch
+
+from airflow.exceptions import AirflowException
+from airflow.models import Connection
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_hook import FabricHook
+from sai_airflow_plugins.hooks.fabric_transport_profile import TRANSPORT_PROFILES, TransportProfile, \
+    get_transport_profile
+
+faker = Faker()
+
+
+class TransportProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sock, self.other_sock = socket.socketpair()
+
+    def tearDown(self):
+        self.sock.close()
+        self.other_sock.close()
+
+    def test_get_transport_profile(self):
+        self.assertIsNone(get_transport_profile(None))
+        self.assertIs(get_transport_profile("lan-bulk"), TRANSPORT_PROFILES["lan-bulk"])
+
+        profile = TransportProfile(window_size=faker.pyint(min_value=1))
+        self.assertIs(get_transport_profile(profile), profile)
+
+        profile = get_transport_profile({"window_size": 1024, "ciphers": ["aes256-ctr"]})
+        self.assertEqual(profile, TransportProfile(window_size=1024, ciphers=("aes256-ctr",)))
+
+    def test_get_transport_profile_invalid(self):
+        with self.assertRaisesRegex(AirflowException, "Unknown transport profile"):
+            get_transport_profile(faker.word())
+
+        with self.assertRaisesRegex(AirflowException, "Invalid transport profile"):
+            get_transport_profile({faker.word(): 1})
+
+    def test_create_transport(self):
+        profile = TransportProfile(window_size=8 * 1024 * 1024,
+                                   max_packet_size=65536,
+                                   ciphers=("aes256-ctr", "unsupported-cipher", "aes128-ctr"),
+                                   macs=("hmac-sha2-512",),
+                                   rekey_bytes=2 ** 32,
+                                   rekey_packets=2 ** 30)
+        transport = profile.create_transport(self.sock)
+
+        self.assertEqual(transport.default_window_size, 8 * 1024 * 1024)
+        self.assertEqual(transport.default_max_packet_size, 65536)
+        options = transport.get_security_options()
+        self.assertEqual(options.ciphers[:2], ("aes256-ctr", "aes128-ctr"))
+        self.assertIn("aes192-ctr", options.ciphers)
+        self.assertEqual(options.digests[0], "hmac-sha2-512")
+        self.assertEqual(transport.packetizer.REKEY_BYTES, 2 ** 32)
+        self.assertEqual(transport.packetizer.REKEY_PACKETS, 2 ** 30)
+
+    def test_create_transport_defaults(self):
+        default = TransportProfile().create_transport(self.sock)
+        self.assertEqual(default.get_security_options().ciphers, default._preferred_ciphers)
+        self.assertEqual(default.packetizer.REKEY_BYTES, type(default.packetizer).REKEY_BYTES)
+
+    def test_predefined_profiles(self):
+        for name, profile in TRANSPORT_PROFILES.items():
+            with self.subTest(profile=name):
+                transport = profile.create_transport(self.sock)
+                self.assertIn(transport.get_security_options().ciphers[0], profile.ciphers)
+
+    def test_hook(self):
+        hook = FabricHook(remote_host=faker.hostname(), transport_profile="wan")
+        conn = hook.get_fabric_conn()
+        self.assertTrue(conn.connect_kwargs["compress"])
+        self.assertEqual(conn.connect_kwargs["transport_factory"], TRANSPORT_PROFILES["wan"].create_transport)
+
+        default_hook = FabricHook(remote_host=hook.remote_host)
+        self.assertNotIn("transport_factory", default_hook.get_fabric_conn().connect_kwargs)
+        self.assertNotEqual(hook.get_pool_key(), default_hook.get_pool_key())
+
+    def test_hook_from_extras(self):
+        conn = Connection(conn_id=faker.word(), host=faker.hostname(),
+                          extra=json.dumps({"transport_profile": "lan-bulk"}))
+
+        with patch.object(FabricHook, "get_connection", return_value=conn):
+            self.assertEqual(FabricHook(ssh_conn_id=conn.conn_id).transport_profile, "lan-bulk")
+            self.assertEqual(FabricHook(ssh_conn_id=conn.conn_id, transport_profile="wan").transport_profile, "wan")
+
+    def test_hook_invalid(self):
+        with self.assertRaisesRegex(AirflowException, "Unknown transport profile"):
+            FabricHook(remote_host=faker.hostname(), transport_profile=faker.word())
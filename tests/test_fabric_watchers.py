@@ -0,0 +1,133 @@
+import threading
+import unittest
+
+from faker import Faker
+from invoke import FailingResponder, Responder, StreamWatcher
+from invoke.exceptions import ResponseNotAccepted
+
+from sai_airflow_plugins.hooks.fabric_output import OutputCapture
+from sai_airflow_plugins.hooks.fabric_watchers import CombinedWatcher, WatcherStats
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+
+TEST_TASK_ID = "test_fabric_watchers"
+
+faker = Faker()
+
+
+class PrefixWatcher(StreamWatcher):
+
+    def submit(self, stream):
+        if stream.startswith("start"):
+            yield "started\n"
+
+
+def feed(watcher, chunks):
+    """
+    Submits a growing stream to the watcher like invoke does, and returns the responses per chunk
+    """
+    stream = ""
+    responses = []
+    for chunk in chunks:
+        stream += chunk
+        responses.append(list(watcher.submit(stream)))
+    return responses
+
+
+class CombinedWatcherTest(unittest.TestCase):
+
+    def test_combine(self):
+        """
+        Test that responders are combined, and other watchers and patterns with groups are called as usual
+        """
+        other = PrefixWatcher()
+        watcher = CombinedWatcher([Responder(r"Continue\?", "yes\n"),
+                                   FailingResponder(r"password: ", "secret\n", "Permission denied"),
+                                   Responder(r"(y|n)\?", "y\n"),
+                                   Responder(r"(?i)proceed", "y\n"),
+                                   other])
+
+        self.assertEqual([p.pattern for p in watcher.patterns], [r"Continue\?", r"password: ", "Permission denied"])
+        self.assertEqual(len(watcher.others), 3)
+        self.assertIs(watcher.others[2], other)
+        self.assertEqual(watcher.lookback, len("Permission denied") - 1)
+
+    def test_matches(self):
+        """
+        Test that every match gets a response once, also when it spans chunks
+        """
+        watcher = CombinedWatcher([Responder(r"Continue\?", "yes\n"), Responder(r"Name: .*\n", "me\n")])
+
+        responses = feed(watcher, ["Contin", "ue? Continue?", faker.text(), "Na", "me: ", "x\nContinue?"])
+
+        self.assertEqual(responses, [[], ["yes\n", "yes\n"], [], [], [], ["me\n", "yes\n"]])
+        self.assertEqual(watcher.stats.matches, {r"Continue\?": 3, r"Name: .*\n": 1})
+        self.assertGreater(watcher.stats.scan_time, 0)
+
+    def test_scan_once(self):
+        """
+        Test that output is scanned once, apart from the part that could be the start of a match
+        """
+        watcher = CombinedWatcher([Responder(r"Continue\?", "yes\n")])
+        chunks = [faker.pystr(max_chars=100) for _ in range(100)]
+
+        feed(watcher, chunks)
+
+        self.assertEqual(watcher.stats.scanned, sum(len(chunk) for chunk in chunks))
+        self.assertLessEqual(len(watcher._pending), len("Continue?") - 1)
+
+    def test_failing_responder(self):
+        """
+        Test that a sentinel only fails after the responder has responded
+        """
+        watcher = CombinedWatcher([FailingResponder(r"password: ", "secret\n", "Permission denied")])
+
+        self.assertEqual(feed(watcher, ["Permission denied\n", "password: "]), [[], ["secret\n"]])
+        with self.assertRaisesRegex(ResponseNotAccepted, "Permission denied"):
+            feed(watcher, ["Permission denied\npassword: ", "Permission", " denied\n"])
+
+    def test_output_window(self):
+        """
+        Test that the watcher works with the output window of an `OutputCapture`
+        """
+        capture = OutputCapture(max_memory=100, window_size=20)
+        watcher = CombinedWatcher([Responder(r"Continue\?", "yes\n")])
+        responses = []
+
+        for text in ["x" * 50, "Contin", "ue?"] + ["y" * 30] * 5 + ["Continue?"]:
+            capture.append(text)
+            responses.extend(capture.respond([watcher]))
+
+        self.assertEqual(responses, ["yes\n", "yes\n"])
+
+    def test_threads(self):
+        """
+        Test that every thread has its own scan state, but the stats are shared
+        """
+        stats = WatcherStats()
+        watcher = CombinedWatcher([Responder(r"Continue\?", "yes\n")], stats=stats)
+        responses = []
+
+        thread = threading.Thread(target=lambda: responses.extend(feed(watcher, ["Continue?"])))
+        thread.start()
+        thread.join()
+        responses.extend(feed(watcher, ["Continue?"]))
+
+        self.assertEqual(responses, [["yes\n"], ["yes\n"]])
+        self.assertEqual(stats.matches, {r"Continue\?": 2})
+        self.assertIn(r"'Continue\\?': 2", str(stats))
+
+
+class FabricOperatorCombineWatchersTest(unittest.TestCase):
+
+    def test_get_watchers(self):
+        hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(), password=faker.password())
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=hook, command="ls", combine_watchers=True,
+                            watchers=[{"pattern": "Continue?", "response": "yes\n"}],
+                            add_sudo_password_responder=True, add_unknown_host_key_responder=True)
+        op.execute(context={})
+
+        watchers = op.get_watchers()
+        self.assertEqual(len(watchers), 1)
+        self.assertIsInstance(watchers[0], CombinedWatcher)
+        self.assertEqual(len(watchers[0].patterns), 5)
@@ -0,0 +1,82 @@
+import pickle
+import subprocess
+import sys
+import threading
+import types
+import unittest
+
+from sai_airflow_plugins.lazy_loading import lazy_attributes
+from sai_airflow_plugins.operators.conditional_skip_mixin import ConditionalSkipMixin
+
+
+class LazyAttributesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = types.ModuleType("test_lazy_module")
+        self.created = []
+
+        def create_class():
+            self.created.append(True)
+            return type("LocalClass", (object,), {})
+
+        self.module.__getattr__, self.module.__dir__ = lazy_attributes(vars(self.module), {
+            "LazyClass": create_class,
+            "dumps": "pickle",
+        })
+
+    def test_getattr(self):
+        lazy_class = self.module.LazyClass
+
+        self.assertIs(self.module.LazyClass, lazy_class)
+        self.assertEqual(lazy_class.__qualname__, "LazyClass")
+        self.assertIs(vars(self.module)["LazyClass"], lazy_class)
+        self.assertIs(self.module.dumps, pickle.dumps)
+        self.assertEqual(len(self.created), 1)
+        self.assertIn("LazyClass", dir(self.module))
+
+        with self.assertRaisesRegex(AttributeError, "has no attribute 'Missing'"):
+            self.module.Missing
+
+    def test_threads(self):
+        """
+        Test that concurrent first uses get the same class
+        """
+        classes = []
+        threads = [threading.Thread(target=lambda: classes.append(self.module.LazyClass)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(len(set(classes)), 1)
+
+
+class ConditionalClassesTest(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        """
+        Test that importing the conditional operators and sensors doesn't load the operators they're based on
+        """
+        script = "import sys, warnings; warnings.simplefilter('ignore'); " \
+                 "import sai_airflow_plugins.operators.conditional_operators, " \
+                 "sai_airflow_plugins.sensors.conditional_sensors, sai_airflow_plugins.operators, " \
+                 "sai_airflow_plugins.sensors, sai_airflow_plugins.hooks; " \
+                 "print(' '.join(m for m in ('fabric', 'invoke', 'paramiko', 'airflow.operators.bash', " \
+                 "'airflow.operators.python') if m in sys.modules))"
+
+        proc = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, check=True)
+
+        self.assertEqual(proc.stdout.decode().strip(), "")
+
+    def test_classes(self):
+        from sai_airflow_plugins.operators import FabricOperator
+        from sai_airflow_plugins.operators.conditional_operators import ConditionalFabricOperator
+        from sai_airflow_plugins.sensors import ConditionalFabricSensor, FabricSensor
+
+        self.assertTrue(issubclass(ConditionalFabricOperator, ConditionalSkipMixin))
+        self.assertTrue(issubclass(ConditionalFabricOperator, FabricOperator))
+        self.assertTrue(issubclass(ConditionalFabricSensor, FabricSensor))
+        self.assertEqual(ConditionalFabricOperator.__module__, "sai_airflow_plugins.operators.conditional_operators")
+        self.assertIs(pickle.loads(pickle.dumps(ConditionalFabricOperator)), ConditionalFabricOperator)
+        self.assertIn("condition_callable", ConditionalFabricOperator.template_fields)
@@ -0,0 +1,130 @@
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from airflow.exceptions import AirflowException
+from faker import Faker
+
+from sai_airflow_plugins.hooks.fabric_output import CapturedResult, OutputCapture
+from sai_airflow_plugins.hooks.xcom_offload import BlobStore, LazyXCom, LocalBlobStore, get_blob_store, is_reference, \
+    offload, resolve
+from sai_airflow_plugins.operators.fabric_operator import FabricOperator
+from tests.mocked_fabric_hook import MockedFabricHook
+
+TEST_TASK_ID = "test_xcom_offload"
+
+faker = Faker()
+
+
+class XComOffloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = LocalBlobStore(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_offload_and_resolve(self):
+        value = faker.text(max_nb_chars=2000) * 50 + " é"
+        reference = offload(value, key_prefix="my_dag/my_task", store=self.store)
+
+        self.assertTrue(is_reference(reference))
+        self.assertTrue(reference["uri"].startswith(f"file://{self.tmp_dir}/my_dag/my_task/"))
+        self.assertEqual(reference["size"], len(value.encode()))
+        self.assertLess(reference["stored_size"], reference["size"])
+        self.assertEqual(resolve(reference, self.store), value)
+
+        # Other values are returned as they are
+        self.assertEqual(resolve(value, self.store), value)
+        self.assertIsNone(resolve(None, self.store))
+
+    def test_offload_chunks_uncompressed(self):
+        chunks = [faker.pystr() for _ in range(10)]
+        reference = offload(iter(chunks), store=self.store, compress=False)
+
+        self.assertIsNone(reference["compression"])
+        self.assertEqual(reference["stored_size"], reference["size"])
+        self.assertEqual(resolve(reference, self.store), "".join(chunks))
+
+    def test_checksum_mismatch(self):
+        reference = offload(faker.text(), store=self.store)
+        reference["sha256"] = "0" * 64
+
+        with self.assertRaisesRegex(AirflowException, "Checksum mismatch"):
+            resolve(reference, self.store)
+
+    def test_lazy_xcom(self):
+        value = faker.text()
+        reference = offload(value, store=self.store)
+        store = Mock(wraps=self.store)
+        lazy = LazyXCom(reference, store)
+
+        self.assertTrue(lazy.offloaded)
+        self.assertEqual(lazy.size, len(value.encode()))
+        store.get.assert_not_called()
+        self.assertEqual(str(lazy), value)
+        self.assertEqual(lazy.value, value)
+        store.get.assert_called_once()
+
+        self.assertFalse(LazyXCom(value).offloaded)
+        self.assertEqual(LazyXCom(value).value, value)
+
+    def test_delete(self):
+        reference = offload(faker.text(), store=self.store)
+        self.store.delete(reference["uri"])
+        self.store.delete(reference["uri"])
+
+        with self.assertRaises(FileNotFoundError):
+            resolve(reference, self.store)
+
+    def test_incomplete_store(self):
+        """
+        Test that a store that doesn't implement all methods can't be created
+        """
+        class IncompleteBlobStore(BlobStore):
+            def put(self, key, chunks):
+                return key
+
+        with self.assertRaises(TypeError):
+            IncompleteBlobStore()
+
+
+class FabricOperatorXComOffloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = MockedFabricHook(remote_host=faker.hostname(), username=faker.user_name(),
+                                     password=faker.password())
+
+    def test_xcom_offload(self):
+        """
+        Test that stdout above the threshold is offloaded, and a reference is pushed
+        """
+        task_inst = Mock()
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", xcom_push_key="test_xcom",
+                            xcom_offload_threshold=10)
+        op.execute(context={"task_instance": task_inst})
+
+        reference = task_inst.xcom_push.call_args[0][1]
+        self.assertTrue(is_reference(reference))
+        self.assertEqual(resolve(reference), self.hook.stdout)
+        get_blob_store().delete(reference["uri"])
+
+        op.xcom_offload_threshold = len(self.hook.stdout)
+        op.execute(context={"task_instance": task_inst})
+        task_inst.xcom_push.assert_called_with("test_xcom", self.hook.stdout)
+
+    def test_xcom_offload_spilled(self):
+        """
+        Test that the full output is offloaded when it was spilled to disk
+        """
+        capture = OutputCapture(max_memory=10, window_size=2)
+        capture.append("a" * 20 + "b" * 20)
+        result = CapturedResult(stdout_capture=capture, stderr_capture=OutputCapture(), connection=None)
+        op = FabricOperator(task_id=TEST_TASK_ID, fabric_hook=self.hook, command="ls", xcom_offload_threshold=30)
+
+        reference = op.get_xcom_value(result.stdout, result)
+
+        self.assertEqual(resolve(reference), "a" * 20 + "b" * 20)
+        get_blob_store().delete(reference["uri"])